@@ -6,10 +6,6 @@ import os
 # import numexpr as ne 
 
 import click
-from PyQt6.QtWidgets import QApplication
-from pylab.gui.maingui import MainWindow
-from pylab.config import ExperimentConfig
-from pylab.startup import Startup
 '''
 This is the client terminal command line interface
 
@@ -18,6 +14,10 @@ The client terminal commands are:
     launch: Launch the mesofield acquisition interface
         - dev: Set to True to launch in development mode with simulated MMCores
     test_mda: Test the mesofield acquisition interface
+    run_mda: Record a session without the GUI, printing throughput stats
+        - replay: Re-emit a recorded session instead of acquiring (at --speed)
+        - experiment: repeat to record a queue of sessions back to back
+    process: Batch process every recorded session under a save directory
 
 '''
 
@@ -30,11 +30,27 @@ def cli():
 @cli.command()
 @click.option('--dev', default=False, help='launch in development mode with simulated MMCores.')
 @click.option('--params', default='params.json', help='Path to the config JSON file.')
-def launch(dev, params):
+@click.option('--metrics', 'metrics_file', default=None, help='Record per-frame latency histograms and rewrite them to this text file.')
+@click.option('--profile', is_flag=True, help='Sample all threads and write a profile of each recording to its session directory.')
+def launch(dev, params, metrics_file, profile):
     """
     Launch mesofield acquisition interface 
 
     """
+    from PyQt6.QtWidgets import QApplication
+    from pylab.gui.maingui import MainWindow
+    from pylab.config import ExperimentConfig
+    from pylab.logs import setup_logging
+    from pylab.metrics import metrics
+    from pylab.profiler import profiler
+
+    # engine.log is written by a background thread; log calls only enqueue records
+    setup_logging()
+    if metrics_file:
+        metrics.enable(metrics_file)
+    if profile:
+        profiler.enable()
+
     print('Launching mesofield acquisition interface...')
     app = QApplication([])
     config_path = params
@@ -54,14 +70,66 @@ def test_mda(frames):
     from pylab.startup import test_mda
 
 @cli.command()
-def run_mda():
+@click.option('--dev', default=False, help='run with simulated MMCores and encoder.')
+@click.option('--params', default='params.json', help='Path to the config JSON file.')
+@click.option('--experiment', required=True, multiple=True, type=click.Path(exists=True, dir_okay=False), help='Path to the experiment parameters JSON file; repeat it to record several sessions back to back.')
+@click.option('--interval', default=2.0, help='Seconds between throughput reports.')
+@click.option('--metrics', 'metrics_file', default=None, help='Record per-frame latency histograms and rewrite them to this text file.')
+@click.option('--replay', default=None, type=click.Path(exists=True, file_okay=False), help='Re-emit this recorded session (BIDS directory) instead of acquiring.')
+@click.option('--speed', default=1.0, help='Replay speed: 1 is the recorded timing, 0 is as fast as possible.')
+@click.option('--replay-run', default=0, help='Which recorded run of the session to replay.')
+def run_mda(dev, params, experiment, interval, metrics_file, replay, speed, replay_run):
     """Run the Multi-Dimensional Acquisition (MDA) without the GUI."""
-    run_mda()
+    from PyQt6.QtCore import QCoreApplication
+    from pylab.config import ExperimentConfig
+    from pylab.headless import HeadlessRunner
+    from pylab.logs import setup_logging
+    from pylab.metrics import metrics
+
+    setup_logging()
+    if metrics_file:
+        metrics.enable(metrics_file)
+
+    # the encoder is a QThread; a core application is all it needs, no widgets
+    app = QCoreApplication.instance() or QCoreApplication([])
+    config = ExperimentConfig(params, dev)
+    config.load_parameters(experiment[0])
+    if replay:
+        config.hardware.use_replay(replay, speed=speed, run=replay_run)
+    config.hardware.initialize_cores(config)
+    runner = HeadlessRunner(config, interval=interval, echo=click.echo)
+    if len(experiment) > 1:
+        runner.run_queue(list(experiment))
+    else:
+        runner.run()
+    if metrics.enabled:
+        metrics.disable()  # writes the final report
+        click.echo(metrics.format())
 
 
-if __name__ == "__main__":  # pragma: no cover
+@cli.command()
+@click.argument('save_dir', type=click.Path(exists=True, file_okay=False))
+@click.option('--workers', '-j', default=None, type=int, help='Number of sessions processed in parallel (default: CPU count).')
+@click.option('--force', is_flag=True, help='Reprocess sessions whose outputs are already up to date.')
+def process(save_dir, workers, force):
+    """
+    Batch process every session (protocol/sub-*/ses-*) under SAVE_DIR
+    """
+    from pylab.processing.batch import discover_sessions, process_all
+
+    sessions = discover_sessions(save_dir)
+    click.echo(f'Found {len(sessions)} sessions under {save_dir}')
+    for bids_dir, status in process_all(save_dir, workers, force):
+        click.echo(f'{os.path.relpath(bids_dir, save_dir)}: {status}')
+
+
+def main():
     cli()
 
 
+if __name__ == "__main__":  # pragma: no cover
+    main()
+
+
 
 
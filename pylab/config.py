@@ -1,18 +1,121 @@
 import os
+import re
+import copy
 import json
 import pathlib
 import pandas as pd
 import os
 import useq
 import warnings
+from concurrent.futures import Future
+from dataclasses import dataclass
+from functools import cache
+from types import MappingProxyType
+from typing import Any, Mapping
 from pymmcore_plus import CMMCorePlus
 
 from typing import TYPE_CHECKING
 
 from pylab.io import SerialWorker
+from pylab.io.catalog import register_file
+from pylab.finalize import finalizer
+from pylab.io.sink import EncoderSink, encoder_dataframe
+from pylab.sessionqueue import validate_led_pattern
+from pylab.io.writer import split_tiff_ext
     
 from pylab.startup import Startup
 
+
+def _as_bool(value) -> bool:
+    """ Interpret JSON booleans and the strings written back by the config table """
+    if isinstance(value, str):
+        return value.strip().lower() not in ('false', '0', 'no', '')
+    return bool(value)
+
+
+def _remove_if_empty(path: str) -> None:
+    """ Delete a reserved output file that was never written """
+    if os.path.exists(path) and not os.path.getsize(path):
+        os.remove(path)
+
+
+def _save_encoder_data(data, paths: 'SessionPaths', params: pd.DataFrame, task: str, export_csv: bool) -> None:
+    """ Write the configuration and encoder files of a finished recording and catalog them """
+    if isinstance(data, EncoderSink):
+        data = encoder_dataframe(data.read())
+    elif isinstance(data, list):
+        data = pd.DataFrame(data)
+
+    params.to_csv(paths.configuration, index=False)
+    register_file(paths.configuration, task=task)
+    duration = float(data['Time'].iloc[-1] - data['Time'].iloc[0]) if 'Time' in data and len(data) > 1 else None
+    if export_csv:
+        data.to_csv(paths.encoder, index=False)
+        print(f"Encoder data saved to {paths.encoder}")
+        register_file(paths.encoder, frames=len(data), duration_s=duration, task=task)
+    else:
+        _remove_if_empty(paths.encoder)  # the reservation made by allocate_session_paths
+    if os.path.exists(paths.encoder_stream) and os.path.getsize(paths.encoder_stream):
+        register_file(paths.encoder_stream, frames=len(data), duration_s=duration, task=task, modality='encoder-stream')
+    else:
+        _remove_if_empty(paths.encoder_stream)  # nothing was streamed to it
+
+
+def _split_ext(file: str) -> tuple[str, str]:
+    """ Split a filename into stem and extension, keeping '.ome.tiff' together """
+    if file.endswith(('.tif', '.tiff')):
+        return split_tiff_ext(file)
+    return os.path.splitext(file)
+
+
+# properties that are views of the config rather than parameters
+_NOT_PARAMETERS = {'dataframe', 'parameters', 'session_paths', 'snapshot'}
+
+
+@cache
+def _parameter_properties(cls) -> tuple[str, ...]:
+    """ Names of the properties listed as parameters, looked up once per class """
+    return tuple(
+        prop for prop in dir(cls)
+        if isinstance(getattr(cls, prop), property) and prop not in _NOT_PARAMETERS
+    )
+
+
+def _detached(value):
+    """ Copy list/dict values so the snapshot can't be changed through them """
+    if isinstance(value, list):
+        return list(value)
+    if isinstance(value, dict):
+        return dict(value)
+    return value
+
+
+@dataclass(frozen=True)
+class SessionPaths:
+    """ Output files of one recording; runs after the first carry a `_<run>` suffix """
+    run: int
+    meso: str
+    pupil: str
+    encoder: str
+    encoder_stream: str
+    configuration: str
+    log: str
+    streams: str  # SessionSupervisor report: start and first-sample times of every stream
+
+    def reserved(self) -> tuple[str, ...]:
+        """ The files `allocate_session_paths` creates for the run """
+        return (self.meso, self.pupil, self.encoder, self.encoder_stream, self.configuration, self.log, self.streams)
+
+
+@dataclass(frozen=True)
+class PreparedSession:
+    """ A queued recording whose parameters are validated and output files reserved
+    (see `ExperimentConfig.prepare_session`) """
+    experiment: str
+    parameters: dict
+    paths: SessionPaths
+
+
 class ExperimentConfig:
     """## Generate and store parameters loaded from a JSON file. 
     
@@ -40,6 +143,14 @@ class ExperimentConfig:
         self._json_file_path = ''
         self._output_path = ''
         self._save_dir = ''
+        self._session_paths: SessionPaths | None = None
+        # a queued recording taken over by `use_prepared`, allocated by the next recording
+        self._prepared: PreparedSession | None = None
+        # next free run per BIDS directory, so allocation doesn't re-probe the filesystem
+        self._next_run: dict[str, int] = {}
+        # derived parameters, rebuilt after the next change (see `_invalidate`)
+        self._snapshot: Mapping[str, Any] | None = None
+        self._dataframe: pd.DataFrame | None = None
 
         if development_mode: 
             self.hardware = Startup() 
@@ -70,6 +181,7 @@ class ExperimentConfig:
     def save_dir(self, path: str):
         if isinstance(path, str):
             self._save_dir = os.path.abspath(path)
+            self._invalidate()
         else:
             print(f"ExperimentConfig: \n Invalid save directory path: {path}")
 
@@ -97,6 +209,50 @@ class ExperimentConfig:
     def start_on_trigger(self) -> bool:
         return self._parameters.get('start_on_trigger', False)
     
+    @property
+    def preallocate_files(self) -> bool:
+        """ Pre-size output files for the full sequence; False grows them as frames arrive """
+        return _as_bool(self._parameters.get('preallocate_files', True))
+
+    @property
+    def split_led_channels(self) -> bool:
+        """ Demultiplex widefield frames into one file per LED channel of led_pattern """
+        return _as_bool(self._parameters.get('split_led_channels', False))
+
+    @property
+    def summary_stats(self) -> bool:
+        """ Accumulate per-LED-channel mean/variance/max images during acquisition """
+        return _as_bool(self._parameters.get('summary_stats', False))
+
+    @property
+    def summary_baseline_tau(self) -> float | None:
+        """ Time constant (frames) of the running baseline summary image; None disables it """
+        tau = self._parameters.get('summary_baseline_tau', None)
+        return float(tau) if tau not in (None, '', 'None') else None
+
+    @property
+    def quicklook(self) -> bool:
+        """ Write a binned, decimated uint8 companion movie next to the widefield recording """
+        return _as_bool(self._parameters.get('quicklook', False))
+
+    @property
+    def quicklook_binning(self) -> int:
+        return int(self._parameters.get('quicklook_binning', 8))
+
+    @property
+    def quicklook_decimate(self) -> int:
+        return int(self._parameters.get('quicklook_decimate', len(self.led_pattern)))
+
+    @property
+    def export_encoder_csv(self) -> bool:
+        """ Write the encoder CSV from the streamed encoder samples at the end of a recording """
+        return _as_bool(self._parameters.get('export_encoder_csv', True))
+
+    @property
+    def encoder_flush_interval(self) -> float:
+        """ Seconds of encoder samples buffered before they are appended to the stream file """
+        return float(self._parameters.get('encoder_flush_interval', 1.0))
+
     @property
     def sequence_duration(self) -> int:
         return int(self._parameters.get('duration', 60))
@@ -143,23 +299,159 @@ class ExperimentConfig:
         )
         return os.path.abspath(os.path.join(self.save_dir, bids))
 
-    # Property to compute the full file path, handling existing files
+    # Output paths of the current recording (or of the next run, before one is allocated)
     @property
     def meso_file_path(self):
-        file = f"{self.protocol}-sub-{self.subject}_ses-{self.session}_task-{self.task}_meso.ome.tiff"
-        return self._generate_unique_file_path(file, 'func')
+        return self.session_paths.meso
 
     # Property for pupil file path, if needed
     @property
     def pupil_file_path(self):
-        file = f"{self.protocol}-sub-{self.subject}_ses-{self.session}_task-{self.task}_pupil.ome.tiff"
-        return self._generate_unique_file_path(file, 'func')
+        return self.session_paths.pupil
+
+    @property
+    def session_paths(self) -> SessionPaths:
+        """ The allocated recording paths, or a preview of the next run's paths.
+
+        Previews don't reserve anything; call `allocate_session_paths` when recording starts.
+        """
+        filenames = self._session_filenames()
+        allocated = self._session_paths or (self._prepared.paths if self._prepared else None)
+        if allocated is not None and self._run_paths(filenames, allocated.run) == allocated:
+            return allocated
+        return self._run_paths(filenames, self._first_free_run(filenames))
+
+    def _session_filenames(self) -> dict[str, tuple[str | None, str]]:
+        """ (bids_type, filename) of every file a recording writes """
+        prefix = f"{self.protocol}-sub-{self.subject}_ses-{self.session}_task-{self.task}"
+        return {
+            'meso': ('func', f"{prefix}_meso.ome.tiff"),
+            'pupil': ('func', f"{prefix}_pupil.ome.tiff"),
+            'encoder': ('beh', f"{self.subject}_ses-{self.session}_encoder-data.csv"),
+            'encoder_stream': ('beh', f"{self.subject}_ses-{self.session}_encoder-data.bin"),
+            'configuration': (None, f"{self.subject}_ses-{self.session}_configuration.csv"),
+            'log': (None, f"{prefix}_log.txt"),
+            'streams': (None, f"{prefix}_streams.json"),
+        }
+
+    def _run_paths(self, filenames: dict, run: int) -> SessionPaths:
+        paths = {}
+        for key, (bids_type, file) in filenames.items():
+            base, ext = _split_ext(file)
+            name = f"{base}_{run}{ext}" if run else file
+            paths[key] = os.path.join(self.bids_dir, bids_type or '', name)
+        return SessionPaths(run, **paths)
+
+    def _first_free_run(self, filenames: dict) -> int:
+        """ Next run after any on disk; the directories are scanned once per BIDS directory """
+        key = self.bids_dir
+        if key not in self._next_run:
+            patterns = [
+                re.compile(rf"^{re.escape(base)}(?:_(\d+))?{re.escape(ext)}$")
+                for base, ext in (_split_ext(file) for _, file in filenames.values())
+            ]
+            next_run = 0
+            for bids_type in {bids_type for bids_type, _ in filenames.values()}:
+                directory = os.path.join(self.bids_dir, bids_type or '')
+                if not os.path.isdir(directory):
+                    continue
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        for pattern in patterns:
+                            if match := pattern.match(entry.name):
+                                next_run = max(next_run, int(match.group(1) or 0) + 1)
+            self._next_run[key] = next_run
+        return self._next_run[key]
+
+    def allocate_session_paths(self) -> SessionPaths:
+        """ Reserve the output files of a new recording and cache them for the session.
+
+        Every file of the run is created exclusively (`O_EXCL`), so two processes or a
+        stale cache can never hand out the same run; on a collision the next run is tried.
+        After `use_prepared`, the files the queued session already reserved are used.
+        """
+        if self._prepared is not None:
+            paths, self._prepared = self._prepared.paths, None
+            self._session_paths = paths
+            self._invalidate()
+            return paths
+        filenames = self._session_filenames()
+        run = self._first_free_run(filenames)
+        while True:
+            paths = self._run_paths(filenames, run)
+            created = []
+            try:
+                for path in paths.reserved():
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                    created.append(path)
+            except FileExistsError:
+                for path in created:
+                    os.remove(path)
+                run += 1
+                continue
+            break
+        self._next_run[self.bids_dir] = run + 1
+        self._session_paths = paths
+        self._invalidate()
+        return paths
+
+    def release_session_paths(self) -> None:
+        """ End the current recording; the next access previews a new run """
+        self._session_paths = None
+        self._invalidate()
+
+    def prepare_session(self, json_file_path: str, led_states: list[str] | None = None,
+                        led_max_length: int | None = None) -> PreparedSession:
+        """ Validate an experiment JSON and reserve its output files, without changing this config.
+
+        Works on a copy that shares the hardware and the run counters, so it is safe to
+        call from another thread while a recording runs. Raises `ValueError` if the
+        parameters can't be recorded.
+        """
+        with open(json_file_path, 'r') as f:
+            parameters = json.load(f)
+        plan = copy.copy(self)
+        plan._parameters = parameters
+        plan._json_file_path = json_file_path
+        plan._session_paths = plan._prepared = None
+        plan._invalidate()
+
+        errors = validate_led_pattern(plan.led_pattern, led_states, led_max_length)
+        try:
+            if plan.num_meso_frames <= 0 or plan.num_pupil_frames <= 0:
+                errors.append("the sequences have no frames (check dhyana_fps, thorcam_fps and duration)")
+        except (TypeError, ValueError) as e:
+            errors.append(f"invalid frame rate or duration: {e}")
+        if errors:
+            raise ValueError(f"{json_file_path}: " + "; ".join(errors))
+        return PreparedSession(json_file_path, parameters, plan.allocate_session_paths())
+
+    def use_prepared(self, prepared: PreparedSession) -> None:
+        """ Load a prepared session; the next recording writes to its reserved files """
+        if self._prepared is not prepared:
+            self.discard_prepared()
+        self._parameters = copy.deepcopy(prepared.parameters)
+        self._json_file_path = prepared.experiment
+        self._prepared = prepared
+        self._invalidate()
+
+    def discard_prepared(self, prepared: PreparedSession | None = None) -> None:
+        """ Give up a prepared session that won't be recorded, deleting its empty reserved files """
+        if prepared is None:
+            prepared, self._prepared = self._prepared, None
+        if prepared is None:
+            return
+        for path in prepared.paths.reserved():
+            _remove_if_empty(path)
 
     @property
     def dataframe(self):
-        data = {'Parameter': list(self._parameters.keys()),
-                'Value': list(self._parameters.values())}
-        return pd.DataFrame(data)
+        if self._dataframe is None:
+            data = {'Parameter': list(self._parameters.keys()),
+                    'Value': list(self._parameters.values())}
+            self._dataframe = pd.DataFrame(data)
+        return self._dataframe
     
     @property
     def json_path(self):
@@ -177,6 +469,7 @@ class ExperimentConfig:
     @psychopy_filename.setter
     def psychopy_filename(self, value: str) -> None:
         self._parameters['psychopy_filename'] = value
+        self._invalidate()
 
     @property
     def psychopy_path(self) -> str:
@@ -195,6 +488,7 @@ class ExperimentConfig:
                 raise ValueError("led_pattern string must be a valid JSON list")
         if isinstance(value, list):
             self._parameters['led_pattern'] = [str(item) for item in value]
+            self._invalidate()
         else:
             raise ValueError("led_pattern must be a list or a JSON string representing a list")
     
@@ -224,7 +518,7 @@ class ExperimentConfig:
             bids_path = os.path.join(self.bids_dir, bids_type)
             
         os.makedirs(bids_path, exist_ok=True)
-        base, ext = os.path.splitext(file)
+        base, ext = _split_ext(file)
         counter = 1
         file_path = os.path.join(bids_path, file)
         while os.path.exists(file_path):
@@ -246,37 +540,90 @@ class ExperimentConfig:
         except json.JSONDecodeError as e:
             print(f"Error decoding JSON: {e}")
             return
+        self._invalidate()
 
     def update_parameter(self, key, value) -> None:
         """ Update a parameter in the config object """
         self._parameters[key] = value
-        
+        self._invalidate()
+
+    def _invalidate(self) -> None:
+        """ Drop the cached snapshot and table after the parameters changed """
+        self._snapshot = None
+        self._dataframe = None
+
+    @property
+    def snapshot(self) -> Mapping[str, Any]:
+        """ Read-only mapping of every derived parameter (property) to its value.
+
+        Computed once and reused until `update_parameter`, `load_parameters`, a setter,
+        `save_dir` or the session paths change, so the GUI can read it repeatedly
+        without touching the filesystem.
+        """
+        if self._snapshot is None:
+            self._snapshot = MappingProxyType(
+                {prop: _detached(getattr(self, prop)) for prop in _parameter_properties(type(self))}
+            )
+        return self._snapshot
+
+    def mda_outputs(self, paths: SessionPaths) -> tuple[list, list]:
+        """ The (meso, pupil) MDA output handlers writing a recording to `paths` """
+        from pylab.io import CustomWriter, FrameStatsAccumulator, QuicklookWriter
+
+        preallocate = self.preallocate_files
+        led_pattern = self.led_pattern if self.split_led_channels else None
+        meso_outputs = [CustomWriter(paths.meso, preallocate=preallocate, led_pattern=led_pattern)]
+        if self.summary_stats:
+            meso_outputs.append(FrameStatsAccumulator(paths.meso, led_pattern=self.led_pattern, baseline_tau=self.summary_baseline_tau))
+        if self.quicklook:
+            meso_outputs.append(QuicklookWriter(paths.meso, binning=self.quicklook_binning, decimate=self.quicklook_decimate))
+
+        pupil_outputs = [CustomWriter(paths.pupil, preallocate=preallocate)]
+
+        # software crop/binning configured per core in params.json
+        return (self.hardware.widefield.output_pipeline(meso_outputs),
+                self.hardware.thorcam.output_pipeline(pupil_outputs))
+
     def list_parameters(self) -> pd.DataFrame:
         """ Create a DataFrame from the ExperimentConfig properties """
-        properties = [prop for prop in dir(self.__class__) if isinstance(getattr(self.__class__, prop), property)]
-        exclude_properties = {'dataframe', 'parameters'}
-        data = {prop: getattr(self, prop) for prop in properties if prop not in exclude_properties}
-        return pd.DataFrame(data.items(), columns=['Parameter', 'Value'])
+        return pd.DataFrame(list(self.snapshot.items()), columns=['Parameter', 'Value'])
                 
-    def save_wheel_encoder_data(self, data):
-        """ Save the wheel encoder data to a CSV file """
-        
-        if isinstance(data, list):
-            data = pd.DataFrame(data)
-            
-        encoder_file = f'{self.subject}_ses-{self.session}_encoder-data.csv'
-        encoder_path = self._generate_unique_file_path(encoder_file, 'beh')
-
-        params_file = f'{self.subject}_ses-{self.session}_configuration.csv'
-        params_path = self._generate_unique_file_path(params_file)
+    def attach_encoder_sink(self) -> EncoderSink:
+        """ Stream the encoder samples of the allocated recording to its `encoder_stream` file """
+        sink = EncoderSink(self.session_paths.encoder_stream, flush_interval=self.encoder_flush_interval)
+        self.encoder.sink = sink
+        return sink
 
+    def save_wheel_encoder_data(self, data):
+        """ Save the configuration and, unless `export_encoder_csv` is off, the wheel encoder CSV """
+        paths = self._session_paths or self.allocate_session_paths()
         try:
-            params = self.list_parameters()
-            params.to_csv(params_path, index=False)
-            data.to_csv(encoder_path, index=False)
-            print(f"Encoder data saved to {encoder_path}")
+            _save_encoder_data(data, paths, self.list_parameters(), self.task, self.export_encoder_csv)
         except Exception as e:
             print(f"Error saving encoder data: {e}")
+        finally:
+            # the recording is complete; the next one gets a new run and a new sink
+            self.encoder.sink = None
+            self.release_session_paths()
+
+    def finish_recording(self) -> Future:
+        """ End the recording and save its encoder data and configuration in the background.
+
+        The session paths, the encoder data (or its sink) and the parameters are taken
+        from the config right away, so the next recording can be allocated while the
+        files are written by the finalization pipeline (`pylab.finalize.finalizer`).
+        Call after the encoder has been stopped.
+        """
+        paths = self._session_paths or self.allocate_session_paths()
+        encoder = self.encoder
+        sink, encoder.sink = encoder.sink, None
+        data = sink if sink is not None else encoder.get_data()
+        params = self.list_parameters()
+        self.release_session_paths()
+        return finalizer.submit(
+            f"encoder data run-{paths.run}",
+            _save_encoder_data, data, paths, params, self.task, self.export_encoder_csv,
+        )
         
             
 
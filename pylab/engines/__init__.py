@@ -19,7 +19,4 @@ from pymmcore_plus.mda import MDAEngine
 from .enginedev import DevEngine
 from .pupilengine import PupilEngine
 from .mesoengine import MesoEngine
-
-import logging
-logging.basicConfig(filename='engine.log', level=logging.INFO, 
-                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
\ No newline at end of file
+from .replayengine import ReplayEngine
@@ -0,0 +1,36 @@
+_NOT_ARMED = object()
+
+
+class ArmedSequenceMixin:
+    """Sequence setup done ahead of the MDA runner, so that starting a recording only triggers it.
+
+    `arm(sequence)` runs the engine's `setup_sequence` and clears the circular buffer
+    before `run_mda` is called (e.g. from `SessionSupervisor` before its barrier). When
+    the runner then calls `setup_sequence` for that same sequence, the armed summary
+    metadata is returned without touching the hardware again.
+
+    Engines that override `setup_sequence` return early with `_armed_metadata` so their
+    own setup isn't repeated either.
+    """
+
+    _armed: tuple | None = None
+
+    def arm(self, sequence):
+        """Set up the hardware for `sequence` and clear the circular buffer."""
+        self._armed = None
+        meta = self.setup_sequence(sequence)
+        self._mmc.clearCircularBuffer()
+        self._armed = (sequence, meta)
+        return meta
+
+    def _armed_metadata(self, sequence):
+        """The summary metadata `arm(sequence)` returned, once; `_NOT_ARMED` otherwise."""
+        armed, self._armed = self._armed, None
+        if armed is not None and armed[0] is sequence:
+            return armed[1]
+        return _NOT_ARMED
+
+    def setup_sequence(self, sequence):
+        if (meta := self._armed_metadata(sequence)) is not _NOT_ARMED:
+            return meta
+        return super().setup_sequence(sequence)
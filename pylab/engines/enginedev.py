@@ -1,10 +1,19 @@
 from . import *
+from .armed import ArmedSequenceMixin
+from .instrumented import FrameTimingMixin
+from pylab.logs import RateLimitedLog
+import logging
 
 from typing import TYPE_CHECKING
 if TYPE_CHECKING:
     from pylab.io import SerialWorker
 
-class DevEngine(MDAEngine):
+logger = logging.getLogger(__name__)
+_drain_log = RateLimitedLog(logger)  # per-frame messages, at most one per second
+
+class DevEngine(ArmedSequenceMixin, FrameTimingMixin, MDAEngine):
+    metrics_name = 'dev'
+
     
     def __init__(self, mmc: pymmcore_plus.CMMCorePlus, use_hardware_sequencing: bool = True) -> None:
         super().__init__(mmc)
@@ -39,7 +48,7 @@ class DevEngine(MDAEngine):
             0,  # intervalMS  # TODO: add support for this
             True,  # stopOnOverflow
         )
-        logging.info(f'{self.__str__()} exec_sequenced_event with {n_events} events at t0 {t0}')
+        logger.info('%s exec_sequenced_event with %d events at t0 %s', self, n_events, t0)
         self.post_sequence_started(event)
 
         n_channels = self._mmc.getNumberOfCameraChannels()
@@ -49,13 +58,14 @@ class DevEngine(MDAEngine):
         while True:
             if self._mmc.isSequenceRunning():
                 if remaining := self._mmc.getRemainingImageCount():
-                    yield self._next_seqimg_payload(
+                    yield self._payload(
                         *next(iter_events), remaining=remaining - 1, event_t0=event_t0_ms
                     )
+                    self._resumed()
                     count += 1
                 else:
                     if count == n_events:
-                        logging.debug(f'{self.__str__()} stopped MDA: \n{self._mmc} with \n{count} events and \n{remaining} remaining with \n{self._mmc.getRemainingImageCount()} images in buffer')
+                        logger.debug('%s stopped MDA after %d of %d events', self, count, n_events)
                         self._mmc.stopSequenceAcquisition() 
                         break
                     time.sleep(0.001)
@@ -63,21 +73,21 @@ class DevEngine(MDAEngine):
                 break
 
         if self._mmc.isBufferOverflowed():  # pragma: no cover
-            logging.debug(f'OVERFLOW {self.__str__()} MDA: \n{self._mmc} with \n{count} events and \n{remaining} remaining with \n{self._mmc.getRemainingImageCount()} images in buffer')
+            logger.debug('OVERFLOW %s after %d events', self, count)
             raise MemoryError("Buffer overflowed")
 
         while remaining := self._mmc.getRemainingImageCount():
-            logging.debug(f'{self.__str__()} Saving Remaining Images in buffer \n{self._mmc} with \n{count} events and \n{remaining} remaining with \n{self._mmc.getRemainingImageCount()} images in buffer')
-            yield self._next_seqimg_payload(
+            _drain_log.debug('%s saving remaining images, %d in buffer after %d events', self, remaining, count)
+            yield self._payload(
                 *next(iter_events), remaining=remaining - 1, event_t0=event_t0_ms
             )
+            self._resumed()
             count += 1
     
     def teardown_sequence(self, sequence: useq.MDASequence) -> None:
         """Perform any teardown required after the sequence has been executed."""
-        logging.info(f'{self.__str__()} teardown_sequence at time: {time.time()}')
+        logger.info('%s teardown_sequence at time: %s', self, time.time())
         self._encoder.stop()
-        # Get and store the encoder data
-        self._wheel_data = self._encoder.get_data()
-        self._config.save_wheel_encoder_data(self._wheel_data)
+        # the encoder data and configuration are saved by the finalization pipeline
+        self._finalized = self._config.finish_recording()
         pass
\ No newline at end of file
@@ -0,0 +1,56 @@
+import time
+
+from pylab.metrics import metrics
+
+
+class FrameTimingMixin:
+    """Per-frame stage timing for the sequenced-acquisition loops of the engines.
+
+    Records, per engine (`metrics_name`):
+
+    - `<name>.pop`: popping the image from the circular buffer
+    - `<name>.metadata`: assembling the frame metadata
+    - `<name>.emit`: the runner handing the frame to its outputs (writers, previews),
+      i.e. the time the engine's generator is suspended at `yield`
+
+    The drain loops call `_payload(...)` instead of `_next_seqimg_payload(...)` and
+    `_resumed()` right after their `yield`. Nothing is timed unless `metrics.enabled`.
+    """
+
+    metrics_name = 'engine'
+
+    def _histograms(self):
+        hists = self.__dict__.get('_stage_histograms')
+        if hists is None:
+            name = self.metrics_name
+            hists = self._stage_histograms = tuple(
+                metrics.histogram(f'{name}.{stage}') for stage in ('pop', 'metadata', 'emit')
+            )
+        return hists
+
+    def get_frame_metadata(self, *args, **kwargs):
+        if not metrics.enabled:
+            return super().get_frame_metadata(*args, **kwargs)
+        t = time.perf_counter()
+        meta = super().get_frame_metadata(*args, **kwargs)
+        self._metadata_s = time.perf_counter() - t
+        return meta
+
+    def _payload(self, *args, **kwargs):
+        """`_next_seqimg_payload`, timing the buffer pop and metadata separately."""
+        if not metrics.enabled:
+            return self._next_seqimg_payload(*args, **kwargs)
+        pop, metadata, _ = self._histograms()
+        self._metadata_s = 0.0
+        t = time.perf_counter()
+        payload = self._next_seqimg_payload(*args, **kwargs)
+        now = time.perf_counter()
+        metadata.record(self._metadata_s)
+        pop.record(now - t - self._metadata_s)
+        self._yielded_at = now
+        return payload
+
+    def _resumed(self) -> None:
+        """Record how long the runner took to emit the frame just yielded."""
+        if metrics.enabled and (t := self.__dict__.pop('_yielded_at', None)) is not None:
+            self._histograms()[2].record(time.perf_counter() - t)
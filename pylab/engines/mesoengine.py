@@ -1,17 +1,25 @@
 from . import *
+from .armed import _NOT_ARMED, ArmedSequenceMixin
+from .instrumented import FrameTimingMixin
+from pylab.logs import RateLimitedLog
 import logging
 from typing import TYPE_CHECKING
 if TYPE_CHECKING:
     from pylab.io import DataManager, SerialWorker
 
-class MesoEngine(MDAEngine):
+logger = logging.getLogger(__name__)
+_drain_log = RateLimitedLog(logger)  # per-frame messages, at most one per second
+
+class MesoEngine(ArmedSequenceMixin, FrameTimingMixin, MDAEngine):
+    metrics_name = 'meso'
+
     def __init__(self, mmc: pymmcore_plus.CMMCorePlus, use_hardware_sequencing: bool = True) -> None:
         super().__init__(mmc)
         self._mmc = mmc
         self.use_hardware_sequencing = use_hardware_sequencing
         self._config = None
         self._encoder: SerialWorker = None
-        self._wheel_data = None
+        self._finalized = None  # Future of the encoder data being saved
         
     def set_config(self, cfg) -> None:
         self._config = cfg
@@ -19,11 +27,13 @@ class MesoEngine(MDAEngine):
     
     def setup_sequence(self, sequence: useq.MDASequence) -> SummaryMetaV1 | None:
         """Perform setup required before the sequence is executed."""
+        if (meta := self._armed_metadata(sequence)) is not _NOT_ARMED:
+            return meta  # already set up by `arm`
         self._mmc.getPropertyObject('Arduino-Switch', 'State').loadSequence(self._config.led_pattern)
         self._mmc.getPropertyObject('Arduino-Switch', 'State').setValue(4) # seems essential to initiate serial communication
         self._mmc.getPropertyObject('Arduino-Switch', 'State').startSequence()
 
-        logging.info(f'{self.__str__()} setup_sequence loaded LED sequence at time: {time.time()}')
+        logger.info('%s setup_sequence loaded LED sequence at time: %s', self, time.time())
         
         print('Arduino loaded')
         return super().setup_sequence(sequence)
@@ -55,7 +65,7 @@ class MesoEngine(MDAEngine):
             0,  # intervalMS  # TODO: add support for this
             True,  # stopOnOverflow
         )
-        logging.info(f'{self.__str__()} exec_sequenced_event with {n_events} events at t0 {t0}')
+        logger.info('%s exec_sequenced_event with %d events at t0 %s', self, n_events, t0)
         self.post_sequence_started(event)
 
         n_channels = self._mmc.getNumberOfCameraChannels()
@@ -64,38 +74,39 @@ class MesoEngine(MDAEngine):
         # block until the sequence is done, popping images in the meantime
         while self._mmc.isSequenceRunning():
             if remaining := self._mmc.getRemainingImageCount():
-                yield self._next_seqimg_payload(
+                yield self._payload(
                     *next(iter_events), remaining=remaining - 1, event_t0=event_t0_ms
                 )
+                self._resumed()
                 count += 1
             else:
                 if count == n_events:
-                    logging.debug(f'{self.__str__()} stopped MDA: \n{self._mmc} with \n{count} events and \n{remaining} remaining with \n{self._mmc.getRemainingImageCount()} images in buffer')                 
+                    logger.debug('%s stopped MDA after %d of %d events', self, count, n_events)
                     break
                     #self._mmc.stopSequenceAcquisition() Might be source of early cutoff by not allowing engine to save the rest of image in buffer
                 #time.sleep(0.001) #does not seem to optimize performance either way
 
         if self._mmc.isBufferOverflowed():  # pragma: no cover
-            logging.debug(f'OVERFLOW {self.__str__()}; Images in buffer: {self.mmcore.getRemainingImageCount()}')
+            logger.debug('OVERFLOW %s after %d events', self, count)
             raise MemoryError("Buffer overflowed")
 
         while remaining := self._mmc.getRemainingImageCount():
-            logging.debug(f'{self.__str__()} Saving Remaining Images in buffer \n{self._mmc} with \n{count} events and \n{remaining} remaining with \n{self._mmc.getRemainingImageCount()} images in buffer')
-            yield self._next_seqimg_payload(
+            _drain_log.debug('%s saving remaining images, %d in buffer after %d events', self, remaining, count)
+            yield self._payload(
                 *next(iter_events), remaining=remaining - 1, event_t0=event_t0_ms
             )
+            self._resumed()
             count += 1
     
     def teardown_sequence(self, sequence: useq.MDASequence) -> None:
         """Perform any teardown required after the sequence has been executed."""
-        logging.info(f'{self.__str__()} teardown_sequence at time: {time.time()}')
+        logger.info('%s teardown_sequence at time: %s', self, time.time())
         
         # Stop the Arduino LED Sequence
         self._mmc.getPropertyObject('Arduino-Switch', 'State').stopSequence()
         # Stop the SerialWorker collecting encoder data
         self._encoder.stop()
-        # Get and store the encoder data
-        self._wheel_data = self._encoder.get_data()
-        self._config.save_wheel_encoder_data(self._wheel_data)
+        # the encoder data and configuration are saved by the finalization pipeline
+        self._finalized = self._config.finish_recording()
         pass
     
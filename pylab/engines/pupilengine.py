@@ -1,10 +1,18 @@
 from . import *
+from .armed import ArmedSequenceMixin
+from .instrumented import FrameTimingMixin
+from pylab.logs import RateLimitedLog
 import logging
 from typing import TYPE_CHECKING
 if TYPE_CHECKING:
     from pylab.io import DataManager, SerialWorker
 
-class PupilEngine(MDAEngine):
+logger = logging.getLogger(__name__)
+_drain_log = RateLimitedLog(logger)  # per-frame messages, at most one per second
+
+class PupilEngine(ArmedSequenceMixin, FrameTimingMixin, MDAEngine):
+    metrics_name = 'pupil'
+
     def __init__(self, mmc: pymmcore_plus.CMMCorePlus, use_hardware_sequencing: bool = True) -> None:
         super().__init__(mmc)
         self._mmc = mmc
@@ -40,7 +48,7 @@ class PupilEngine(MDAEngine):
             0,  # intervalMS  # TODO: add support for this
             True,  # stopOnOverflow
         )
-        logging.info(f'{self.__str__()} exec_sequenced_event with {n_events} events at t0 {t0}')
+        logger.info('%s exec_sequenced_event with %d events at t0 %s', self, n_events, t0)
         self.post_sequence_started(event)
 
         n_channels = self._mmc.getNumberOfCameraChannels()
@@ -50,13 +58,14 @@ class PupilEngine(MDAEngine):
         while True:
             if self._mmc.isSequenceRunning():
                 if remaining := self._mmc.getRemainingImageCount():
-                    yield self._next_seqimg_payload(
+                    yield self._payload(
                         *next(iter_events), remaining=remaining - 1, event_t0=event_t0_ms
                     )
+                    self._resumed()
                     count += 1
                 else:
                     if count == n_events:
-                        logging.debug(f'{self.__str__()} stopped MDA: \n{self._mmc} with \n{count} events and \n{remaining} remaining with \n{self._mmc.getRemainingImageCount()} images in buffer')
+                        logger.debug('%s stopped MDA after %d of %d events', self, count, n_events)
                         break
                         #self._mmc.stopSequenceAcquisition() 
                     time.sleep(0.001)
@@ -64,19 +73,20 @@ class PupilEngine(MDAEngine):
                 break
 
         if self._mmc.isBufferOverflowed():  # pragma: no cover
-            logging.debug(f'OVERFLOW {self.__str__()} MDA: \n{self._mmc} with \n{count} events and \n{remaining} remaining with \n{self._mmc.getRemainingImageCount()} images in buffer')
+            logger.debug('OVERFLOW %s after %d events', self, count)
             raise MemoryError("Buffer overflowed")
 
         while remaining := self._mmc.getRemainingImageCount():
-            logging.debug(f'{self.__str__()} Saving Remaining Images in buffer \n{self._mmc} with \n{count} events and \n{remaining} remaining with \n{self._mmc.getRemainingImageCount()} images in buffer')
-            yield self._next_seqimg_payload(
+            _drain_log.debug('%s saving remaining images, %d in buffer after %d events', self, remaining, count)
+            yield self._payload(
                 *next(iter_events), remaining=remaining - 1, event_t0=event_t0_ms
             )
+            self._resumed()
             count += 1
     
     def teardown_sequence(self, sequence: useq.MDASequence) -> None:
         """Perform any teardown required after the sequence has been executed."""
-        logging.info(f'{self.__str__()} teardown_sequence at time: {time.time()}')
+        logger.info('%s teardown_sequence at time: %s', self, time.time())
         pass
     
 
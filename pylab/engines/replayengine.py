@@ -0,0 +1,184 @@
+from . import *
+from .armed import _NOT_ARMED, ArmedSequenceMixin
+from .instrumented import FrameTimingMixin
+from pylab.logs import RateLimitedLog
+import logging
+from datetime import datetime
+
+import numpy as np
+from pymmcore_plus.core._sequencing import SequencedEvent
+
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from pylab.io import SerialWorker, SessionReader
+
+logger = logging.getLogger(__name__)
+_drain_log = RateLimitedLog(logger)  # per-frame messages, at most one per second
+
+
+class ReplaySchedule:
+    """When each replayed frame is due, from the recorded frame times.
+
+    Frame `i` of the recording is due `(t[i] - t[0]) / speed` seconds after the replay
+    started. Past the last recorded frame the recording is replayed again from the
+    start, one frame period after the last frame. `speed <= 0` replays as fast as
+    possible.
+    """
+
+    def __init__(self, runner_time_ms: np.ndarray, speed: float = 1.0) -> None:
+        t = np.asarray(runner_time_ms, dtype=np.float64)
+        valid = np.isfinite(t)
+        if not valid.any():
+            raise ValueError("The recording has no frame timestamps to replay")
+        if not valid.all():  # fill frames without a timestamp from their neighbours
+            idx = np.arange(len(t))
+            t = np.interp(idx, idx[valid], t[valid])
+        self.times_s = (t - t[0]) / 1000
+        period = float(np.median(np.diff(self.times_s))) if len(t) > 1 else 0.0
+        self.cycle_s = self.times_s[-1] + period
+        self.speed = speed
+
+    def __len__(self) -> int:
+        return len(self.times_s)
+
+    def due(self, frame: int) -> float:
+        """Seconds after the start of the replay at which replayed `frame` is due."""
+        if self.speed <= 0:
+            return 0.0
+        cycle, i = divmod(frame, len(self))
+        return (cycle * self.cycle_s + self.times_s[i]) / self.speed
+
+    def backlog(self, frame: int, elapsed: float) -> int:
+        """Frames after `frame` that were already due `elapsed` seconds into the replay."""
+        if self.speed <= 0:
+            return 0
+        cycle, i = divmod(frame, len(self))
+        t = elapsed * self.speed - cycle * self.cycle_s
+        return max(int(np.searchsorted(self.times_s, t, side='right')) - i - 1, 0)
+
+
+class ReplayEngine(ArmedSequenceMixin, FrameTimingMixin, MDAEngine):
+    """Re-emit a recorded session through the normal runner/writer/preview path.
+
+    Frames are read from the session's stack (`SessionReader`) at the recorded timing,
+    or `speed` times faster, instead of from a camera. Nothing is sent to the hardware:
+    events are not set up, and the core is only used for the frame metadata. Each frame's
+    metadata records the `replay_frame` it came from, and `images_remaining_in_buffer` is
+    the number of frames that are already due, i.e. how far the pipeline lags behind the
+    recording.
+
+    The 'meso' replay engine stops the encoder and saves its data at the end of the
+    sequence, like `MesoEngine`.
+    """
+    metrics_name = 'replay'
+
+    def __init__(
+        self,
+        mmc: pymmcore_plus.CMMCorePlus,
+        use_hardware_sequencing: bool = True,
+        session: str | None = None,
+        modality: str = 'meso',
+        speed: float = 1.0,
+        run: int = 0,
+    ) -> None:
+        super().__init__(mmc)
+        self._mmc = mmc
+        self.use_hardware_sequencing = use_hardware_sequencing
+        self.session = session
+        self.modality = modality
+        self.speed = float(speed)
+        self.run = int(run)
+        self.metrics_name = f'replay-{modality}'
+        self._config = None
+        self._encoder: SerialWorker = None
+        self._finalized = None  # Future of the encoder data being saved
+        self._reader: SessionReader | None = None
+        self._schedule: ReplaySchedule | None = None
+        self._stacks: dict = {}
+        self._sources: tuple[np.ndarray, np.ndarray] | None = None
+        self._index = 0
+        self._t_start: float | None = None
+
+    def set_config(self, cfg) -> None:
+        self._config = cfg
+        self._encoder = cfg.encoder
+
+    def setup_sequence(self, sequence: useq.MDASequence) -> SummaryMetaV1 | None:
+        """Open the recording and reset the replay clock."""
+        from pylab.io.reader import SessionReader
+
+        if (meta := self._armed_metadata(sequence)) is not _NOT_ARMED:
+            return meta  # already opened by `arm`
+        if self.session is None:
+            raise ValueError('ReplayEngine needs the BIDS directory of a recorded session')
+        self._reader = SessionReader(self.session, self.run)
+        md = self._reader.frame_metadata(self.modality)
+        self._schedule = ReplaySchedule(md['runner_time_ms'], self.speed)
+        if self.modality == 'meso' and 'led_channel' in md and self._reader.channels:
+            # demultiplexed recording: frame i lives in its LED channel's file
+            self._sources = (md['led_channel'], md['channel_index'])
+            self._stacks = {ch: self._reader.images(self.modality, ch) for ch in self._reader.channels}
+        else:
+            # the frame's row is its T index: dropped frames left blank rows
+            self._sources = (None, md['t_index'])
+            self._stacks = {None: self._reader.images(self.modality)}
+        self._index = 0
+        self._t_start = None
+        logger.info('%s replaying %s (%s, %d frames) at %sx', self, self.session, self.modality, len(self._schedule), self.speed or 'max')
+        return super().setup_sequence(sequence)
+
+    def setup_event(self, event: useq.MDAEvent) -> None:
+        """Nothing to set up; frames come from the recording."""
+
+    def teardown_event(self, event: useq.MDAEvent) -> None:
+        pass
+
+    def exec_event(self, event: useq.MDAEvent) -> Iterable['PImagePayload']:
+        """Yield one recorded frame per event, each when it is due."""
+        events = event.events if isinstance(event, SequencedEvent) else (event,)
+        if self._t_start is None:
+            self._t_start = time.perf_counter()
+        for sub_event in events:
+            self._wait_until_due()
+            yield self._payload(sub_event)
+            self._resumed()
+
+    def _wait_until_due(self) -> None:
+        delay = self._t_start + self._schedule.due(self._index) - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+    def _frame(self, i: int) -> np.ndarray:
+        channels, rows = self._sources
+        channel = None if channels is None else str(channels[i])
+        return np.asarray(self._stacks[channel][rows[i]])
+
+    def _next_seqimg_payload(self, event: useq.MDAEvent, channel: int = 0, **kwargs) -> 'PImagePayload':
+        """Read the next recorded frame and return it as an image payload."""
+        schedule = self._schedule
+        frame = self._index
+        elapsed = time.perf_counter() - self._t_start
+        i = frame % len(schedule)
+        img = self._frame(i)
+        remaining = schedule.backlog(frame, elapsed)
+        _drain_log.debug('%s replayed frame %d, %d frames behind', self, frame, remaining)
+
+        meta = self.get_frame_metadata(event, prop_values=(), runner_time_ms=elapsed * 1000)
+        meta['hardware_triggered'] = True
+        meta['images_remaining_in_buffer'] = remaining
+        meta['camera_metadata'] = {'TimeReceivedByCore': datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')}
+        meta['replay_frame'] = i
+        self._index += 1
+        return img, event, meta
+
+    def teardown_sequence(self, sequence: useq.MDASequence) -> None:
+        """Close the recording; the 'meso' engine also stops and saves the encoder."""
+        logger.info('%s teardown_sequence at time: %s', self, time.time())
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+        self._stacks = {}
+        if self.modality == 'meso' and self._encoder is not None:
+            self._encoder.stop()
+            # the encoder data and configuration are saved by the finalization pipeline
+            self._finalized = self._config.finish_recording()
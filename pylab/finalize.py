@@ -0,0 +1,148 @@
+"""Background finalization of recordings, off the MDA runner threads.
+
+At the end of a sequence the engines and output handlers used to do all their
+teardown I/O on the runner thread: saving the configuration and the encoder CSV
+(`MesoEngine.teardown_sequence`), serializing the frame metadata JSON and truncating
+grown TIFFs (`CustomWriter.finalize_metadata`), and writing summary images
+(`FrameStatsAccumulator.save`). `sequenceFinished` was only emitted after all of it,
+so the cores could not start the next run until the disk work had finished.
+
+Now each of them takes what it needs from the recording on the runner thread and
+submits the I/O to `finalizer`, a small thread pool shared by every stream. Tasks from
+both cores (and from consecutive recordings) overlap. `progress` reports each task as
+it completes, and `completion()` returns a future for everything still pending.
+
+Example Usage:
+    ```python
+    from pylab.finalize import finalizer
+    finalizer.progress.connect(lambda name, done, total: print(f"{name}: {done}/{total}"))
+    future = finalizer.submit("meso metadata", writer.finalize_metadata)
+    finalizer.completion().result()   # every pending task, e.g. before exiting
+    ```
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError
+from typing import Any, Callable, Optional
+
+from psygnal import Signal
+
+FINALIZE_WORKERS = 2
+
+logger = logging.getLogger(__name__)
+
+
+class FinalizationPipeline:
+    """Thread pool for end-of-recording work, with progress and completion tracking.
+
+    Parameters
+    ----------
+    workers : int
+        Tasks that run at the same time.
+    """
+
+    progress = Signal(str, int, int)
+    """Emitted from a worker thread as each task finishes: (task name, done, submitted)."""
+
+    def __init__(self, workers: int = FINALIZE_WORKERS) -> None:
+        self.workers = workers
+        self.errors: list[tuple[str, BaseException]] = []
+        self._executor: Optional[ThreadPoolExecutor] = None
+        # each task's future, name and a future set once its bookkeeping is done
+        self._pending: dict[Future, tuple[str, Future]] = {}
+        self._submitted = 0
+        self._done = 0
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self) -> list[str]:
+        """Names of the tasks that have not finished yet."""
+        with self._lock:
+            return [name for name, _ in self._pending.values()]
+
+    def submit(self, name: str, fn: Callable[..., Any], *args, **kwargs) -> Future:
+        """Run `fn(*args, **kwargs)` on the pool; returns its future."""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="finalize")
+            future = self._executor.submit(self._run, name, fn, args, kwargs)
+            self._pending[future] = (name, Future())
+            self._submitted += 1
+        future.add_done_callback(self._finished)
+        return future
+
+    def _run(self, name: str, fn: Callable[..., Any], args: tuple, kwargs: dict) -> Any:
+        t0 = time.perf_counter()
+        result = fn(*args, **kwargs)
+        logger.info("Finalized %s in %.2f s", name, time.perf_counter() - t0)
+        return result
+
+    def _finished(self, future: Future) -> None:
+        with self._lock:
+            name, settled = self._pending[future]
+            self._done += 1
+            done, submitted = self._done, self._submitted
+        try:
+            if (error := future.exception()) is not None:
+                self.errors.append((name, error))
+                logger.error("Finalizing %s failed", name, exc_info=error)
+            self.progress.emit(name, done, submitted)
+        finally:
+            # only now is the task no longer pending, so `completion()` can't resolve
+            # before its error is recorded and its progress reported
+            with self._lock:
+                del self._pending[future]
+                if not self._pending:  # count the next batch from zero
+                    self._done = self._submitted = 0
+            settled.set_result(None)
+
+    def completion(self) -> Future:
+        """A future for every task that is still pending.
+
+        Its result is the list of their results, in submission order; it raises the
+        first error if any of them failed. Resolved at once if nothing is pending.
+        """
+        with self._lock:
+            futures = list(self._pending)
+            settled = [s for _, s in self._pending.values()]
+        combined: Future = Future()
+        if not futures:
+            combined.set_result([])
+            return combined
+        remaining = [len(futures)]
+        lock = threading.Lock()
+
+        def _one_done(_: Future) -> None:
+            with lock:
+                remaining[0] -= 1
+                if remaining[0]:
+                    return
+            errors = [e for f in futures if (e := f.exception()) is not None]
+            if errors:
+                combined.set_exception(errors[0])
+            else:
+                combined.set_result([f.result() for f in futures])
+
+        for future in settled:
+            future.add_done_callback(_one_done)
+        return combined
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until every pending task has finished; False on timeout."""
+        try:
+            self.completion().exception(timeout)
+        except TimeoutError:
+            return False
+        return True
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop the pool once its tasks are done (a new pool is started on the next submit)."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+
+finalizer = FinalizationPipeline()
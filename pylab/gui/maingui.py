@@ -6,17 +6,21 @@ from pymmcore_plus import CMMCorePlus
 from qtconsole.rich_jupyter_widget import RichJupyterWidget
 from qtconsole.inprocess import QtInProcessKernelManager
 
+from PyQt6.QtCore import Qt, QTimer
 from PyQt6.QtWidgets import (
     QMainWindow, 
     QWidget, 
     QHBoxLayout, 
     QVBoxLayout,
+    QLabel,
+    QMessageBox,
 )
 
 from PyQt6.QtGui import QIcon
 
 from pylab.gui.widgets import MDA, ConfigController, EncoderWidget
 from pylab.config import ExperimentConfig
+from pylab.watchdog import StallDetector, Stall
 
 class MainWindow(QMainWindow):
     def __init__(self, cfg: ExperimentConfig):
@@ -30,6 +34,7 @@ class MainWindow(QMainWindow):
         self.acquisition_gui = MDA(self.config)
         self.config_controller = ConfigController(self.config)
         self.encoder_widget = EncoderWidget(self.config)
+        self.watchdog = StallDetector()
         self.initialize_console(cfg) # Initialize the IPython console
         #--------------------------------------------------------------------#
 
@@ -54,11 +59,34 @@ class MainWindow(QMainWindow):
         #self.config_controller._mmc1.events.sequenceAcquisitionStopped.connect(self._on_end)
         #--------------------------------------------------------------------#
 
+        #============================== Watchdog ============================#
+        # main-thread timer lateness; stalls are logged with the blocking stack
+        self.watchdog.callbacks.append(self._on_stall)
+        self._watchdog_timer = QTimer(self)
+        self._watchdog_timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self._watchdog_timer.setInterval(int(self.watchdog.interval * 1000))
+        self._watchdog_timer.timeout.connect(self.watchdog.heartbeat)
+        self._watchdog_timer.start()
+        self.watchdog.start()
+        self.stall_label = QLabel('GUI stalls: 0')
+        self.statusBar().addPermanentWidget(self.stall_label)
+        stall_report_action = self.menuBar().addAction("Stall Report")
+        stall_report_action.triggered.connect(self.show_stall_report)
+        # files of finished recordings still being written in the background
+        self.finalize_label = QLabel('')
+        self.statusBar().addPermanentWidget(self.finalize_label)
+        self.config_controller.finalizationProgress.connect(self._on_finalization_progress)
+        #--------------------------------------------------------------------#
+
 
     #============================== Methods =================================#    
     def record(self):
         print('recording')
         
+    def show_stall_report(self):
+        """Show the event-loop stall histogram and the code most often blocking it."""
+        QMessageBox.information(self, "Event-loop stalls", self.watchdog.summary())
+
     def toggle_console(self):
         """Show or hide the IPython console."""
         if self.console_widget and self.console_widget.isVisible():
@@ -102,10 +130,15 @@ class MainWindow(QMainWindow):
         self.console_widget.kernel_client = self.kernel_client
 
         # Expose variables to the console's namespace
+        from pylab.metrics import metrics
+        from pylab.profiler import profiler
         self.kernel.shell.push({
             'mda': self.acquisition_gui.mda,
             'self': self,
             'config': cfg,
+            'metrics': metrics,  # hot-path latency histograms: metrics.enable(), print(metrics.format())
+            'profiler': profiler,  # all-thread sampling profiler: profiler.toggle()
+            'watchdog': self.watchdog,  # event-loop stalls: print(watchdog.summary())
             # Optional, so you can use 'self' directly in the console
         })
     #----------------------------------------------------------------------------#
@@ -116,13 +149,29 @@ class MainWindow(QMainWindow):
         #self.config_controller.save_config()
         self.plots()
 
+    def _on_stall(self, stall: Stall) -> None:
+        """Called in the main thread as soon as a stall ends."""
+        hist = self.watchdog.stall_durations
+        self.stall_label.setText(f'GUI stalls: {hist.count} (last {stall.duration_s * 1000:.0f} ms, max {hist.max * 1000:.0f} ms)')
+        self.stall_label.setToolTip(self.watchdog.summary())
+
+    def _on_finalization_progress(self, name: str, done: int, total: int) -> None:
+        if done < total:
+            self.finalize_label.setText(f'Finalizing {done}/{total}: {name}')
+        else:
+            self.finalize_label.setText(f'Finalized {total} task{"s" if total != 1 else ""}')
+
     def _update_config(self, config):
         self.config: ExperimentConfig = config
         self._refresh_mda_gui()
         self._refresh_save_gui()
         
     def _refresh_mda_gui(self):
-        self.acquisition_gui.mda.setValue(self.config.meso_sequence)
+        # rebuilding the MDA widget is expensive; only do it when the sequence changed
+        sequence = self.config.meso_sequence
+        if sequence != getattr(self, '_mda_sequence', None):
+            self._mda_sequence = sequence
+            self.acquisition_gui.mda.setValue(sequence)
         
     def _refresh_save_gui(self):
         self.acquisition_gui.mda.save_info.setValue({'save_dir': str(self.config.bids_dir),  'save_name': str(self.config.meso_file_path), 'format': 'ome-tiff', 'should_save': True})
@@ -0,0 +1,66 @@
+from PyQt6.QtCore import QAbstractTableModel, QModelIndex, Qt, pyqtSignal
+
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from pylab.config import ExperimentConfig
+
+
+class ConfigTableModel(QAbstractTableModel):
+    """Table model of the (Parameter, Value) pairs of an ExperimentConfig.
+
+    The model reads `ExperimentConfig.parameters` directly instead of copying it into
+    table items. Editing a value calls `update_parameter` and emits `dataChanged` for
+    that cell only, followed by `parameterEdited(key, value)`.
+    """
+    # ==================================== Signals ===================================== #
+    parameterEdited = pyqtSignal(str, object)
+    # ------------------------------------------------------------------------------------- #
+
+    HEADERS = ('Parameter', 'Value')
+
+    def __init__(self, config: 'ExperimentConfig', parent=None):
+        super().__init__(parent)
+        self._config = config
+        self._keys: list[str] = list(config.parameters)
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._keys)
+
+    def columnCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def data(self, index: QModelIndex, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or role not in (Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.EditRole):
+            return None
+        key = self._keys[index.row()]
+        if index.column() == 0:
+            return key
+        return str(self._config.parameters.get(key, ''))
+
+    def headerData(self, section: int, orientation: Qt.Orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return self.HEADERS[section]
+        return None
+
+    def flags(self, index: QModelIndex) -> Qt.ItemFlag:
+        flags = super().flags(index)
+        if index.isValid() and index.column() == 1:
+            flags |= Qt.ItemFlag.ItemIsEditable
+        return flags
+
+    def setData(self, index: QModelIndex, value, role=Qt.ItemDataRole.EditRole) -> bool:
+        if not index.isValid() or index.column() != 1 or role != Qt.ItemDataRole.EditRole:
+            return False
+        key = self._keys[index.row()]
+        if str(self._config.parameters.get(key, '')) == value:
+            return False  # committing an unchanged editor is not an edit
+        self._config.update_parameter(key, value)
+        self.dataChanged.emit(index, index, [Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.EditRole])
+        self.parameterEdited.emit(key, value)
+        return True
+
+    def reload(self):
+        """Re-read the parameter keys, e.g. after `load_parameters` replaced the dict."""
+        self.beginResetModel()
+        self._keys = list(self._config.parameters)
+        self.endResetModel()
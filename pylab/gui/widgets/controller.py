@@ -4,7 +4,7 @@ import subprocess #for PsychoPy Subprocess
 import datetime
 
 from qtpy.QtCore import Qt
-from PyQt6.QtCore import pyqtSignal, QProcess
+from PyQt6.QtCore import pyqtSignal, QProcess, QTimer
 from PyQt6.QtWidgets import (
     QHBoxLayout,
     QLabel,
@@ -13,10 +13,10 @@ from PyQt6.QtWidgets import (
     QLineEdit,
     QPushButton,
     QComboBox,
-    QTableWidget,
+    QTableView,
+    QAbstractItemView,
     QHeaderView,
     QFileDialog,
-    QTableWidgetItem,
     QMessageBox,
     QInputDialog,
     QDialog,
@@ -25,10 +25,20 @@ from PyQt6.QtGui import QImage, QPixmap
 
 from pymmcore_plus import CMMCorePlus
 
+from pylab.finalize import finalizer
+from pylab.gui.widgets.config_table import ConfigTableModel
+from pylab.logs import start_session_log, stop_session_log
+from pylab.profiler import profiler, session_directory
+from pylab.sessionqueue import SessionQueue, arduino_led_limits
+from pylab.supervisor import SessionSupervisor
+
 from typing import TYPE_CHECKING
 if TYPE_CHECKING:
     from pylab.config import ExperimentConfig
 
+# Quiet period after the last table edit before configUpdated is emitted
+CONFIG_UPDATE_DEBOUNCE_MS = 300
+
 class ConfigController(QWidget):
     """AcquisitionEngine object for the napari-mesofield plugin.
     The object connects to the Micro-Manager Core object instances and the Config object.
@@ -47,6 +57,9 @@ class ConfigController(QWidget):
     
     record(): 
         triggers the MDA sequence with the configuration parameters
+
+    record_queue():
+        records a list of experiment JSON files back to back, preparing each during the previous recording
     
     launch_psychopy(): 
         launches the PsychoPy experiment as a subprocess with ExperimentConfig parameters
@@ -62,10 +75,10 @@ class ConfigController(QWidget):
         returns a list of JSON files in the current directory
     _update_config(): 
         updates the experiment configuration from a new JSON file
-    _on_table_edit(): 
-        updates the configuration parameters when the table is edited
+    _on_parameter_edited(): 
+        schedules a debounced configUpdated after a parameter is edited in the table
     _refresh_config_table(): 
-        refreshes the configuration table to reflect current parameters
+        reloads the configuration table model after new parameters are loaded
     _test_led(): 
         tests the LED pattern by sending a test sequence to the Arduino-Switch device
     _stop_led(): 
@@ -77,6 +90,8 @@ class ConfigController(QWidget):
     # ==================================== Signals ===================================== #
     configUpdated = pyqtSignal(object)
     recordStarted = pyqtSignal()
+    finalizationProgress = pyqtSignal(str, int, int)  # task, done, submitted (queued to the GUI thread)
+    sessionFinished = pyqtSignal()  # every stream of the recording has stopped
     # ------------------------------------------------------------------------------------- #
     
     def __init__(self, cfg):
@@ -85,6 +100,10 @@ class ConfigController(QWidget):
         self._mmc2: CMMCorePlus = cfg._cores[1]
         self.config: ExperimentConfig = cfg
         self.psychopy_process = None
+        self.supervisor: SessionSupervisor | None = None
+        self._supervisor_slots: list = []
+        self.session_queue: SessionQueue | None = None
+        finalizer.progress.connect(self._on_finalization_progress)
 
         # Create main layout
         self.layout = QVBoxLayout(self)
@@ -116,14 +135,20 @@ class ConfigController(QWidget):
 
         # 3. Table widget to display the configuration parameters loaded from the JSON
         self.layout.addWidget(QLabel('Experiment Config:'))
-        self.config_table = QTableWidget()
-        self.config_table.setEditTriggers(QTableWidget.AllEditTriggers)
-        self.config_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.config_model = ConfigTableModel(self.config, self)
+        self.config_table = QTableView()
+        self.config_table.setModel(self.config_model)
+        self.config_table.setEditTriggers(QAbstractItemView.EditTrigger.AllEditTriggers)
+        self.config_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
         self.layout.addWidget(self.config_table)
 
         # 4. Record button to start the MDA sequence
         self.record_button = QPushButton('Record')
         self.layout.addWidget(self.record_button)
+
+        # 4b. Queue button to record several JSON configurations back to back
+        self.queue_button = QPushButton('Record Queue...')
+        self.layout.addWidget(self.queue_button)
         
         # 5. Test LED button to test the LED pattern
         self.test_led_button = QPushButton("Test LED")
@@ -147,13 +172,21 @@ class ConfigController(QWidget):
 
         self.directory_button.clicked.connect(self._select_directory)
         self.json_dropdown.currentIndexChanged.connect(self._update_config)
-        self.config_table.cellChanged.connect(self._on_table_edit)
+        self.config_model.parameterEdited.connect(self._on_parameter_edited)
         self.record_button.clicked.connect(self.record)
+        self.queue_button.clicked.connect(self.record_queue)
+        self.sessionFinished.connect(self._on_session_finished)
         self.test_led_button.clicked.connect(self._test_led)
         self.stop_led_button.clicked.connect(self._stop_led)
         self.add_note_button.clicked.connect(self._add_note)
         self.snap_button.clicked.connect(lambda: self._save_snapshot(self._mmc1.snap()))
 
+        # configUpdated makes listeners rebuild the MDA widgets; coalesce bursts of edits
+        self._config_update_timer = QTimer(self)
+        self._config_update_timer.setSingleShot(True)
+        self._config_update_timer.setInterval(CONFIG_UPDATE_DEBOUNCE_MS)
+        self._config_update_timer.timeout.connect(lambda: self.configUpdated.emit(self.config))
+
         # ------------------------------------------------------------------------------------- #
 
         # Initialize the config table
@@ -189,11 +222,7 @@ class ConfigController(QWidget):
 
         # Generate a unique filename with a timestamp
         timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-<<<<<<< HEAD:pylab/gui/widgets/controller.py
         filename = self.config._generate_unique_file_path(f"snapped_{timestamp}", bids_type='func')
-=======
-        filename = self.config._generate_unique_file_path(f"snapped_{timestamp}")
->>>>>>> da84531910d585a57eff03c77d6df62cb70d591f:pylab/widgets/controller.py
         file_path = os.path.join(self.config.bids_dir, filename)
 
         # Save the image as a PNG file using matplotlib
@@ -206,24 +235,126 @@ class ConfigController(QWidget):
 
     def record(self):
         """Run the MDA sequence with the global Config object parameters loaded from JSON."""
-        from pylab.io import CustomWriter
         import threading
 
-        thread1 = threading.Thread(target=self._mmc1.run_mda, args=(self.config.meso_sequence,), kwargs={'output': CustomWriter(self.config.meso_file_path)})
-        thread2 = threading.Thread(target=self._mmc2.run_mda, args=(self.config.pupil_sequence,), kwargs={'output': CustomWriter(self.config.pupil_file_path)})
+        # reserve every output file of this recording up front
+        paths = self.config.allocate_session_paths()
+        session_log = start_session_log(paths.log)
+        profile_dir = session_directory(self.config.bids_dir, paths.run)
+        profiler.begin_session(profile_dir)
+        self.config.attach_encoder_sink()  # encoder samples go to disk as they arrive
+        meso_outputs, pupil_outputs = self.config.mda_outputs(paths)
+
+        # every stream is armed on its own thread and released from one barrier
+        supervisor = SessionSupervisor(report_path=paths.streams)
+        self._disconnect_supervisor()
+        for name, mmc, sequence, outputs in (
+            ('meso', self._mmc1, self.config.meso_sequence, meso_outputs),
+            ('pupil', self._mmc2, self.config.pupil_sequence, pupil_outputs),
+        ):
+            self._connect_supervisor(mmc.mda.events.frameReady, supervisor.first_sample_callback(name))
+            # arming sets up the sequence and clears the buffer, so `start` only triggers
+            supervisor.add_stream(
+                name,
+                start=lambda mmc=mmc, sequence=sequence, outputs=outputs: mmc.run_mda(sequence, output=outputs),
+                arm=lambda mmc=mmc, sequence=sequence: mmc.mda.engine.arm(sequence),
+                stop=mmc.mda.cancel,
+            )
+        encoder = self.config.encoder
+        slot = supervisor.first_sample_callback('encoder')
+        encoder.serialDataReceived.connect(slot, Qt.ConnectionType.DirectConnection)
+        self._supervisor_slots.append((encoder.serialDataReceived, slot))
+        # the encoder is stopped by MesoEngine.teardown_sequence; here it is only waited on
+        supervisor.add_stream('encoder', start=encoder.start, arm=encoder.arm, wait=encoder.wait)
+        self.supervisor = supervisor
 
         # Wait for spacebar press if start_on_trigger is True
         wait_for_trigger = self.config.start_on_trigger
         if wait_for_trigger == True:
             self.launch_psychopy()
+            self.psychopy_process.started.connect(supervisor.first_sample_callback('psychopy'))
             self.show_popup()
-        # Emit signal to notify other widgets
 
-        thread1.start()
-        thread2.start()
-        self.config.encoder.start()
+        supervisor.start()
+        profiler.phase('recording')
+        # log the start skew once every stream has finished, off the GUI thread
+        threading.Thread(target=self._finish_session, args=(supervisor, session_log, profile_dir), name='session-supervisor', daemon=True).start()
         self.recordStarted.emit() # Signals to start the MDA sequence
 
+    def _finish_session(self, supervisor: SessionSupervisor, session_log, profile_dir: str):
+        """Wait on every stream and on the finalization of its files, then write the
+        profile and close the log of the recording.
+
+        A queued next recording may already have started by then; its log and profile
+        are left alone.
+        """
+        try:
+            supervisor.wait()
+            self.sessionFinished.emit()
+            finalizer.wait()
+        finally:
+            profiler.end_session(profile_dir)
+            stop_session_log(session_log)
+
+    def record_queue(self):
+        """Record a list of JSON configurations back to back, or stop the running queue.
+
+        Each configuration is validated and its files reserved while the previous one
+        records (see `SessionQueue`); the cores stay initialized in between.
+        """
+        if self.session_queue is not None:
+            self._stop_queue('Session queue stopped after the current recording.')
+            return
+        files, _ = QFileDialog.getOpenFileNames(
+            self, 'Select JSON Configurations (in recording order)', self.directory_line_edit.text(), 'JSON (*.json)'
+        )
+        if not files:
+            return
+        self.session_queue = SessionQueue(self.config, files, *arduino_led_limits(self._mmc1))
+        self.session_queue.start()
+        self._record_next_queued()
+
+    def _record_next_queued(self):
+        try:
+            prepared = self.session_queue.next()
+        except ValueError as e:
+            self._stop_queue(f'Session queue stopped:\n{e}')
+            return
+        if prepared is None:
+            self._stop_queue(f'Session queue finished ({len(self.session_queue)} sessions).')
+            return
+        self.queue_button.setText(f'Stop Queue ({self.session_queue.remaining} left)')
+        self._refresh_config_table()
+        self.record()
+
+    def _stop_queue(self, message: str):
+        self.session_queue.close()
+        self.session_queue = None
+        self.queue_button.setText('Record Queue...')
+        self._refresh_config_table()
+        QMessageBox.information(self, 'Session Queue', message)
+
+    def _on_session_finished(self):
+        if self.session_queue is not None:
+            self._record_next_queued()
+
+    def _on_finalization_progress(self, name: str, done: int, total: int):
+        # called in a finalization thread; the Qt signal hands it to the GUI thread
+        self.finalizationProgress.emit(name, done, total)
+
+    def _connect_supervisor(self, signal, slot):
+        signal.connect(slot)
+        self._supervisor_slots.append((signal, slot))
+
+    def _disconnect_supervisor(self):
+        """Detach the first-sample callbacks of the previous recording."""
+        for signal, slot in self._supervisor_slots:
+            try:
+                signal.disconnect(slot)
+            except (TypeError, RuntimeError, ValueError):
+                pass
+        self._supervisor_slots = []
+
     def launch_psychopy(self):
         """Launches a PsychoPy experiment as a subprocess with the current ExperimentConfig parameters."""
         from pylab.subprocesses import psychopy
@@ -292,33 +423,14 @@ class ConfigController(QWidget):
                 print(f"Trouble updating ExperimentConfig from AcquisitionEngine:\n{json_path_input}\nConfiguration not updated.")
                 print(e) 
 
-    def _on_table_edit(self, row, column):
-        """Update the configuration parameters when the table is edited."""
-        try:
-            if self.config_table.item(row, 0) and self.config_table.item(row, 1):
-                key = self.config_table.item(row, 0).text()
-                value = self.config_table.item(row, 1).text()
-                self.config.update_parameter(key, value)
-            self.configUpdated.emit(self.config) # EMIT SIGNAL TO LISTENERS                
-        except Exception as e:
-            print(f"Error updating config from table: check AcquisitionEngine._on_table_edit()\n{e}")
+    def _on_parameter_edited(self, key, value):
+        """Restart the debounce timer; configUpdated fires once edits pause."""
+        self._config_update_timer.start()
 
     def _refresh_config_table(self):
-        """Refresh the configuration table to reflect current parameters."""
-        df = self.config.dataframe
-        self.config_table.blockSignals(True)  # Prevent signals while updating the table
-        self.config_table.clear()
-        self.config_table.setRowCount(len(df))
-        self.config_table.setColumnCount(len(df.columns))
-        self.config_table.setHorizontalHeaderLabels(df.columns.tolist())
-
-        for i, row in df.iterrows():
-            for j, (col_name, value) in enumerate(row.items()):
-                item = QTableWidgetItem(str(value))
-                self.config_table.setItem(i, j, item)
-
-        self.config_table.blockSignals(False)  # Re-enable signals
-
+        """Reload the table model after the parameters were replaced (e.g. a new JSON)."""
+        self._config_update_timer.stop()
+        self.config_model.reload()
         self.configUpdated.emit(self.config) # EMIT SIGNAL TO LISTENERS
         
     def _test_led(self):
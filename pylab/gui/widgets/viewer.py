@@ -6,6 +6,9 @@ from qtpy.QtCore import Qt, QTimer
 from qtpy.QtGui import QImage, QPixmap
 from qtpy.QtWidgets import QHBoxLayout, QLabel, QWidget
 from threading import Lock
+import time
+
+from pylab.metrics import metrics
 
 class ImagePreview(QWidget):
     """
@@ -152,6 +155,7 @@ class ImagePreview(QWidget):
         self._cmap: str = "grayscale"
         self._current_frame = None
         self._frame_lock = Lock()
+        self._display_hist = metrics.histogram(f"preview.{self._mmcore.getCameraDevice() or 'camera'}.display")
 
         # Set up image label
         self.image_label = QLabel()
@@ -241,6 +245,14 @@ class ImagePreview(QWidget):
     def _display_image(self, img: np.ndarray) -> None:
         if img is None:
             return
+        if metrics.enabled:
+            t = time.perf_counter()
+            self._show(img)
+            self._display_hist.record(time.perf_counter() - t)
+        else:
+            self._show(img)
+
+    def _show(self, img: np.ndarray) -> None:
         qimage = self._convert_to_qimage(img)
         if qimage is not None:
             pixmap = QPixmap.fromImage(qimage)
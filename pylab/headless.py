@@ -0,0 +1,304 @@
+"""Record a session without the Qt GUI.
+
+`HeadlessRunner` does what `ConfigController.record` does (same session paths, same
+MDA output handlers, same `SessionSupervisor` start) but without the MainWindow,
+previews and console, so nothing competes with the acquisition threads. While the
+session runs, a `ThroughputMonitor` prints per-stream frame rate, progress and the
+backlog of frames waiting in each core's circular buffer. `run_queue` records several
+experiments back to back (see `SessionQueue`).
+
+Example Usage:
+    ```
+    python -m pylab run-mda --params params.json --experiment experiment.json
+    python -m pylab run-mda --params params.json --experiment a.json --experiment b.json
+    ```
+"""
+
+import logging
+import time
+from concurrent.futures import Future, wait
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Callable, Optional
+
+from pylab.finalize import finalizer
+from pylab.logs import start_session_log, stop_session_log
+from pylab.profiler import profiler, session_directory
+from pylab.sessionqueue import SessionQueue, arduino_led_limits
+from pylab.supervisor import SessionSupervisor
+
+if TYPE_CHECKING:
+    from pymmcore_plus import CMMCorePlus
+    from pylab.config import ExperimentConfig, SessionPaths
+
+STATS_INTERVAL_S = 2.0
+
+
+@dataclass
+class StreamStats:
+    """ Throughput of one stream since the last report """
+    name: str
+    frames: int
+    expected: Optional[int]
+    fps: float
+    backlog: Optional[int] = None
+
+    def __str__(self) -> str:
+        total = f"/{self.expected}" if self.expected else ""
+        backlog = f" buffer {self.backlog}" if self.backlog is not None else ""
+        return f"{self.name} {self.fps:6.1f} fps ({self.frames}{total}){backlog}"
+
+
+class ThroughputMonitor:
+    """Count frames per stream and report rate and circular-buffer backlog.
+
+    Counting is a single integer increment in the emitting thread, so the monitor
+    can stay connected to `frameReady` for the whole recording.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.perf_counter) -> None:
+        self.clock = clock
+        self._counts: dict[str, int] = {}
+        self._expected: dict[str, Optional[int]] = {}
+        self._backlog: dict[str, Callable[[], int]] = {}
+        self._last: dict[str, int] = {}
+        self._last_time: Optional[float] = None
+        self.t0: Optional[float] = None
+
+    def add_core(self, name: str, mmc: 'CMMCorePlus', expected: Optional[int] = None) -> Callable[..., None]:
+        """Count the frames of an MDA core; its backlog is `getRemainingImageCount`.
+
+        Returns the callback connected to `frameReady`.
+        """
+        count = self.counter(name, expected)
+        mmc.mda.events.frameReady.connect(count)
+        self._backlog[name] = mmc.getRemainingImageCount
+        return count
+
+    def counter(self, name: str, expected: Optional[int] = None) -> Callable[..., None]:
+        """A callback that counts one sample of `name` per call."""
+        self._counts[name] = 0
+        self._expected[name] = expected
+
+        def count(*args) -> None:
+            self._counts[name] += 1
+        return count
+
+    def start(self) -> None:
+        self.t0 = self._last_time = self.clock()
+        self._last = dict.fromkeys(self._counts, 0)
+
+    def stats(self) -> list[StreamStats]:
+        """Per-stream totals and the rate since the previous call."""
+        now = self.clock()
+        last = now if self._last_time is None else self._last_time
+        elapsed = max(now - last, 1e-9)
+        stats = []
+        for name, frames in list(self._counts.items()):
+            backlog = self._backlog.get(name)
+            stats.append(StreamStats(
+                name=name,
+                frames=frames,
+                expected=self._expected.get(name),
+                fps=(frames - self._last.get(name, 0)) / elapsed,
+                backlog=backlog() if backlog is not None else None,
+            ))
+            self._last[name] = frames
+        self._last_time = now
+        return stats
+
+    def line(self) -> str:
+        """One status line: elapsed time followed by every stream's stats."""
+        elapsed = self.clock() - self.t0 if self.t0 is not None else 0.0
+        return f"[{elapsed:7.1f} s] " + " | ".join(str(s) for s in self.stats())
+
+
+class HeadlessRunner:
+    """Run both MDA sequences and the wheel encoder of one session, without the GUI.
+
+    Parameters
+    ----------
+    config : ExperimentConfig
+        Configuration with initialized cores (`config.hardware.initialize_cores`).
+    interval : float
+        Seconds between throughput reports.
+    echo : callable
+        Where status lines go (default: print).
+    """
+
+    def __init__(self, config: 'ExperimentConfig', interval: float = STATS_INTERVAL_S, echo: Callable[[str], None] = print) -> None:
+        self.config = config
+        self.interval = interval
+        self.echo = echo
+        self.monitor = ThroughputMonitor()
+        self.supervisor = SessionSupervisor()
+        self.interrupted = False
+        self._connections: list[tuple[Any, Callable]] = []
+
+    def _build(self) -> tuple[logging.Handler, str]:
+        """Reserve the session's files and attach its streams; returns its log handler and profile directory."""
+        config = self.config
+        paths = config.allocate_session_paths()
+        session_log = start_session_log(paths.log)
+        profile_dir = session_directory(config.bids_dir, paths.run)
+        profiler.begin_session(profile_dir)
+        try:
+            self._attach(paths)
+        except BaseException:
+            # nothing will be recorded, so `run` won't end this session's log and profile
+            profiler.end_session(profile_dir)
+            stop_session_log(session_log)
+            raise
+        return session_log, profile_dir
+
+    def _attach(self, paths: 'SessionPaths') -> None:
+        """Attach the monitor and supervisor to the cores and encoder for `paths`."""
+        config = self.config
+        self.supervisor.report_path = paths.streams  # start times, for aligning the stream clocks
+        config.attach_encoder_sink()  # encoder samples go to disk as they arrive
+        meso_outputs, pupil_outputs = config.mda_outputs(paths)
+        mmc1, mmc2 = config._cores
+        for name, mmc, sequence, outputs, expected in (
+            ('meso', mmc1, config.meso_sequence, meso_outputs, config.num_meso_frames),
+            ('pupil', mmc2, config.pupil_sequence, pupil_outputs, config.num_pupil_frames),
+        ):
+            self._connections.append((mmc.mda.events.frameReady, self.monitor.add_core(name, mmc, expected)))
+            self._connect(mmc.mda.events.frameReady, self.supervisor.first_sample_callback(name))
+            # arming sets up the sequence and clears the buffer, so `start` only triggers
+            self.supervisor.add_stream(
+                name,
+                start=lambda mmc=mmc, sequence=sequence, outputs=outputs: mmc.run_mda(sequence, output=outputs),
+                arm=lambda mmc=mmc, sequence=sequence: mmc.mda.engine.arm(sequence),
+                stop=mmc.mda.cancel,
+            )
+        encoder = config.encoder
+        # no event loop runs here, so per-sample slots must be called in the encoder thread
+        from PyQt6.QtCore import Qt
+        direct = Qt.ConnectionType.DirectConnection
+        self._connect(encoder.serialDataReceived, self.monitor.counter('encoder'), direct)
+        self._connect(encoder.serialDataReceived, self.supervisor.first_sample_callback('encoder'), direct)
+        # the encoder is stopped by the meso engine's teardown_sequence
+        self.supervisor.add_stream('encoder', start=encoder.start, arm=encoder.arm, wait=encoder.wait)
+
+    def _connect(self, signal, slot, *args) -> None:
+        signal.connect(slot, *args)
+        self._connections.append((signal, slot))
+
+    def _disconnect(self) -> None:
+        """Detach the monitor and supervisor of the last session from the cores and encoder."""
+        for signal, slot in self._connections:
+            try:
+                signal.disconnect(slot)
+            except (TypeError, RuntimeError, ValueError):
+                pass
+        self._connections = []
+
+    def _finalize(self) -> None:
+        """Wait for the recording's files to be written by the finalization pipeline."""
+        def progress(name: str, done: int, total: int) -> None:
+            self.echo(f"Finalized {name} ({done}/{total})")
+
+        finalizer.progress.connect(progress)
+        try:
+            t0 = time.perf_counter()
+            finalizer.wait()
+            self.echo(f"Finalization done {time.perf_counter() - t0:.2f} s after the streams stopped")
+        finally:
+            finalizer.progress.disconnect(progress)
+
+    def _end_session(self, session_log: logging.Handler, profile_dir: str) -> Future:
+        """Write the profile and close the log of a session once its files are finalized.
+
+        Returns a future that is done when they are. A session that has started since
+        keeps its own log and profile.
+        """
+        ended: Future = Future()
+
+        def end(_: Future) -> None:
+            try:
+                profiler.end_session(profile_dir)
+                stop_session_log(session_log)
+            finally:
+                ended.set_result(None)
+
+        finalizer.completion().add_done_callback(end)
+        return ended
+
+    def _running(self) -> bool:
+        return any(
+            s.handle is not None and s.handle.is_alive()
+            for name, s in self.supervisor.streams.items() if name != 'encoder'
+        )
+
+    def run(self) -> dict:
+        """Record the session; returns the supervisor's start/skew report."""
+        session = None  # log handler and profile dir, once `_build` has started them
+        try:
+            session = self._build()
+            return self._run()
+        finally:
+            self._disconnect()
+            # without a session of its own, `_end_session` would end whichever is current
+            if session is not None:
+                self._end_session(*session).result()
+
+    def run_queue(self, experiments: list[str]) -> list[dict]:
+        """Record the experiments back to back; returns one report per recorded session.
+
+        Each session is prepared while the one before it records. The queue stops at
+        the first experiment that fails validation, or on Ctrl+C.
+        """
+        queue = SessionQueue(self.config, experiments, *arduino_led_limits(self.config._cores[0]))
+        queue.start()
+        reports: list[dict] = []
+        sessions_ended: list[Future] = []
+        ended: Optional[float] = None
+        try:
+            while not self.interrupted:
+                try:
+                    prepared = queue.next()
+                except ValueError as e:
+                    self.echo(f"Session queue stopped: {e}")
+                    break
+                if prepared is None:
+                    break
+                gap = f", {time.perf_counter() - ended:.2f} s after the previous one" if ended is not None else ""
+                self.echo(f"Session {queue.index}/{len(queue)}: {prepared.experiment}{gap}")
+                self.monitor = ThroughputMonitor()
+                self.supervisor = SessionSupervisor()
+                session = None
+                try:
+                    session = self._build()
+                    reports.append(self._run(finalize=False))
+                finally:
+                    self._disconnect()
+                    # closed when this session's files are finalized, while the next one records
+                    if session is not None:
+                        sessions_ended.append(self._end_session(*session))
+                ended = time.perf_counter()
+        finally:
+            queue.close()
+            self._finalize()
+            wait(sessions_ended)
+        return reports
+
+    def _run(self, finalize: bool = True) -> dict:
+        self.echo(f"Recording {self.config.bids_dir} (meso {self.config.num_meso_frames} frames, pupil {self.config.num_pupil_frames} frames)")
+        self.supervisor.start()
+        profiler.phase('recording')
+        self.monitor.start()
+        try:
+            while self._running():
+                time.sleep(self.interval)
+                self.echo(self.monitor.line())
+        except KeyboardInterrupt:
+            self.echo("Interrupted, stopping all streams...")
+            self.interrupted = True
+            report = self.supervisor.teardown()
+        else:
+            report = self.supervisor.wait()
+        self.echo(self.monitor.line())
+        self.echo(f"Start skew: first sample {report['first_sample_skew_ms']} ms, release {report['release_skew_ms']} ms")
+        if finalize:
+            self._finalize()
+        logging.info(f"{self.__class__.__name__} finished: {report}")
+        return report
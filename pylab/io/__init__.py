@@ -1,3 +1,8 @@
 from .writer import CustomWriter
+from .stats import FrameStatsAccumulator
+from .transform import FrameTransform
+from .quicklook import QuicklookWriter
+from .reader import SessionReader
+from .catalog import SessionCatalog
 from .manager import DataManager
 from .worker import SerialWorker
\ No newline at end of file
@@ -0,0 +1,237 @@
+"""SQLite catalog of the files recorded under a save directory.
+
+Every file written into the BIDS layout of `ExperimentConfig.bids_dir`
+
+    <save_dir>/<protocol>/sub-<subject>/ses-<session>/[func|beh]/<file>
+
+is registered by its writer (`CustomWriter`, `ExperimentConfig.save_wheel_encoder_data`)
+in `<save_dir>/catalog.sqlite` when it is created, and updated with its frame count and
+duration when it is finalized. Sessions and files can then be found with an indexed
+query instead of walking the directory tree.
+
+Paths are stored relative to the save directory, so the tree can be moved as a whole.
+The catalog file is only created by the first registration; lookups open it read-only
+and find nothing in a save directory without one.
+
+Example Usage:
+    ```python
+    catalog = SessionCatalog(config.save_dir)
+    for row in catalog.files(subject='001', modality='meso'):
+        print(row['path'], row['frames'], row['duration_s'])
+    meso = catalog.find(config.bids_dir, 'meso')
+    ```
+"""
+
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from typing import Optional
+from urllib.request import pathname2url
+
+CATALOG_FILENAME = "catalog.sqlite"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    protocol TEXT,
+    subject TEXT,
+    session TEXT,
+    task TEXT,
+    modality TEXT,
+    channel TEXT,
+    bids_dir TEXT,
+    frames INTEGER,
+    duration_s REAL,
+    created REAL
+);
+CREATE INDEX IF NOT EXISTS files_session ON files (subject, session);
+CREATE INDEX IF NOT EXISTS files_bids_dir ON files (bids_dir, modality);
+CREATE INDEX IF NOT EXISTS files_modality ON files (modality);
+"""
+COLUMNS = ("path", "protocol", "subject", "session", "task", "modality", "channel",
+           "bids_dir", "frames", "duration_s", "created")
+
+_MODALITY = re.compile(r"_(meso|pupil|encoder-data|configuration)(?:_\d+)?(?:_led-([^._]+))?(?:_\d+)?\.")
+_TASK = re.compile(r"_task-([^_]+)_")
+
+
+def parse_bids_path(path: str) -> Optional[dict]:
+    """Save dir and BIDS entities of a file in the session layout, or None if it isn't in one."""
+    parts = os.path.abspath(path).split(os.sep)
+    sub = next((i for i in range(len(parts) - 1, 0, -1) if parts[i].startswith("sub-")), None)
+    if sub is None or sub + 1 >= len(parts) or not parts[sub + 1].startswith("ses-"):
+        return None
+    name = parts[-1]
+    modality = _MODALITY.search(name)
+    task = _TASK.search(name)
+    return {
+        "save_dir": os.sep.join(parts[: sub - 1]) or os.sep,
+        "protocol": parts[sub - 1],
+        "subject": parts[sub][len("sub-"):],
+        "session": parts[sub + 1][len("ses-"):],
+        "task": task.group(1) if task else None,
+        "modality": modality.group(1).replace("-data", "") if modality else None,
+        "channel": modality.group(2) if modality else None,
+        "bids_dir": os.sep.join(parts[: sub + 2]),
+    }
+
+
+class SessionCatalog:
+    """The file catalog of one save directory (`ExperimentConfig.save_dir`).
+
+    A connection is opened per call, so the catalog can be used from the writer,
+    encoder and GUI threads at the same time. Nothing is written to disk until a file is
+    registered; queries on a save dir without a catalog return nothing.
+    """
+
+    _instances: dict[str, "SessionCatalog"] = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, save_dir: str) -> None:
+        self.save_dir = os.path.abspath(save_dir)
+        self.path = os.path.join(self.save_dir, CATALOG_FILENAME)
+        self._created = False
+
+    def __repr__(self) -> str:
+        return f"SessionCatalog('{self.save_dir}')"
+
+    @property
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def _connect(self, readonly: bool = False) -> sqlite3.Connection:
+        if readonly:
+            db = sqlite3.connect(f"file:{pathname2url(self.path)}?mode=ro", uri=True, timeout=10)
+        else:
+            db = sqlite3.connect(self.path, timeout=10)
+        db.row_factory = sqlite3.Row
+        return db
+
+    def _create(self) -> None:
+        """Create the catalog file and its schema, once per instance."""
+        if self._created and self.exists:
+            return
+        os.makedirs(self.save_dir, exist_ok=True)
+        with closing(self._connect()) as db, db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(_SCHEMA)
+        self._created = True
+
+    def _relative(self, path: str) -> str:
+        return os.path.relpath(os.path.abspath(path), self.save_dir)
+
+    def _row(self, row: sqlite3.Row) -> dict:
+        row = dict(row)
+        row["path"] = os.path.join(self.save_dir, row["path"])
+        row["bids_dir"] = os.path.join(self.save_dir, row["bids_dir"])
+        return row
+
+    def register(self, path: str, frames: Optional[int] = None, duration_s: Optional[float] = None, **entities) -> None:
+        """Add (or replace) a file; entities default to those parsed from its path."""
+        parsed = parse_bids_path(path) or {}
+        row = {k: entities.get(k, parsed.get(k)) for k in COLUMNS}
+        row.update(
+            path=self._relative(path),
+            bids_dir=self._relative(row["bids_dir"] or os.path.dirname(path)),
+            frames=frames,
+            duration_s=duration_s,
+            created=time.time(),
+        )
+        self._create()
+        with closing(self._connect()) as db, db:
+            db.execute(
+                f"INSERT OR REPLACE INTO files ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+                [row[k] for k in COLUMNS],
+            )
+
+    def update(self, path: str, frames: Optional[int] = None, duration_s: Optional[float] = None) -> None:
+        """Record the final frame count and duration of a registered file."""
+        if not self.exists:
+            return
+        with closing(self._connect()) as db, db:
+            db.execute(
+                "UPDATE files SET frames = COALESCE(?, frames), duration_s = COALESCE(?, duration_s) WHERE path = ?",
+                (frames, duration_s, self._relative(path)),
+            )
+
+    def files(self, bids_dir: Optional[str] = None, **filters) -> list[dict]:
+        """Registered files matching the given column values, oldest first."""
+        if bids_dir is not None:
+            filters["bids_dir"] = self._relative(bids_dir)
+        unknown = set(filters) - set(COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown catalog columns: {sorted(unknown)}")
+        where = " AND ".join(f"{k} = ?" for k in filters) or "1"
+        if not self.exists:
+            return []
+        with closing(self._connect(readonly=True)) as db:
+            rows = db.execute(f"SELECT * FROM files WHERE {where} ORDER BY created, path", list(filters.values()))
+            return [self._row(r) for r in rows]
+
+    def find(self, bids_dir: str, modality: str, channel: Optional[str] = None) -> Optional[str]:
+        """Most recently registered `modality` file of a session, or None."""
+        filters = {"modality": modality}
+        if channel is not None:
+            filters["channel"] = str(channel)
+        rows = self.files(bids_dir, **filters)
+        if channel is None:
+            rows = [r for r in rows if r["channel"] is None] or rows
+        return rows[-1]["path"] if rows else None
+
+    def sessions(self, **filters) -> list[dict]:
+        """One row per session (protocol, subject, session, bids_dir) with its file count."""
+        unknown = set(filters) - {"protocol", "subject", "session"}
+        if unknown:
+            raise ValueError(f"Unknown session filters: {sorted(unknown)}")
+        where = " AND ".join(f"{k} = ?" for k in filters) or "1"
+        if not self.exists:
+            return []
+        with closing(self._connect(readonly=True)) as db:
+            rows = db.execute(
+                "SELECT protocol, subject, session, bids_dir, COUNT(*) AS files FROM files "
+                f"WHERE {where} GROUP BY bids_dir ORDER BY protocol, subject, session",
+                list(filters.values()),
+            )
+            return [{**dict(r), "bids_dir": os.path.join(self.save_dir, r["bids_dir"])} for r in rows]
+
+    @classmethod
+    def for_path(cls, path: str, create: bool = False) -> Optional["SessionCatalog"]:
+        """The catalog of the save dir a BIDS file or session directory lives in.
+
+        Returns None outside the BIDS layout, or if the save dir has no catalog yet and
+        `create` is False. Instances are shared per save dir.
+        """
+        parsed = parse_bids_path(os.path.join(path, "_") if os.path.isdir(path) else path)
+        if not parsed:
+            return None
+        save_dir = os.path.abspath(parsed["save_dir"])
+        with cls._instances_lock:
+            catalog = cls._instances.get(save_dir)
+            if catalog is None:
+                catalog = cls._instances[save_dir] = cls(save_dir)
+        return catalog if create or catalog.exists else None
+
+
+def register_file(path: str, frames: Optional[int] = None, duration_s: Optional[float] = None, **entities) -> None:
+    """Register `path` in its save dir's catalog; files outside the BIDS layout are ignored.
+
+    Cataloguing is best effort and never interrupts the writer that calls it.
+    """
+    try:
+        if (catalog := SessionCatalog.for_path(path, create=True)) is not None:
+            catalog.register(path, frames, duration_s, **entities)
+    except (OSError, sqlite3.Error) as e:
+        logging.info(f"SessionCatalog: could not register {path}: {e}")
+
+
+def update_file(path: str, frames: Optional[int] = None, duration_s: Optional[float] = None) -> None:
+    """Record the final frame count/duration of a registered file (best effort)."""
+    try:
+        if (catalog := SessionCatalog.for_path(path)) is not None:
+            catalog.update(path, frames, duration_s)
+    except (OSError, sqlite3.Error) as e:
+        logging.info(f"SessionCatalog: could not update {path}: {e}")
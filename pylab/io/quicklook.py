@@ -0,0 +1,138 @@
+"""Low-resolution "quicklook" companion recordings for MDASequences.
+
+`QuicklookWriter` is an MDA output handler that is passed to `run_mda` alongside
+`CustomWriter`. It keeps every `decimate`-th frame, block-bins it and scales it to
+uint8 on a worker thread, and appends it to `<name>_quicklook.ome.tiff` next to the
+recording. A session can then be reviewed from a file that is a few hundred times
+smaller than the full-resolution stack.
+
+The quicklook is best effort: if the worker falls behind, frames are skipped rather
+than slowing the acquisition down, and the number of skipped frames is logged.
+"""
+
+import logging
+import os
+import queue
+import threading
+from concurrent.futures import Future
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from pylab.finalize import finalizer
+from pylab.io.transform import FrameTransform
+from pylab.io.writer import GrowingTiffStack, split_tiff_ext
+
+if TYPE_CHECKING:
+    import useq
+
+QUICKLOOK_SUFFIX = "_quicklook"
+
+
+class QuicklookWriter:
+    """MDA output handler that writes a binned, decimated uint8 companion stack.
+
+    Parameters
+    ----------
+    filename : str
+        Path of the full-resolution recording. The quicklook is written next to it as
+        `<name>_quicklook.ome.tiff`.
+    binning : int
+        Block size of the spatial (mean) binning.
+    decimate : int
+        Keep one frame out of every `decimate`. Use a multiple of the LED pattern
+        length to keep a single LED channel in the quicklook.
+    percentiles : tuple[float, float]
+        Intensity percentiles of the first kept frame that are mapped to 0 and 255.
+    max_backlog : int
+        Frames that may wait for the worker before new frames are skipped.
+    """
+
+    def __init__(
+        self,
+        filename: str,
+        binning: int = 8,
+        decimate: int = 4,
+        percentiles: tuple[float, float] = (0.5, 99.5),
+        max_backlog: int = 64,
+    ) -> None:
+        base, _ = split_tiff_ext(str(filename))
+        self.filename = f"{base}{QUICKLOOK_SUFFIX}.ome.tiff"
+        self.decimate = max(int(decimate), 1)
+        self.percentiles = percentiles
+        self._binning = FrameTransform([], binning=binning)
+        self._queue: queue.Queue = queue.Queue(maxsize=max_backlog)
+        self._thread: threading.Thread | None = None
+        self._stack: GrowingTiffStack | None = None
+        self._clims: tuple[float, float] | None = None
+        self._frame_count = 0
+        self.skipped = 0
+        # closing the quicklook of the last sequence, on the finalization pipeline
+        self.finalized: Future | None = None
+
+    def sequenceStarted(self, seq: "useq.MDASequence", meta: dict | None = None) -> None:
+        if self.finalized is not None:
+            self.finalized.result()
+        self._frame_count = 0
+        self.skipped = 0
+        self._clims = None
+        self._stack = None
+        self._thread = threading.Thread(target=self._run, name="QuicklookWriter", daemon=True)
+        self._thread.start()
+
+    def frameReady(self, frame: np.ndarray, event: "useq.MDAEvent", meta: dict) -> None:
+        # decimate on the T index, so a dropped frame doesn't shift the kept LED channel
+        keep = event.index.get("t", self._frame_count) % self.decimate == 0
+        self._frame_count += 1
+        if not keep:
+            return
+        try:
+            self._queue.put_nowait(frame)
+        except queue.Full:
+            self.skipped += 1
+
+    def sequenceFinished(self, seq: "useq.MDASequence") -> None:
+        """Let the worker drain, and close the stack on the finalization pipeline."""
+        if self._thread is not None:
+            self._queue.put(None)
+        self.finalized = finalizer.submit(f"quicklook {os.path.basename(self.filename)}", self._finish)
+
+    def _finish(self) -> None:
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._stack is not None:
+            self._stack.close()
+            logging.info(
+                f"{self.__class__.__name__} wrote {self._stack.frames_written} frames to "
+                f"{self.filename} ({self.skipped} skipped)"
+            )
+
+    def _run(self) -> None:
+        t = 0
+        while (frame := self._queue.get()) is not None:
+            small = self._to_uint8(self._binning.apply(frame))
+            if self._stack is None:
+                height, width = small.shape[-2:]
+                self._stack = GrowingTiffStack(
+                    self.filename,
+                    np.uint8,
+                    # T grows with the frames written and is set on close
+                    {"t": 0, "y": height, "x": width},
+                    metadata={
+                        "MapAnnotation": {
+                            "binning": str(self._binning.binning),
+                            "decimate": str(self.decimate),
+                        }
+                    },
+                )
+            self._stack[(t,)] = small
+            t += 1
+
+    def _to_uint8(self, frame: np.ndarray) -> np.ndarray:
+        if self._clims is None:
+            low, high = np.percentile(frame, self.percentiles)
+            self._clims = (float(low), float(high) if high > low else float(low) + 1)
+        low, high = self._clims
+        scaled = (frame.astype(np.float32) - low) * (255.0 / (high - low))
+        return np.clip(scaled, 0, 255).astype(np.uint8)
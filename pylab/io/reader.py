@@ -0,0 +1,336 @@
+"""Lazy, memory-mapped access to recorded PyLab sessions.
+
+A session is the BIDS directory built by `ExperimentConfig.bids_dir`:
+
+    <save_dir>/data/<protocol>/sub-<subject>/ses-<session>/
+        func/<...>_meso.ome.tiff            widefield stack (or *_meso_led-<ch>.ome.tiff)
+        func/<...>_meso.ome.tiffmetadata.json   frame metadata written by CustomWriter
+        func/<...>_pupil.ome.tiff           pupil stack
+        beh/<...>_encoder-data.csv          wheel encoder samples
+        <...>_configuration.csv             ExperimentConfig.list_parameters()
+
+Image data is never loaded as a whole: stacks are opened with `tifffile.memmap` the
+first time they are requested and the handles are cached on the reader.
+
+Example Usage:
+    ```python
+    with SessionReader(config.bids_dir) as session:
+        times = session.frame_metadata()['runner_time_ms']
+        for frames, chunk in session.iter_chunks(chunk_size=512, channel='4'):
+            ...
+    ```
+"""
+
+import glob
+import json
+import os
+from typing import Iterator
+
+import numpy as np
+
+from pylab.io.sink import encoder_dataframe, read_encoder_stream
+from pylab.io.writer import FRAME_MD_FILENAME, split_tiff_ext
+
+MODALITIES = ("meso", "pupil")
+
+
+class SessionReader:
+    """Open a recorded session from its BIDS directory.
+
+    Parameters
+    ----------
+    bids_dir : str
+        The session directory (`ExperimentConfig.bids_dir`).
+    run : int
+        Which recording to open when the session holds several runs; 0 is the first
+        run, 1 the files `ExperimentConfig.allocate_session_paths` suffixed with `_1`
+        (e.g. `*_meso_1.ome.tiff`), and so on.
+    task : str, optional
+        Which task's recording to open when the session holds several tasks (the
+        `_task-<task>_` entity of the image filenames). Files are only looked up by
+        task when it is given; the lookup raises if more than one file matches.
+    """
+
+    def __init__(self, bids_dir: str, run: int = 0, task: str | None = None) -> None:
+        self.bids_dir = os.path.abspath(bids_dir)
+        self.run = run
+        self.task = task
+        self._memmaps: dict[str, np.memmap] = {}
+        self._frame_metadata: dict[str, dict[str, np.ndarray]] = {}
+        self._parameters: dict | None = None
+
+    def __enter__(self) -> "SessionReader":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def __repr__(self) -> str:
+        task = f", task={self.task!r}" if self.task else ""
+        return f"SessionReader('{self.bids_dir}', run={self.run}{task})"
+
+    def close(self) -> None:
+        """Drop the cached memmaps (closing their file handles) and metadata."""
+        self._memmaps.clear()
+        self._frame_metadata.clear()
+
+    # ============================== Files ============================== #
+
+    def _run_file(self, directory: str, stem_glob: str, ext: str) -> str:
+        """Find `<stem_glob><ext>` for this run, where run N>0 carries a `_N` suffix.
+
+        Raises `FileNotFoundError` if no file matches, and `ValueError` if several do
+        (e.g. two tasks recorded in the session and no `task` given).
+        """
+        suffix = f"_{self.run}" if self.run else ""
+        pattern = os.path.join(self.bids_dir, directory, f"{stem_glob}{suffix}{ext}")
+        matches = sorted(glob.glob(pattern))
+        if not matches:
+            raise FileNotFoundError(f"No file matching {pattern}")
+        if len(matches) > 1:
+            names = ", ".join(os.path.basename(m) for m in matches)
+            raise ValueError(f"Several files match {pattern} ({names}); pass task= to choose one")
+        return matches[0]
+
+    def recording_path(self, modality: str = "meso") -> str:
+        """The filename `CustomWriter` was created with for `modality`.
+
+        The file itself may not exist when LED channels were demultiplexed, but its
+        frame metadata sidecar always does.
+        """
+        if modality not in MODALITIES:
+            raise ValueError(f"modality must be one of {MODALITIES}, got {modality!r}")
+        stem = f"*_task-{glob.escape(self.task)}_{modality}" if self.task else f"*_{modality}"
+        try:
+            sidecar = self._run_file("func", stem, f".ome.tiff{FRAME_MD_FILENAME}")
+            return sidecar[: -len(FRAME_MD_FILENAME)]
+        except FileNotFoundError:
+            return self._run_file("func", stem, ".ome.tiff")
+
+    def image_path(self, modality: str = "meso", channel: str | None = None) -> str:
+        """Path of the image stack for `modality`, or of one demultiplexed LED channel."""
+        path = self.recording_path(modality)
+        if channel is None:
+            return path
+        base, ext = split_tiff_ext(path)
+        return f"{base}_led-{channel}{ext}"
+
+    def metadata_path(self, modality: str = "meso") -> str:
+        """Path of the frame metadata JSON written by `CustomWriter.finalize_metadata`."""
+        return self.recording_path(modality) + FRAME_MD_FILENAME
+
+    @property
+    def encoder_path(self) -> str:
+        return self._run_file("beh", "*_encoder-data", ".csv")
+
+    @property
+    def encoder_stream_path(self) -> str:
+        """The binary encoder stream written during acquisition (`EncoderSink`)."""
+        return self._run_file("beh", "*_encoder-data", ".bin")
+
+    @property
+    def streams_path(self) -> str:
+        """The `SessionSupervisor` report saved with the run (`SessionPaths.streams`)."""
+        stem = f"*_task-{glob.escape(self.task)}_streams" if self.task else "*_streams"
+        return self._run_file("", stem, ".json")
+
+    def stream_report(self) -> dict | None:
+        """Start and first-sample times of every stream, or None if none were recorded."""
+        try:
+            with open(self.streams_path) as file:
+                text = file.read()
+        except FileNotFoundError:
+            return None
+        # the file is reserved empty and only written once every stream has finished
+        return json.loads(text) if text.strip() else None
+
+    @property
+    def channels(self) -> list[str]:
+        """LED channels recorded as separate files (empty if the stack is interleaved)."""
+        base, ext = split_tiff_ext(self.recording_path("meso"))
+        paths = glob.glob(f"{glob.escape(base)}_led-*{ext}")
+        return sorted(split_tiff_ext(p)[0].rsplit("_led-", 1)[1] for p in paths)
+
+    # ============================== Images ============================= #
+
+    def images(self, modality: str = "meso", channel: str | None = None) -> "np.memmap | FrameView":
+        """Read-only memmap of an image stack (cached).
+
+        With `channel`, returns the demultiplexed file for that LED if it was recorded
+        separately, else a lazy `FrameView` of that LED's frames in the interleaved stack.
+        """
+        if channel is not None and str(channel) not in self.channels:
+            return FrameView(self.images(modality), self.channel_indices(channel))
+
+        path = self.image_path(modality, channel)
+        if path not in self._memmaps:
+            from tifffile import memmap
+
+            self._memmaps[path] = memmap(path, mode="r")
+        return self._memmaps[path]
+
+    def channel_frames(self, channel: str) -> np.ndarray:
+        """Positions of the `channel` frames in the widefield frame metadata."""
+        md = self.frame_metadata("meso")
+        if "led_channel" in md:
+            return np.flatnonzero(md["led_channel"] == str(channel))
+        pattern = np.asarray(self.led_pattern)
+        return np.flatnonzero(pattern[md["t_index"] % len(pattern)] == str(channel))
+
+    def channel_indices(self, channel: str) -> np.ndarray:
+        """Indices of the `channel` frames in the interleaved widefield stack."""
+        return self.frame_metadata("meso")["t_index"][self.channel_frames(channel)]
+
+    def stack_rows(self, frames: np.ndarray, modality: str = "meso", channel: str | None = None) -> np.ndarray:
+        """Rows of the stack `images(modality, channel)` that hold the frames at metadata
+        positions `frames`.
+
+        Rows are the frames' T index (or their `channel_index` in a demultiplexed LED
+        file), not their position in the metadata: a dropped frame leaves a blank row.
+        """
+        md = self.frame_metadata(modality)
+        if channel is not None and str(channel) in self.channels:
+            return md["channel_index"][frames]
+        return md["t_index"][frames]
+
+    def iter_chunks(
+        self,
+        modality: str = "meso",
+        chunk_size: int = 256,
+        channel: str | None = None,
+        start: int = 0,
+        stop: int | None = None,
+    ) -> Iterator[tuple[slice, np.ndarray]]:
+        """Yield `(frames, chunk)` pairs covering the stack `chunk_size` frames at a time.
+
+        `frames` is the slice of the (channel) stack the chunk came from, and `chunk` is
+        an in-memory array, so only one chunk is resident at a time.
+        """
+        stack = self.images(modality, channel)
+        stop = len(stack) if stop is None else min(stop, len(stack))
+        for i in range(start, stop, chunk_size):
+            frames = slice(i, min(i + chunk_size, stop))
+            yield frames, np.asarray(stack[frames])
+
+    def trial_frames(self, trial: int, modality: str = "meso", trial_duration: float | None = None) -> slice:
+        """Frames acquired during `trial`, from the frame timestamps and trial duration (s).
+
+        The slice is over the frame metadata; `stack_rows` maps it to stack rows.
+        """
+        if trial_duration is None:
+            trial_duration = float(self.parameters["trial_duration"])
+        t_ms = self.frame_metadata(modality)["runner_time_ms"]
+        bounds = np.array([trial, trial + 1]) * trial_duration * 1000
+        start, stop = np.searchsorted(t_ms, bounds)
+        return slice(int(start), int(stop))
+
+    def trial(
+        self,
+        trial: int,
+        modality: str = "meso",
+        channel: str | None = None,
+        trial_duration: float | None = None,
+    ) -> "np.memmap | FrameView":
+        """Lazy view of the frames of `trial`, optionally restricted to one LED channel."""
+        frames = self.trial_frames(trial, modality, trial_duration)
+        in_trial = np.arange(frames.start, frames.stop)
+        if channel is not None:
+            in_trial = np.intersect1d(in_trial, self.channel_frames(channel))
+            channel = str(channel) if str(channel) in self.channels else None
+        rows = self.stack_rows(in_trial, modality, channel)
+        stack = self.images(modality, channel)
+        if channel is None and len(rows) and rows[-1] - rows[0] == len(rows) - 1:
+            return stack[rows[0] : rows[-1] + 1]  # no gaps: a plain memmap slice
+        return FrameView(stack, rows)
+
+    # ============================== Metadata =========================== #
+
+    def frame_metadata(self, modality: str = "meso") -> dict[str, np.ndarray]:
+        """Per-frame metadata as a dict of arrays (cached).
+
+        Always contains `runner_time_ms` and `t_index`, the frame's row in the stack
+        (its position in the metadata for recordings made before it was saved, which
+        had no gaps); `time_received` (datetime64) when the camera
+        reported `TimeReceivedByCore`; `led_phase`, `led_channel` and `channel_index`
+        when the writer demultiplexed LED channels.
+        """
+        if modality in self._frame_metadata:
+            return self._frame_metadata[modality]
+
+        with open(self.metadata_path(modality), "r") as file:
+            frames = json.load(file)["p0"]
+
+        md: dict[str, np.ndarray] = {
+            "runner_time_ms": np.array([f.get("runner_time_ms", np.nan) for f in frames], dtype=np.float64),
+            "t_index": np.array([f.get("t_index", i) for i, f in enumerate(frames)], dtype=np.int64),
+        }
+        received = [f.get("camera_metadata", {}).get("TimeReceivedByCore") for f in frames]
+        if frames and all(received):
+            md["time_received"] = np.array(received, dtype="datetime64[us]")
+        if frames and "led_channel" in frames[0]:
+            md["led_phase"] = np.array([f["led_phase"] for f in frames], dtype=np.int16)
+            md["led_channel"] = np.array([f["led_channel"] for f in frames])
+            md["channel_index"] = np.array([f["channel_index"] for f in frames], dtype=np.int64)
+
+        self._frame_metadata[modality] = md
+        return md
+
+    @property
+    def parameters(self) -> dict:
+        """Experiment parameters saved with the session (`*_configuration.csv`)."""
+        if self._parameters is None:
+            import pandas as pd
+
+            df = pd.read_csv(self._run_file("", "*_configuration", ".csv"))
+            self._parameters = dict(zip(df["Parameter"], df["Value"]))
+        return self._parameters
+
+    @property
+    def led_pattern(self) -> list[str]:
+        pattern = self.parameters.get("led_pattern", "['4', '4', '2', '2']")
+        if isinstance(pattern, str):
+            pattern = json.loads(pattern.replace("'", '"'))
+        return [str(led) for led in pattern]
+
+    def encoder(self):
+        """Wheel encoder samples as a pandas DataFrame, from the CSV or else the binary stream."""
+        import pandas as pd
+
+        try:
+            return pd.read_csv(self.encoder_path)
+        except FileNotFoundError:
+            return encoder_dataframe(read_encoder_stream(self.encoder_stream_path))
+
+
+class FrameView:
+    """Lazy selection of frames from a memmapped stack.
+
+    Behaves like a read-only array whose first axis is `indices`; frames are only read
+    from disk when the view is indexed.
+    """
+
+    def __init__(self, stack: np.ndarray, indices: np.ndarray) -> None:
+        self.stack = stack
+        self.indices = np.asarray(indices, dtype=np.int64)
+
+    @property
+    def shape(self) -> tuple[int, ...]:
+        return (len(self.indices), *self.stack.shape[1:])
+
+    @property
+    def dtype(self) -> np.dtype:
+        return self.stack.dtype
+
+    def __len__(self) -> int:
+        return len(self.indices)
+
+    def __array__(self, dtype=None, copy=None) -> np.ndarray:
+        return np.asarray(self.stack[self.indices], dtype=dtype)
+
+    def __getitem__(self, key) -> np.ndarray:
+        first, rest = (key[0], key[1:]) if isinstance(key, tuple) else (key, ())
+        selected = self.indices[first]
+        data = self.stack[selected]
+        if not rest:
+            return data
+        return data[rest] if np.ndim(selected) == 0 else data[(slice(None), *rest)]
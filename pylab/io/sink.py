@@ -0,0 +1,166 @@
+"""Streaming persistence of wheel encoder samples.
+
+`EncoderSink` is attached to the `SerialWorker` for the duration of a recording
+(`SerialWorker.sink`). Every processed sample is copied into a small fixed-size
+buffer, and the buffer is appended to `<name>_encoder-data.bin` whenever it fills or
+`flush_interval` seconds have passed. The worker then keeps no per-sample history, so
+its memory stays flat however long the session runs, and at most `flush_interval`
+seconds of samples are lost if the process dies.
+
+The file is a 16-byte header followed by packed little-endian records:
+
+    magic     8 bytes  b"PYLABENC"
+    version   uint32
+    itemsize  uint32   bytes per record
+    records   ENCODER_DTYPE (Clicks int32, Time float64, Speed float64)
+
+A record cut short by a crash is ignored by `read_encoder_stream`. The CSV the
+analysis code reads is written from the stream at the end of the recording
+(`export_encoder_csv`), unless `ExperimentConfig.export_encoder_csv` is off.
+
+Example Usage:
+    ```python
+    sink = EncoderSink(paths.encoder_stream)
+    worker.sink = sink              # before worker.start()
+    ...
+    worker.stop()                   # closes the sink
+    export_encoder_csv(paths.encoder_stream, paths.encoder)
+    ```
+"""
+
+import logging
+import os
+import struct
+import threading
+import time
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+STREAM_MAGIC = b"PYLABENC"
+STREAM_VERSION = 1
+ENCODER_DTYPE = np.dtype([("Clicks", "<i4"), ("Time", "<f8"), ("Speed", "<f8")])
+_HEADER = struct.Struct("<8sII")
+
+
+class EncoderSink:
+    """Batched, append-only binary file of encoder samples.
+
+    Parameters
+    ----------
+    path : str
+        The stream file; created (or truncated) when the sink is opened.
+    batch_size : int
+        Samples buffered in memory before they are written.
+    flush_interval : float
+        Seconds after which a partially filled buffer is written anyway.
+    fsync : bool
+        Also `os.fsync` after every write, so the samples survive a power loss and
+        not only a crash of the process.
+    """
+
+    def __init__(self, path: str, batch_size: int = 256, flush_interval: float = 1.0, fsync: bool = False) -> None:
+        self.path = path
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.count = 0  # samples written to the file
+        self._buffer = np.zeros(max(int(batch_size), 1), dtype=ENCODER_DTYPE)
+        self._pending = 0
+        self._last_flush = 0.0
+        self._file = None
+        self._lock = threading.Lock()
+
+    @property
+    def closed(self) -> bool:
+        return self._file is None
+
+    def open(self) -> "EncoderSink":
+        """Create the file and write its header."""
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, "wb")
+                self._file.write(_HEADER.pack(STREAM_MAGIC, STREAM_VERSION, ENCODER_DTYPE.itemsize))
+                self._file.flush()
+                self.count = self._pending = 0
+                self._last_flush = time.monotonic()
+        return self
+
+    def append(self, clicks: int, time_s: float, speed: float) -> None:
+        """Buffer one sample; writes the buffer when it is full or due."""
+        with self._lock:
+            if self._file is None:
+                raise ValueError(f"EncoderSink {self.path} is not open")
+            self._buffer[self._pending] = (clicks, time_s, speed)
+            self._pending += 1
+            if self._pending == len(self._buffer) or time.monotonic() - self._last_flush >= self.flush_interval:
+                self._write()
+
+    def flush(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._write()
+
+    def _write(self) -> None:
+        if self._pending:
+            self._file.write(self._buffer[: self._pending].tobytes())
+            self.count += self._pending
+            self._pending = 0
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self._last_flush = time.monotonic()
+
+    def close(self) -> None:
+        """Write the remaining samples and close the file."""
+        with self._lock:
+            if self._file is None:
+                return
+            self._write()
+            self._file.close()
+            self._file = None
+        logging.info(f"EncoderSink wrote {self.count} samples to {self.path}")
+
+    def read(self) -> np.ndarray:
+        """The samples written so far (flushes first)."""
+        self.flush()
+        return read_encoder_stream(self.path)
+
+    def __enter__(self) -> "EncoderSink":
+        return self.open()
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def read_encoder_stream(path: str) -> np.ndarray:
+    """The records of a stream file as a structured `ENCODER_DTYPE` array.
+
+    A trailing partial record (a write interrupted by a crash) is dropped.
+    """
+    with open(path, "rb") as f:
+        header = f.read(_HEADER.size)
+        if len(header) < _HEADER.size:
+            return np.zeros(0, dtype=ENCODER_DTYPE)
+        magic, version, itemsize = _HEADER.unpack(header)
+        if magic != STREAM_MAGIC or itemsize != ENCODER_DTYPE.itemsize:
+            raise ValueError(f"{path} is not an encoder stream (version {STREAM_VERSION})")
+        data = f.read()
+    whole = len(data) - len(data) % itemsize
+    return np.frombuffer(data[:whole], dtype=ENCODER_DTYPE).copy()
+
+
+def encoder_dataframe(records: np.ndarray) -> "pd.DataFrame":
+    """Encoder records as the `Clicks, Time, Speed` DataFrame of `SerialWorker.get_data`."""
+    import pandas as pd
+
+    return pd.DataFrame({name: records[name] for name in ENCODER_DTYPE.names})
+
+
+def export_encoder_csv(stream_path: str, csv_path: str) -> "pd.DataFrame":
+    """Write the CSV of a stream file; returns its DataFrame."""
+    df = encoder_dataframe(read_encoder_stream(stream_path))
+    df.to_csv(csv_path, index=False)
+    return df
@@ -0,0 +1,214 @@
+"""Online per-pixel summary statistics for MDASequences.
+
+`FrameStatsAccumulator` is an MDA output handler that is passed to `run_mda`
+alongside `CustomWriter`. Frames are handed to a worker thread which keeps, per LED
+channel, a running (Welford) mean and variance, the max projection and optionally an
+exponential running baseline, all in float32. When the sequence finishes the summary
+images are written next to the recording, so they never have to be recomputed from
+the multi-GB stack.
+
+The worker's backlog is bounded: if it falls behind, frames are left out of the
+statistics rather than piling up in RAM or slowing the acquisition down, and the
+number left out is logged and saved in the sidecar.
+
+Example Usage:
+    ```python
+    writer = CustomWriter(config.meso_file_path)
+    stats = FrameStatsAccumulator(config.meso_file_path, led_pattern=config.led_pattern)
+    mmc.run_mda(config.meso_sequence, output=[writer, stats])
+    ```
+"""
+
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from pylab.finalize import finalizer
+from pylab.io.writer import split_tiff_ext
+
+if TYPE_CHECKING:
+    import useq
+
+SUMMARY_SUFFIX = "_summary"
+
+
+class _ChannelStats:
+    """Running statistics for the frames of a single LED channel.
+
+    All buffers are allocated once from the first frame and updated in place.
+    """
+
+    def __init__(self, shape: tuple[int, ...], dtype: np.dtype, baseline_tau: float | None):
+        self.count = 0
+        self.mean = np.zeros(shape, dtype=np.float32)
+        self.m2 = np.zeros(shape, dtype=np.float32)
+        self.max = np.full(shape, np.iinfo(dtype).min if dtype.kind in "iu" else -np.inf, dtype=dtype)
+        self.baseline = np.zeros(shape, dtype=np.float32) if baseline_tau else None
+        self.baseline_tau = baseline_tau
+        # scratch buffers so updates don't allocate per frame
+        self._x = np.empty(shape, dtype=np.float32)
+        self._delta = np.empty(shape, dtype=np.float32)
+
+    def update(self, frame: np.ndarray) -> None:
+        x, delta = self._x, self._delta
+        x[...] = frame
+        self.count += 1
+
+        # Welford: mean += (x - mean) / n ; m2 += (x - mean_old) * (x - mean_new),
+        # where (x - mean_new) = (x - mean_old) * (n - 1) / n
+        np.subtract(x, self.mean, out=delta)
+        np.multiply(delta, delta, out=x)
+        x *= np.float32((self.count - 1) / self.count)
+        self.m2 += x
+        np.divide(delta, self.count, out=delta)
+        self.mean += delta
+
+        np.maximum(self.max, frame, out=self.max)
+
+        if self.baseline is not None:
+            if self.count == 1:
+                self.baseline[...] = frame
+            else:
+                np.subtract(frame, self.baseline, out=delta)
+                delta *= np.float32(1.0 / self.baseline_tau)
+                self.baseline += delta
+
+    @property
+    def variance(self) -> np.ndarray:
+        """Population variance (ddof=0), matching `np.var(stack, axis=0)`."""
+        return self.m2 / np.float32(max(self.count, 1))
+
+    def images(self) -> dict[str, np.ndarray]:
+        images = {
+            "mean": self.mean,
+            "variance": self.variance,
+            "max": self.max.astype(np.float32),
+        }
+        if self.baseline is not None:
+            images["baseline"] = self.baseline
+        return images
+
+
+class FrameStatsAccumulator:
+    """MDA output handler that accumulates per-pixel summary images on a worker thread.
+
+    Parameters
+    ----------
+    filename : str
+        Path of the recording the statistics belong to (the `CustomWriter` filename).
+        Summary images are saved next to it as `<name>_summary.ome.tiff`, or
+        `<name>_led-<channel>_summary.ome.tiff` when `led_pattern` is given, with a
+        `<name>_summary.json` sidecar holding frame counts and the per-frame cost.
+    led_pattern : list[str], optional
+        The Arduino-Switch LED sequence cycled across frames. Statistics are kept
+        separately for each LED channel.
+    baseline_tau : float, optional
+        Time constant, in frames of a channel, of the exponential running baseline.
+        The baseline is not computed if None.
+    max_backlog : int
+        Frames that may wait for the worker before new frames are skipped.
+    """
+
+    def __init__(
+        self,
+        filename: str,
+        led_pattern: list[str] | None = None,
+        baseline_tau: float | None = None,
+        max_backlog: int = 256,
+    ) -> None:
+        self._filename = str(filename)
+        self._led_pattern = [str(led) for led in led_pattern] if led_pattern else None
+        self._baseline_tau = baseline_tau
+        self._queue: queue.Queue = queue.Queue(maxsize=max_backlog)
+        self._thread: threading.Thread | None = None
+        self.skipped = 0  # frames dropped because the worker fell behind
+        self._n_frames = 0  # frames processed by the worker
+        self._busy_s = 0.0
+        self.stats: dict[str | None, _ChannelStats] = {}
+        # the summary images of the last sequence, written by the finalization pipeline
+        self.finalized: Future | None = None
+
+    @property
+    def cost_per_frame_ms(self) -> float:
+        """Mean worker-thread time spent updating the statistics for one frame."""
+        return 1000 * self._busy_s / self._n_frames if self._n_frames else 0.0
+
+    def sequenceStarted(self, seq: "useq.MDASequence", meta: dict | None = None) -> None:
+        if self.finalized is not None:
+            self.finalized.result()  # don't clear statistics that are still being saved
+        self.stats.clear()
+        self._n_frames = 0
+        self._busy_s = 0.0
+        self.skipped = 0
+        self._thread = threading.Thread(target=self._run, name="FrameStatsAccumulator", daemon=True)
+        self._thread.start()
+
+    def frameReady(self, frame: np.ndarray, event: "useq.MDAEvent", meta: dict) -> None:
+        if self._led_pattern:
+            channel = self._led_pattern[event.index.get("t", 0) % len(self._led_pattern)]
+        else:
+            channel = None
+        try:
+            self._queue.put_nowait((channel, frame))
+        except queue.Full:
+            self.skipped += 1
+
+    def sequenceFinished(self, seq: "useq.MDASequence") -> None:
+        """Let the worker drain, and save the summary images on the finalization pipeline."""
+        if self._thread is not None:
+            self._queue.put(None)
+        self.finalized = finalizer.submit(f"summary of {os.path.basename(self._filename)}", self._finish)
+
+    def _finish(self) -> None:
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.save()
+
+    def _run(self) -> None:
+        while (item := self._queue.get()) is not None:
+            channel, frame = item
+            t0 = time.perf_counter()
+            if (stats := self.stats.get(channel)) is None:
+                stats = self.stats[channel] = _ChannelStats(frame.shape, frame.dtype, self._baseline_tau)
+            stats.update(frame)
+            self._busy_s += time.perf_counter() - t0
+            self._n_frames += 1
+
+    def summary_path(self, channel: str | None = None) -> str:
+        """Filename of the summary image for `channel`."""
+        base, ext = split_tiff_ext(self._filename)
+        suffix = f"_led-{channel}" if channel is not None else ""
+        return f"{base}{suffix}{SUMMARY_SUFFIX}{ext}"
+
+    def save(self) -> None:
+        """Write one float32 summary stack per channel plus the JSON sidecar."""
+        from tifffile import imwrite
+
+        if not self.stats:
+            return
+        sidecar: dict = {"cost_per_frame_ms": self.cost_per_frame_ms, "skipped": self.skipped, "channels": {}}
+        for channel, stats in self.stats.items():
+            images = stats.images()
+            path = self.summary_path(channel)
+            imwrite(
+                path,
+                np.stack(list(images.values())),
+                metadata={"axes": "CYX", "Channel": {"Name": list(images)}},
+            )
+            sidecar["channels"][str(channel)] = {"frames": stats.count, "path": path}
+
+        base, _ = split_tiff_ext(self._filename)
+        with open(f"{base}{SUMMARY_SUFFIX}.json", "w") as file:
+            json.dump(sidecar, file, indent=4)
+        logging.info(
+            f"{self.__class__.__name__} saved summary of {self._n_frames} frames "
+            f"at {self.cost_per_frame_ms:.3f} ms/frame ({self.skipped} skipped)"
+        )
@@ -1,11 +1,13 @@
 import random
 import time
 import math
+import threading
 from queue import Queue
 
 from PyQt6.QtCore import pyqtSignal, QThread
 
 from pylab.io import DataManager
+from pylab.io.sink import EncoderSink, encoder_dataframe
 
 from typing import TYPE_CHECKING
 if TYPE_CHECKING:
@@ -41,8 +43,22 @@ class SerialWorker(QThread):
         self.diameter_mm = wheel_diameter
         self.cpr = cpr
 
+        # recorded (time_s, clicks) samples re-emitted instead of reading the port
+        self.replay_samples: list[tuple[float, int]] | None = None
+        self.replay_speed = 1.0
+        # while set, samples are streamed to this file instead of kept in memory
+        self.sink: EncoderSink | None = None
+        # serial port, opened by `arm` (or when the thread starts) and closed when it stops
+        self.arduino = None
+
         self.init_data()
 
+    def load_replay(self, encoder_data, speed: float = 1.0):
+        """Re-emit the samples of a recorded encoder-data CSV (as a DataFrame) when started,
+        at their recorded times divided by `speed` (`speed <= 0`: as fast as possible)."""
+        self.replay_samples = list(zip(encoder_data['Time'].astype(float), encoder_data['Clicks'].astype(int)))
+        self.replay_speed = speed
+
     def init_data(self):
         self.stored_data = []
         self.times = []
@@ -50,39 +66,69 @@ class SerialWorker(QThread):
         self.clicks = []
         self.start_time = None
 
+    def arm(self) -> None:
+        """Open the sink and the serial port ahead of `start`, so starting only launches the thread."""
+        if self.sink is not None:
+            self.sink.open()
+        if self.replay_samples is None and not self.development_mode:
+            self._open_port()
+
     def start(self) -> None:
         self.serialStreamStarted.emit()
         return super().start()
 
+    def _open_port(self) -> bool:
+        if self.arduino is not None:
+            return True
+        import serial
+        try:
+            self.arduino = serial.Serial(self.serial_port, self.baud_rate, timeout=0.1)
+            self.arduino.flushInput()  # Flush any existing input
+            print("Serial port opened.")
+        except serial.SerialException as e:
+            print(f"Serial connection error: {e}")
+            return False
+        return True
+
+    def _close_port(self) -> None:
+        arduino, self.arduino = self.arduino, None
+        if arduino is not None:
+            try:
+                arduino.close()
+                print("Serial port closed.")
+            except Exception as e:
+                print(f"Exception while closing serial port: {e}")
+
     def run(self):
+        threading.current_thread().name = 'SerialWorker'  # label this QThread in profiles
         self.init_data()
         self.start_time = time.time()
+        if self.sink is not None:
+            self.sink.open()
         try:
-            if self.development_mode:
+            if self.replay_samples is not None:
+                self.run_replay_mode()
+            elif self.development_mode:
                 self.run_development_mode()
             else:
                 self.run_serial_mode()
         finally:
+            if self.sink is not None:
+                self.sink.close()
             print("Simulation stopped.")
 
     def run_serial_mode(self):
-        try:
-            import serial
-            self.arduino = serial.Serial(self.serial_port, self.baud_rate, timeout=0.1)
-            self.arduino.flushInput()  # Flush any existing input
-            print("Serial port opened.")
-        except serial.SerialException as e:
-            print(f"Serial connection error: {e}")
+        import serial
+        if not self._open_port():  # opened by `arm` unless the worker was started directly
             return
-        
+
         try:
             while not self.isInterruptionRequested():
                 try:
                     data = self.arduino.readline().decode('utf-8').strip()
                     if data:
                         clicks = int(data)
-                        self.stored_data.append(clicks)  # Store data for later retrieval
-                        self.data_queue.put(clicks)  # Store data in the DataManager queue for access by other threads
+                        self._store(clicks)  # Store data for later retrieval
                         self.serialDataReceived.emit(clicks)  # Emit PyQt signal for real-time plotting
                         self.process_data(clicks)
                 except ValueError:
@@ -92,12 +138,7 @@ class SerialWorker(QThread):
                     self.requestInterruption()
                 self.msleep(1)  # Sleep for 1ms to reduce CPU usage
         finally:
-            if hasattr(self, 'arduino') and self.arduino is not None:
-                try:
-                    self.arduino.close()
-                    print("Serial port closed.")
-                except Exception as e:
-                    print(f"Exception while closing serial port: {e}")
+            self._close_port()
 
     def run_development_mode(self):
         while not self.isInterruptionRequested():
@@ -106,8 +147,7 @@ class SerialWorker(QThread):
                 clicks = random.randint(1, 10)  # Simulating random click values
                 
                 # Emit signals, store data, and push to the queue
-                self.stored_data.append(clicks)  # Store data for later retrieval
-                self.data_queue.put(clicks)  # Store data in the DataManager queue for access by other threads
+                self._store(clicks)  # Store data for later retrieval
                 self.serialDataReceived.emit(clicks)  # Emit PyQt signal for real-time plotting
                 
                 # Optionally, simulate processing the data for speed calculation
@@ -117,14 +157,47 @@ class SerialWorker(QThread):
                 self.requestInterruption()
             self.msleep(self.sample_interval_ms)  # Sleep for sample interval to reduce CPU usage
 
+    def run_replay_mode(self):
+        samples = self.replay_samples
+        t0 = samples[0][0] if samples else 0.0
+        start = time.perf_counter()
+        for t, clicks in samples:
+            if self.isInterruptionRequested():
+                break
+            if self.replay_speed > 0:
+                delay = start + (t - t0) / self.replay_speed - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            self._store(clicks)
+            self.serialDataReceived.emit(clicks)
+            self.process_data(clicks)
+        # the recording is exhausted; idle until stopped, like the serial port would
+        while not self.isInterruptionRequested():
+            self.msleep(self.sample_interval_ms)
+
     def stop(self):
         self.requestInterruption()
         self.wait()
+        self._close_port()  # armed but never started
+        if self.sink is not None:
+            self.sink.close()
         self.serialStreamStopped.emit()
         
+    def _store(self, clicks: int) -> None:
+        """Keep a sample for later retrieval, and in the DataManager queue for other threads.
+
+        Streamed samples are not also kept in memory: nothing drains the queue during a
+        recording, so it would grow with every sample like `stored_data` did.
+        """
+        if self.sink is None:
+            self.stored_data.append(clicks)
+            self.data_queue.put(clicks)
+
     def get_data(self):
         import pandas as pd
 
+        if self.sink is not None:
+            return encoder_dataframe(self.sink.read())
         clicks = self.clicks
         times = self.times
         speeds = self.speeds
@@ -152,9 +225,12 @@ class SerialWorker(QThread):
 
             # Update data lists
             current_time = time.time()
-            self.times.append(current_time - self.start_time)
-            self.speeds.append(speed)
-            self.clicks.append(position_change)
+            if self.sink is not None:
+                self.sink.append(position_change, current_time - self.start_time, speed)
+            else:
+                self.times.append(current_time - self.start_time)
+                self.speeds.append(speed)
+                self.clicks.append(position_change)
 
             # Optionally update GUI label or emit a signal for speed update
             self.serialSpeedUpdated.emit((current_time - self.start_time), speed)
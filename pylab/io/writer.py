@@ -36,11 +36,14 @@ Rules:
 Non-OME (ImageJ) hyperstack axes MUST be in TZCYXS order
 """
 
+from collections import defaultdict
+from concurrent.futures import Future
 from datetime import timedelta
 from typing import TYPE_CHECKING, Any
 
 if TYPE_CHECKING:
     from pymmcore_plus.mda.metadata import SummaryMetaV1  # type: ignore
+    from useq import MDASequence
 
 from pymmcore_plus.mda.handlers._5d_writer_base import _5DWriterBase
 from pymmcore_plus.mda.handlers import OMETiffWriter, ImageSequenceWriter
@@ -49,9 +52,153 @@ from useq import MDAEvent
 import numpy as np
 from pathlib import Path
 import json
+import os
+import time
+
+from pylab.finalize import finalizer
+from pylab.io.catalog import parse_bids_path, register_file, update_file
+from pylab.metrics import metrics
 
 IMAGEJ_AXIS_ORDER = "tzcyxs"
 FRAME_MD_FILENAME = "metadata.json"
+GROW_BLOCK_SIZE = 64
+
+
+def split_tiff_ext(filename: str) -> tuple[str, str]:
+    """Split a recording filename into its base and (possibly double) TIFF extension.
+
+    >>> split_tiff_ext("sub-01_meso.ome.tiff")
+    ('sub-01_meso', '.ome.tiff')
+    """
+    for ext in (".ome.tiff", ".ome.tif", ".tiff", ".tif"):
+        if filename.endswith(ext):
+            return filename[: -len(ext)], ext
+    base, ext = os.path.splitext(filename)
+    return base, ext
+
+
+class GrowingTiffStack:
+    """Append-only TIFF store that grows in blocks as frames arrive.
+
+    Stands in for the pre-sized `np.memmap` returned by `CustomWriter.new_array`
+    when the writer is created with `preallocate=False`. Nothing is written until
+    the first frame arrives; frames are buffered in RAM and appended to the file
+    as contiguous pages `block_size` at a time. `close()` flushes the remaining
+    frames and rewrites the image description so the OME (or shaped) metadata
+    reports the number of frames actually acquired rather than the planned count.
+
+    Frames must arrive in acquisition order, which is always the case for the
+    hardware-sequenced events produced by the PyLab engines. A frame whose index
+    is past the next position (e.g. after a dropped frame) is written there, with
+    blank pages for the skipped positions; an index before it raises `IndexError`.
+    """
+
+    def __init__(
+        self,
+        filename: str,
+        dtype: np.dtype,
+        sizes: dict[str, int],
+        metadata: dict | None = None,
+        ome: bool = True,
+        block_size: int = GROW_BLOCK_SIZE,
+    ) -> None:
+        self.filename = filename
+        self.dtype = np.dtype(dtype)
+        self.sizes = dict(sizes)
+        self.metadata = dict(metadata or {})
+        self.ome = ome
+        self.block_size = max(int(block_size), 1)
+        self.frames_written = 0
+
+        self._frame_shape = (self.sizes["y"], self.sizes["x"])
+        self._block = np.empty((self.block_size, *self._frame_shape), dtype=self.dtype)
+        self._n_buffered = 0
+        self._tiff = None  # opened lazily on the first flush
+
+    @property
+    def shape(self) -> tuple[int, ...]:
+        """Shape of the data acquired so far, truncated to whole outer-axis steps."""
+        dims = list(self.sizes)
+        inner = int(np.prod([self.sizes[d] for d in dims[1:-2]], dtype=int))
+        n_frames = self.frames_written + self._n_buffered
+        return (n_frames // inner, *(self.sizes[d] for d in dims[1:]))
+
+    def _position(self, index: tuple[int, ...]) -> int:
+        """Page number of the frame at `index` (the outer axis is unbounded)."""
+        dims = list(self.sizes)[:-2]
+        if len(index) != len(dims):
+            raise IndexError(f"expected a frame index over {dims}, got {index}")
+        position = 0
+        for i, (dim, value) in enumerate(zip(dims, index)):
+            if value < 0 or (i > 0 and value >= self.sizes[dim]):
+                raise IndexError(f"index {index} is out of bounds for axes {dims}")
+            position = position * self.sizes[dim] + value if i else value
+        return position
+
+    def __setitem__(self, index: tuple[int, ...], frame: np.ndarray) -> None:
+        position = self._position(index)
+        expected = self.frames_written + self._n_buffered
+        if position < expected:
+            raise IndexError(
+                f"frame {index} of {self.filename} arrived after frame position "
+                f"{expected - 1}; frames must be written in order"
+            )
+        for _ in range(position - expected):  # skipped positions stay blank
+            self._append(np.zeros(self._frame_shape, dtype=self.dtype))
+        self._append(frame)
+
+    def _append(self, frame: np.ndarray) -> None:
+        self._block[self._n_buffered] = frame
+        self._n_buffered += 1
+        if self._n_buffered == self.block_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """Append the buffered frames to the file as contiguous pages."""
+        if not self._n_buffered:
+            return
+        if self._tiff is None:
+            from tifffile import TiffWriter
+
+            self._tiff = TiffWriter(self.filename, bigtiff=True, ome=False)
+        for i in range(self._n_buffered):
+            self._tiff.write(
+                self._block[i],
+                contiguous=True,
+                photometric="minisblack",
+                metadata=None,
+                # placeholder, replaced with the final description in `close`
+                description="pylab" if self.frames_written == 0 else None,
+            )
+            self.frames_written += 1
+        self._n_buffered = 0
+
+    def close(self) -> None:
+        """Flush remaining frames and write metadata for the actual frame count."""
+        from tifffile import OmeXml, tiffcomment
+
+        self.flush()
+        if self._tiff is None:
+            return
+        self._tiff.close()
+        self._tiff = None
+
+        shape = self.shape
+        axes = "".join(self.sizes).upper()
+        if self.ome:
+            ome = OmeXml()
+            n_planes = int(np.prod(shape[:-2], dtype=int))
+            storedshape = (n_planes, 1, 1, *self._frame_shape, 1)
+            metadata = {k: v for k, v in self.metadata.items() if k != "axes"}
+            ome.addimage(self.dtype, shape, storedshape, axes=axes, **metadata)
+            description = ome.tostring()
+        else:
+            if np.prod(shape[:-2], dtype=int) != self.frames_written:
+                # partial outer step: describe the pages as a flat stack
+                shape, axes = (self.frames_written, *self._frame_shape), "IYX"
+            description = json.dumps({"shape": list(shape), "axes": axes})
+        tiffcomment(self.filename, description)
+
 
 class CustomWriter(_5DWriterBase[np.memmap]):
     """Custom Override of Pymmcore-Plus MDA handler that writes to a 5D OME-TIFF file.
@@ -65,9 +212,30 @@ class CustomWriter(_5DWriterBase[np.memmap]):
     ----------
     filename : Path | str
         The filename to write to.  Must end with '.ome.tiff' or '.ome.tif'.
+    preallocate : bool
+        If True (default), the full sequence is allocated on disk before the first
+        frame is written. If False, the file grows in blocks as frames arrive (see
+        `GrowingTiffStack`) and is truncated to the acquired frame count when the
+        sequence finishes, so aborted sessions don't leave empty pages behind.
+    block_size : int
+        Number of frames buffered between appends when `preallocate` is False.
+    led_pattern : list[str], optional
+        The Arduino-Switch LED sequence cycled across frames (see
+        `ExperimentConfig.led_pattern`). When given, frames are demultiplexed by
+        pattern phase (taken from the event's T index) into one file per LED channel
+        (`*_led-<channel>.ome.tiff`) and each frame's metadata records its
+        `led_phase`, `led_channel` and `channel_index` (its T index within the
+        channel file). A dropped frame leaves a gap in its channel rather than
+        shifting the later frames to the wrong LED.
     """
 
-    def __init__(self, filename: Path | str) -> None:
+    def __init__(
+        self,
+        filename: Path | str,
+        preallocate: bool = True,
+        block_size: int = GROW_BLOCK_SIZE,
+        led_pattern: list[str] | None = None,
+    ) -> None:
         try:
             import tifffile  # noqa: F401
         except ImportError as e:  # pragma: no cover
@@ -80,23 +248,110 @@ class CustomWriter(_5DWriterBase[np.memmap]):
         if not self._filename.endswith((".tiff", ".tif")):  # pragma: no cover
             raise ValueError("filename must end with '.tiff' or '.tif'")
         self._is_ome = ".ome.tif" in self._filename
+        self._preallocate = preallocate
+        self._block_size = block_size
+        self._led_pattern = [str(led) for led in led_pattern] if led_pattern else None
+        # crop/binning applied upstream by FrameTransform, recorded in the OME metadata
+        self._frame_transform: dict | None = None
+        # frames written per LED channel key
+        self._channel_counts: defaultdict[str, int] = defaultdict(int)
+        # files created for each array key, registered in the session catalog
+        self._files: dict[str, str] = {}
+        # write latency, per modality when the file is in the BIDS layout
+        modality = (parse_bids_path(self._filename) or {}).get("modality") or "writer"
+        self._write_hist = metrics.histogram(f"{modality}.write")
         
         # Custom attribute: Create a filename for the frame metadata jgronemeyer24
         self._frame_metadata_filename = self._filename + FRAME_MD_FILENAME
+        # `finalize_metadata` of the last sequence, run by the finalization pipeline
+        self.finalized: Future | None = None
 
         super().__init__()
 
+    def sequenceStarted(self, seq: "MDASequence", meta: dict | None = None) -> None:
+        """Store the sequence, and any frame geometry forwarded by `FrameTransform`."""
+        if self.finalized is not None:
+            self.finalized.result()  # the previous sequence's files must be complete
+        self._frame_transform = (meta or {}).get("frame_transform")
+        self._channel_counts.clear()
+        super().sequenceStarted(seq, meta)
+
+    def frameReady(
+        self, frame: np.ndarray, event: MDAEvent, meta: dict
+    ) -> None:
+        """Write a frame, routing it to its LED channel array when demultiplexing."""
+        p_index = event.index.get("p", 0)
+        if not self._led_pattern or "t" not in self.position_sizes[p_index]:
+            return super().frameReady(frame, event, meta)
+
+        key = self.get_position_key(p_index)
+        pos_sizes = self.position_sizes[p_index]
+        pattern = self._led_pattern
+        cycle, phase = divmod(event.index["t"], len(pattern))
+        channel = pattern[phase]
+        channel_key = f"{key}_led-{channel}"
+        channel_index = cycle * pattern.count(channel) + pattern[:phase].count(channel)
+
+        if channel_key in self.position_arrays:
+            ary = self.position_arrays[channel_key]
+        else:
+            sizes = pos_sizes.copy()
+            sizes["t"] = self._channel_frame_count(channel, pos_sizes["t"])
+            sizes["y"], sizes["x"] = frame.shape[-2:]
+            ary = self.new_array(key, frame.dtype, sizes, channel=channel)
+            self.position_arrays[channel_key] = ary
+
+        index = tuple(
+            channel_index if k == "t" else event.index.get(k, 0) for k in pos_sizes
+        )
+        self.write_frame(ary, index, frame)
+        self._channel_counts[channel_key] += 1
+
+        meta = {
+            **(meta or {}),
+            "led_phase": phase,
+            "led_channel": channel,
+            "channel_index": channel_index,
+        }
+        self.store_frame_metadata(key, event, meta)
+
+    def store_frame_metadata(self, key: str, event: MDAEvent, meta: dict) -> None:
+        """Store the frame metadata with the frame's `t_index`, its row in the stack.
+
+        Rows of dropped frames are left blank, so after a gap the row is not the
+        frame's position in the metadata list.
+        """
+        meta = {**(meta or {}), "t_index": event.index.get("t", len(self.frame_metadatas[key]))}
+        super().store_frame_metadata(key, event, meta)
+
+    def _channel_frame_count(self, channel: str, n_frames: int) -> int:
+        """Number of frames out of `n_frames` that the LED pattern assigns to `channel`."""
+        pattern = self._led_pattern
+        cycles, remainder = divmod(n_frames, len(pattern))
+        return cycles * pattern.count(channel) + pattern[:remainder].count(channel)
+
     def write_frame(
         self, ary: np.memmap, index: tuple[int, ...], frame: np.ndarray
     ) -> None:
         """Write a frame to the file."""
+        if not metrics.enabled:
+            ary[index] = frame
+            return
+        t = time.perf_counter()
         ary[index] = frame
-        print(f"Writing frame {index}")
+        self._write_hist.record(time.perf_counter() - t)
 
     def new_array(
-        self, position_key: str, dtype: np.dtype, sizes: dict[str, int]
-    ) -> np.memmap:
-        """Create a new tifffile file and memmap for this position."""
+        self,
+        position_key: str,
+        dtype: np.dtype,
+        sizes: dict[str, int],
+        channel: str | None = None,
+    ) -> np.memmap | GrowingTiffStack:
+        """Create a new tifffile file and memmap for this position.
+
+        If `channel` is given, the file holds only the frames of that LED channel.
+        """
         from tifffile import imwrite, memmap
 
         dims, shape = zip(*sizes.items())
@@ -105,11 +360,28 @@ class CustomWriter(_5DWriterBase[np.memmap]):
         metadata["axes"] = "".join(dims).upper()
 
         # append the position key to the filename if there are multiple positions
+        ext = ".ome.tif" if self._is_ome else ".tif"
+        fname = self._filename
         if (seq := self.current_sequence) and seq.sizes.get("p", 1) > 1:
-            ext = ".ome.tif" if self._is_ome else ".tif"
-            fname = self._filename.replace(ext, f"_{position_key}{ext}")
-        else:
-            fname = self._filename
+            fname = fname.replace(ext, f"_{position_key}{ext}")
+        if channel is not None:
+            fname = fname.replace(ext, f"_led-{channel}{ext}")
+            if self._is_ome and "c" not in sizes:
+                metadata["Channel"] = {"Name": [f"LED {channel}"]}
+
+        array_key = f"{position_key}_led-{channel}" if channel is not None else position_key
+        self._files[array_key] = fname
+        register_file(fname)
+
+        if not self._preallocate:
+            return GrowingTiffStack(
+                fname,
+                dtype,
+                sizes,
+                metadata=metadata,
+                ome=self._is_ome,
+                block_size=self._block_size,
+            )
 
         # create parent directories if they don't exist
         # Path(fname).parent.mkdir(parents=True, exist_ok=True)
@@ -131,13 +403,27 @@ class CustomWriter(_5DWriterBase[np.memmap]):
 
         return mmap  # type: ignore
 
+    def sequenceFinished(self, seq: "MDASequence") -> None:
+        """Finalize the files on the finalization pipeline, so the runner isn't held up."""
+        self.finalized = finalizer.submit(
+            f"frame metadata of {os.path.basename(self._filename)}", self._finalize_sequence
+        )
+
+    def _finalize_sequence(self) -> None:
+        self.finalize_metadata()
+        self.frame_metadatas.clear()
+
     def finalize_metadata(self) -> None:
-        """Called during sequenceFinished before clearing sequence metadata.
+        """Called by the finalization pipeline after sequenceFinished, before clearing sequence metadata.
 
         Custom Override to save the frame metadata to a JSON file.
         jgronemeyer24
         """
-        
+        # Truncate grow-as-you-go files to the number of frames actually acquired
+        for ary in self.position_arrays.values():
+            if isinstance(ary, GrowingTiffStack):
+                ary.close()
+
         # Convert defaultdict to a regular dictionary
         regular_dict = dict(self.frame_metadatas)
 
@@ -146,10 +432,32 @@ class CustomWriter(_5DWriterBase[np.memmap]):
         # Save to a file
         with open(self._frame_metadata_filename, "w") as file:
             file.write(json_str)
+
+        for array_key, fname in self._files.items():
+            count, duration_s = self._frame_summary(array_key)
+            update_file(fname, frames=count, duration_s=duration_s)
+        if (entities := parse_bids_path(self._filename)) and entities["modality"]:
+            count, duration_s = self._frame_summary(self.get_position_key(0))
+            register_file(
+                self._frame_metadata_filename,
+                frames=count,
+                duration_s=duration_s,
+                modality=f"{entities['modality']}-frames",
+            )
+        self._files.clear()
         
         
         #self.plot() #TODO plot metadata in dev mode
         
+    def _frame_summary(self, array_key: str) -> tuple[int, float | None]:
+        """Frames written to an array and the time they span (s), for the catalog."""
+        position_key = array_key.split("_led-")[0]
+        frames = self.frame_metadatas.get(position_key, [])
+        times = [f["runner_time_ms"] for f in frames if "runner_time_ms" in f]
+        duration_s = (times[-1] - times[0]) / 1000 if len(times) > 1 else None
+        count = self._channel_counts[array_key] if "_led-" in array_key else len(frames)
+        return count, duration_s
+
     def plot(self):
         import json
         import pandas as pd
@@ -196,6 +504,10 @@ class CustomWriter(_5DWriterBase[np.memmap]):
                 metadata["PhysicalSizeZUnit"] = "µm"
             if seq.channels:
                 metadata["Channel"] = {"Name": [c.config for c in seq.channels]}
+        if self._frame_transform:
+            metadata["MapAnnotation"] = {
+                k: str(v) for k, v in self._frame_transform.items()
+            }
 
         return metadata
                 
@@ -0,0 +1,208 @@
+"""Non-blocking logging for the acquisition threads.
+
+`setup_logging()` replaces direct file handlers with a `QueueHandler` on the root
+logger: a log call from an engine drain loop only formats its record lazily and
+puts it on a queue, and a `QueueListener` thread does all the file I/O. The listener
+writes to the application log (`engine.log`) and, while a recording runs, to a
+per-session log file in the BIDS directory (`start_session_log` / `stop_session_log`).
+
+Hot-path messages use `%`-style arguments (formatted only if the record is emitted)
+and `RateLimitedLog`, so a per-frame debug message costs one level check when DEBUG
+is off, and at most one record per interval when it is on.
+
+Example Usage:
+    ```python
+    setup_logging()
+    start_session_log(config.session_paths.log)
+    drain_log = RateLimitedLog(logging.getLogger(__name__), interval=1.0)
+    drain_log.debug('%s draining %d images', name, remaining)
+    stop_session_log()
+    ```
+"""
+
+import atexit
+import logging
+import logging.handlers
+import queue
+import threading
+import time
+from typing import Optional
+
+LOG_FILENAME = "engine.log"
+LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+
+class _Fanout(logging.Handler):
+    """Forward records to a list of handlers that can change while the listener runs.
+
+    Runs only in the listener thread, so file handlers are opened, written and closed
+    there and never in an acquisition thread.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.handlers: list[logging.Handler] = []
+        self._handlers_lock = threading.Lock()
+
+    def add(self, handler: logging.Handler) -> None:
+        with self._handlers_lock:
+            self.handlers = [*self.handlers, handler]
+
+    def remove(self, handler: logging.Handler) -> None:
+        with self._handlers_lock:
+            self.handlers = [h for h in self.handlers if h is not handler]
+
+    def handle(self, record: logging.LogRecord) -> bool:
+        control = getattr(record, "fanout_control", None)
+        if control is not None:
+            # session start/end marker (see `_enqueue_control`), in order with the records
+            action, handler, done = control
+            if action == "add":
+                self.add(handler)
+            else:
+                self.remove(handler)
+                handler.close()
+            done.set()
+            return True
+        for handler in self.handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+        return True
+
+    def emit(self, record: logging.LogRecord) -> None:  # pragma: no cover
+        self.handle(record)
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """Queue records as they are; `QueueHandler.prepare` would format them in the caller.
+
+    Hot-path log arguments are plain values (ints, strings), so formatting them later
+    in the writer thread gives the same message.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.exc_info:
+            return super().prepare(record)  # tracebacks must be rendered while they exist
+        return record
+
+
+_fanout: Optional[_Fanout] = None
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional[logging.handlers.QueueHandler] = None
+_session_handler: Optional[logging.Handler] = None
+
+
+def _file_handler(path: str) -> logging.Handler:
+    handler = logging.FileHandler(path, encoding="utf-8", delay=True)
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    return handler
+
+
+def setup_logging(filename: Optional[str] = LOG_FILENAME, level: int = logging.INFO) -> None:
+    """Route the root logger through a queue to a background writer thread.
+
+    Calling it again only updates the level. `filename=None` starts without the
+    application log file (records still reach any session log).
+    """
+    global _fanout, _listener, _queue_handler
+    root = logging.getLogger()
+    root.setLevel(level)
+    if _listener is not None:
+        return
+
+    _fanout = _Fanout()
+    if filename:
+        _fanout.add(_file_handler(filename))
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    _queue_handler = _DeferredQueueHandler(log_queue)
+    root.addHandler(_queue_handler)
+    _listener = logging.handlers.QueueListener(log_queue, _fanout, respect_handler_level=False)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging() -> None:
+    """Flush the queue, stop the writer thread and close every file."""
+    global _fanout, _listener, _queue_handler, _session_handler
+    if _listener is None:
+        return
+    _listener.stop()  # drains the queue first
+    logging.getLogger().removeHandler(_queue_handler)
+    for handler in _fanout.handlers:
+        handler.close()
+    _fanout = _listener = _queue_handler = _session_handler = None
+
+
+def _enqueue_control(action: str, handler: logging.Handler) -> threading.Event:
+    """Queue an add/remove of `handler`, applied by the writer thread in record order."""
+    done = threading.Event()
+    marker = logging.makeLogRecord({"name": __name__, "levelno": logging.CRITICAL + 1, "msg": ""})
+    marker.fanout_control = (action, handler, done)
+    _queue_handler.enqueue(marker)
+    return done
+
+
+def start_session_log(path: str, level: int = logging.DEBUG) -> logging.Handler:
+    """Also write records logged from now on to `path` (e.g. `SessionPaths.log`).
+
+    Ends the previous session log. Returns the handler, to pass to `stop_session_log`.
+    """
+    global _session_handler
+    setup_logging()
+    stop_session_log()
+    handler = _file_handler(path)
+    handler.setLevel(level)
+    _enqueue_control("add", handler)
+    _session_handler = handler
+    logging.getLogger(__name__).info("Session log started: %s", path)
+    return handler
+
+
+def stop_session_log(handler: Optional[logging.Handler] = None) -> None:
+    """Close the session log file once the records queued before the call are written.
+
+    With `handler`, only that session's log is stopped: nothing happens if a later
+    session has already replaced it.
+    """
+    global _session_handler
+    if handler is not None and handler is not _session_handler:
+        return
+    handler, _session_handler = _session_handler, None
+    if handler is None or _queue_handler is None:
+        return
+    logging.getLogger(__name__).info("Session log stopped")
+    _enqueue_control("remove", handler).wait(timeout=5)
+
+
+class RateLimitedLog:
+    """Emit a hot-path message at most once per `interval` seconds per call site.
+
+    Arguments are only formatted if the record is emitted. Suppressed calls are
+    counted and reported with the next emitted one.
+    """
+
+    def __init__(self, logger: logging.Logger, interval: float = 1.0) -> None:
+        self.logger = logger
+        self.interval = interval
+        self._next: dict[str, float] = {}
+        self._suppressed: dict[str, int] = {}
+
+    def log(self, level: int, msg: str, *args) -> None:
+        if not self.logger.isEnabledFor(level):
+            return
+        now = time.monotonic()
+        if now < self._next.get(msg, 0.0):
+            self._suppressed[msg] = self._suppressed.get(msg, 0) + 1
+            return
+        self._next[msg] = now + self.interval
+        suppressed = self._suppressed.pop(msg, 0)
+        if suppressed:
+            msg = f"{msg} (+%d suppressed)"
+            args = (*args, suppressed)
+        self.logger.log(level, msg, *args)
+
+    def debug(self, msg: str, *args) -> None:
+        self.log(logging.DEBUG, msg, *args)
+
+    def info(self, msg: str, *args) -> None:
+        self.log(logging.INFO, msg, *args)
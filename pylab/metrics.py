@@ -0,0 +1,228 @@
+"""Opt-in latency instrumentation of the per-frame hot path.
+
+Each stage of a frame's path (buffer pop and metadata assembly in the engines, the
+runner handing the frame to its outputs, `CustomWriter.write_frame`, the preview
+conversion) records its duration into a `LatencyHistogram`. The histograms have a fixed
+set of log-spaced buckets allocated up front, so recording is a few arithmetic operations
+and never allocates per frame.
+
+Instrumentation is off unless enabled, either with the `PYLAB_METRICS=1` environment
+variable, `pylab launch --metrics`, or from the console:
+
+    ```python
+    from pylab.metrics import metrics
+    metrics.enable('metrics.txt')   # also rewrite a text report every few seconds
+    print(metrics.format())         # rates and percentiles per stage
+    metrics.summary()['meso.pop']   # {'count': ..., 'rate_hz': ..., 'p99_ms': ...}
+    ```
+
+Instrumented code keeps a reference to its histograms and checks `metrics.enabled`
+before reading the clock:
+
+    ```python
+    if metrics.enabled:
+        t = time.perf_counter()
+        write()
+        self._write_hist.record(time.perf_counter() - t)
+    ```
+"""
+
+import logging
+import math
+import os
+import threading
+import time
+from typing import Optional
+
+MIN_LATENCY_S = 1e-6  # lower edge of the first bucket
+MAX_LATENCY_S = 100.0  # durations above this land in the last bucket
+BUCKETS_PER_OCTAVE = 4  # bucket width of 2**(1/4), i.e. ~19% resolution
+RATE_WINDOW_S = 1.0
+METRICS_INTERVAL_S = 2.0
+METRICS_FILENAME = "pylab-metrics.txt"
+
+
+class LatencyHistogram:
+    """Counts of durations in fixed log2-spaced buckets, plus count/total/max.
+
+    Bucket 0 holds everything below `MIN_LATENCY_S`; bucket `i` > 0 holds durations in
+    [MIN * 2**((i-1)/k), MIN * 2**(i/k)), with k = `BUCKETS_PER_OCTAVE`. Each
+    histogram is written by one thread (the stage it times) and read by others, so
+    readers may see a frame that is counted but not yet in `total`.
+    """
+
+    __slots__ = ("name", "counts", "count", "total", "max", "_scale", "_last",
+                 "_mark_time", "_mark_count", "_prev_time", "_prev_count")
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        n_buckets = math.ceil(math.log2(MAX_LATENCY_S / MIN_LATENCY_S) * BUCKETS_PER_OCTAVE) + 2
+        self.counts = [0] * n_buckets
+        self._scale = BUCKETS_PER_OCTAVE / math.log(2)
+        self._last = n_buckets - 1
+        self.reset()
+
+    def reset(self) -> None:
+        self.counts[:] = [0] * len(self.counts)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._mark_time = self._prev_time = time.perf_counter()
+        self._mark_count = self._prev_count = 0
+
+    def record(self, seconds: float) -> None:
+        """Add one duration (in seconds)."""
+        if seconds < MIN_LATENCY_S:
+            i = 0
+        else:
+            i = min(int(math.log(seconds / MIN_LATENCY_S) * self._scale) + 1, self._last)
+        self.counts[i] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    @staticmethod
+    def bucket_upper(i: int) -> float:
+        """Upper edge (in seconds) of bucket `i`."""
+        return MIN_LATENCY_S * 2 ** (i / BUCKETS_PER_OCTAVE)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Duration (s) below which `q` percent of the recorded durations fall.
+
+        Resolved to the upper edge of a bucket, and never above the observed maximum.
+        """
+        counts = list(self.counts)
+        n = sum(counts)
+        if not n:
+            return None
+        rank = max(q / 100 * n, 1)
+        seen = 0
+        for i, c in enumerate(counts):
+            seen += c
+            if seen >= rank:
+                return min(self.bucket_upper(i), self.max)
+        return self.max
+
+    def rate(self, now: Optional[float] = None) -> float:
+        """Recordings per second over the last one to two `RATE_WINDOW_S`."""
+        now = time.perf_counter() if now is None else now
+        count = self.count
+        if now - self._mark_time >= RATE_WINDOW_S:
+            self._prev_time, self._prev_count = self._mark_time, self._mark_count
+            self._mark_time, self._mark_count = now, count
+        elapsed = now - self._prev_time
+        return (count - self._prev_count) / elapsed if elapsed > 0 else 0.0
+
+    def summary(self) -> dict:
+        """Count, current rate and mean/p50/p90/p99/max in milliseconds."""
+        def ms(s: Optional[float]) -> Optional[float]:
+            return None if s is None else round(s * 1000, 4)
+
+        count = self.count
+        return {
+            "count": count,
+            "rate_hz": round(self.rate(), 2),
+            "mean_ms": ms(self.total / count) if count else None,
+            "p50_ms": ms(self.percentile(50)),
+            "p90_ms": ms(self.percentile(90)),
+            "p99_ms": ms(self.percentile(99)),
+            "max_ms": ms(self.max) if count else None,
+        }
+
+
+class Metrics:
+    """Registry of the stage histograms, with an optional metrics-file writer thread."""
+
+    def __init__(self, enabled: bool = False) -> None:
+        self.enabled = enabled
+        self._histograms: dict[str, LatencyHistogram] = {}
+        self._lock = threading.Lock()
+        self._writer: Optional[threading.Thread] = None
+        self._stop_writer = threading.Event()
+        self.path: Optional[str] = None
+
+    def histogram(self, name: str) -> LatencyHistogram:
+        """The histogram of stage `name`, created on first use."""
+        hist = self._histograms.get(name)
+        if hist is None:
+            with self._lock:
+                hist = self._histograms.setdefault(name, LatencyHistogram(name))
+        return hist
+
+    def record(self, name: str, seconds: float) -> None:
+        if self.enabled:
+            self.histogram(name).record(seconds)
+
+    def reset(self) -> None:
+        for hist in list(self._histograms.values()):
+            hist.reset()
+
+    def summary(self) -> dict[str, dict]:
+        """Per-stage `LatencyHistogram.summary`, sorted by stage name."""
+        return {name: hist.summary() for name, hist in sorted(self._histograms.items())}
+
+    def format(self) -> str:
+        """The summary as a fixed-width text table."""
+        columns = ("count", "rate_hz", "mean_ms", "p50_ms", "p90_ms", "p99_ms", "max_ms")
+        summary = self.summary()
+        width = max([len("stage")] + [len(name) for name in summary])
+        lines = ["stage".ljust(width) + "".join(f"{c:>11}" for c in columns)]
+        for name, row in summary.items():
+            cells = "".join(f"{'-' if row[c] is None else row[c]:>11}" for c in columns)
+            lines.append(name.ljust(width) + cells)
+        return "\n".join(lines)
+
+    # ============================== Switches ============================ #
+
+    def enable(self, path: Optional[str] = None, interval: float = METRICS_INTERVAL_S) -> None:
+        """Start recording; with `path`, rewrite a text report there every `interval` s."""
+        self.enabled = True
+        if path is not None:
+            self.start_file_writer(path, interval)
+
+    def disable(self) -> None:
+        """Stop recording (and the file writer); recorded histograms are kept."""
+        self.enabled = False
+        self.stop_file_writer()
+
+    # ============================== Metrics file ======================== #
+
+    def write(self, path: Optional[str] = None) -> None:
+        """Atomically rewrite the metrics file with the current report."""
+        path = path or self.path
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            f.write(f"# pylab metrics {time.strftime('%Y-%m-%d %H:%M:%S')}\n")
+            f.write(self.format() + "\n")
+        os.replace(tmp, path)
+
+    def start_file_writer(self, path: str, interval: float = METRICS_INTERVAL_S) -> None:
+        self.stop_file_writer()
+        self.path = os.path.abspath(path)
+        self._stop_writer.clear()
+        self._writer = threading.Thread(target=self._write_loop, args=(interval,), name="metrics-writer", daemon=True)
+        self._writer.start()
+        logging.info(f"Metrics: writing {self.path} every {interval} s")
+
+    def stop_file_writer(self) -> None:
+        if self._writer is not None:
+            self._stop_writer.set()
+            self._writer.join()
+            self._writer = None
+
+    def _write_loop(self, interval: float) -> None:
+        while not self._stop_writer.wait(interval):
+            try:
+                self.write()
+            except OSError as e:
+                logging.info(f"Metrics: could not write {self.path}: {e}")
+        try:
+            self.write()  # final report
+        except OSError:
+            pass
+
+
+metrics = Metrics(enabled=os.environ.get("PYLAB_METRICS", "0") not in ("", "0"))
+if metrics.enabled and os.environ.get("PYLAB_METRICS_FILE"):
+    metrics.start_file_writer(os.environ["PYLAB_METRICS_FILE"])
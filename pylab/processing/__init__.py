@@ -1 +1,3 @@
-from .plot import *
\ No newline at end of file
+from .plot import *
+from .alignment import Timeline, align_session
+from .event_average import EventAverager, stim_onsets
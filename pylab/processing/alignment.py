@@ -0,0 +1,237 @@
+"""Align the widefield frames of a session with the pupil camera, the wheel encoder and
+the PsychoPy trials.
+
+Everything is mapped onto one timeline, the meso `runner_time_ms` clock in seconds,
+using only vectorized `np.searchsorted`/`np.interp` calls, so a multi-hour session
+aligns in well under a second:
+
+- pupil frames are placed on that clock through the `TimeReceivedByCore` wall-clock
+  stamps both cameras share (or their own `runner_time_ms` if those are missing);
+- encoder samples (`Time`, seconds since the encoder was started) and PsychoPy times
+  (seconds since the PsychoPy clock started) are shifted by the meso clock time at which
+  their clock read zero. Unless given, these offsets come from the `SessionSupervisor`
+  report saved with the session (`clock_offsets`), which times the first sample of every
+  stream on one clock. A stream whose offset can't be derived is left out of the timeline.
+
+Example Usage:
+    ```python
+    from pylab.io import SessionReader
+    from pylab.processing.alignment import align_session
+
+    with SessionReader(config.bids_dir) as session:
+        timeline = align_session(session, stim_df=plot.load_psychopy_data(config.bids_dir))
+    timeline.wheel_speed[timeline.trial == 3]
+    ```
+"""
+
+import logging
+from dataclasses import dataclass, fields
+from typing import Optional
+
+import numpy as np
+
+from pylab.io.reader import SessionReader
+from pylab.processing.cache import cached
+
+
+@dataclass
+class Timeline:
+    """ Per-meso-frame session data, all arrays of length `n_frames` """
+    frame_times_s: np.ndarray  # float64, meso runner clock
+    wheel_speed: np.ndarray  # float32, NaN outside the encoder recording
+    pupil_frame: np.ndarray  # int64 index of the nearest pupil frame, -1 if none
+    trial: np.ndarray  # int32 index of the current PsychoPy trial, -1 before the first
+
+    def __len__(self) -> int:
+        return len(self.frame_times_s)
+
+    def to_dataframe(self):
+        import pandas as pd
+
+        return pd.DataFrame({f.name: getattr(self, f.name) for f in fields(self)})
+
+    def save(self, path: str) -> None:
+        """Save the arrays to an uncompressed `.npz` file."""
+        np.savez(path, **{f.name: getattr(self, f.name) for f in fields(self)})
+
+    @classmethod
+    def load(cls, path: str) -> "Timeline":
+        with np.load(path) as data:
+            return cls(**{f.name: data[f.name] for f in fields(cls)})
+
+
+def nearest_index(sorted_times: np.ndarray, times: np.ndarray) -> np.ndarray:
+    """Index of the element of `sorted_times` closest to each of `times`."""
+    sorted_times = np.asarray(sorted_times)
+    if len(sorted_times) < 2:
+        return np.full(len(times), len(sorted_times) - 1, dtype=np.int64)
+    right = np.clip(np.searchsorted(sorted_times, times), 1, len(sorted_times) - 1)
+    left = right - 1
+    closer_left = (times - sorted_times[left]) <= (sorted_times[right] - times)
+    return np.where(closer_left, left, right).astype(np.int64)
+
+
+def build_timeline(
+    frame_times_s: np.ndarray,
+    encoder_times_s: Optional[np.ndarray] = None,
+    encoder_speed: Optional[np.ndarray] = None,
+    pupil_times_s: Optional[np.ndarray] = None,
+    trial_starts_s: Optional[np.ndarray] = None,
+) -> Timeline:
+    """Align already clock-corrected event times (s) to the meso frames.
+
+    Trial IDs are row numbers of `trial_starts_s` (NaN rows never become current).
+    Inputs that are None produce NaN speeds / -1 indices.
+    """
+    frame_times_s = np.asarray(frame_times_s, dtype=np.float64)
+    n_frames = len(frame_times_s)
+
+    if encoder_times_s is not None and len(encoder_times_s):
+        wheel_speed = np.interp(
+            frame_times_s, encoder_times_s, encoder_speed, left=np.nan, right=np.nan
+        ).astype(np.float32)
+    else:
+        wheel_speed = np.full(n_frames, np.nan, dtype=np.float32)
+
+    if pupil_times_s is not None:
+        pupil_frame = nearest_index(pupil_times_s, frame_times_s)
+    else:
+        pupil_frame = np.full(n_frames, -1, dtype=np.int64)
+
+    if trial_starts_s is not None:
+        # trial IDs are row numbers of `trial_starts_s`; rows without a start are skipped
+        trial_starts_s = np.asarray(trial_starts_s, dtype=np.float64)
+        valid = np.flatnonzero(np.isfinite(trial_starts_s))
+        order = valid[np.argsort(trial_starts_s[valid], kind="stable")]
+        current = np.searchsorted(trial_starts_s[order], frame_times_s, side="right") - 1
+        trial = np.where(current >= 0, order[current] if len(order) else -1, -1).astype(np.int32)
+    else:
+        trial = np.full(n_frames, -1, dtype=np.int32)
+
+    return Timeline(frame_times_s, wheel_speed, pupil_frame, trial)
+
+
+def pupil_times_on_meso_clock(session: SessionReader) -> Optional[np.ndarray]:
+    """Pupil frame times (s) on the meso runner clock, or None without a pupil recording."""
+    try:
+        pupil = session.frame_metadata("pupil")
+    except FileNotFoundError:
+        return None
+    meso = session.frame_metadata("meso")
+    if "time_received" in meso and "time_received" in pupil:
+        # both cores stamp frames with the same wall clock
+        offset_us = (pupil["time_received"] - meso["time_received"][0]).astype(np.float64)
+        return meso["runner_time_ms"][0] / 1000.0 + offset_us / 1e6
+    return pupil["runner_time_ms"] / 1000.0
+
+
+def clock_offsets(session: SessionReader, encoder=None) -> dict[str, float]:
+    """Meso clock time (s) at which the encoder and PsychoPy clocks read zero.
+
+    Derived from the session's `SessionSupervisor` report: the first meso frame, the
+    first encoder sample and the PsychoPy start were all timed after the same release.
+    Streams the report doesn't time (or sessions without a report) are missing from the
+    returned dict. `encoder` is the session's encoder DataFrame, if already loaded.
+    """
+    report = session.stream_report()
+    if report is None:
+        return {}
+    streams = report.get("streams", {})
+    meso_first_ms = streams.get("meso", {}).get("first_sample_ms")
+    if meso_first_ms is None:
+        return {}
+    # meso clock time of the supervisor's release (t = 0 in the report)
+    release_s = session.frame_metadata("meso")["runner_time_ms"][0] / 1000.0 - meso_first_ms / 1000.0
+
+    offsets = {}
+    encoder_first_ms = streams.get("encoder", {}).get("first_sample_ms")
+    if encoder_first_ms is not None:
+        if encoder is None:
+            try:
+                encoder = session.encoder()
+            except FileNotFoundError:
+                encoder = None
+        if encoder is not None and len(encoder):
+            # the first sample was received `Time[0]` seconds after the encoder clock started
+            offsets["encoder"] = release_s + encoder_first_ms / 1000.0 - float(encoder["Time"].iloc[0])
+    psychopy_ms = report.get("events", {}).get("psychopy")
+    if psychopy_ms is not None:
+        offsets["psychopy"] = release_s + psychopy_ms / 1000.0
+    return offsets
+
+
+def _session_files(session: SessionReader, *args, **kwargs) -> list[str]:
+    """Files `align_session` reads, for the cache key."""
+    files = []
+    for path in (
+        lambda: session.metadata_path("meso"),
+        lambda: session.metadata_path("pupil"),
+        lambda: session.encoder_path,
+        lambda: session.encoder_stream_path,
+        lambda: session.streams_path,
+    ):
+        try:
+            files.append(path())
+        except FileNotFoundError:
+            pass
+    return files
+
+
+@cached(inputs=_session_files)
+def align_session(
+    session: SessionReader,
+    stim_df=None,
+    trial_column: str = "thisRow.t",
+    encoder_offset_s: Optional[float] = None,
+    stim_offset_s: Optional[float] = None,
+) -> Timeline:
+    """Build the `Timeline` of a recorded session.
+
+    Parameters
+    ----------
+    session : SessionReader
+        The session to align.
+    stim_df : pandas.DataFrame, optional
+        PsychoPy trials (one row per trial), as returned by `plot.load_psychopy_data`.
+    trial_column : str
+        Column of `stim_df` holding the trial start times.
+    encoder_offset_s, stim_offset_s : float, optional
+        Meso clock time (s) at which the encoder / PsychoPy clocks read zero. Derived
+        from the session's stream report (`clock_offsets`) if None; the wheel speed /
+        trials are left out of the timeline if that isn't possible.
+    """
+    frame_times_s = session.frame_metadata("meso")["runner_time_ms"] / 1000.0
+    try:
+        encoder = session.encoder()
+    except FileNotFoundError:
+        encoder = None
+    offsets = {}
+    if encoder_offset_s is None or stim_offset_s is None:
+        offsets = clock_offsets(session, encoder)
+    if encoder_offset_s is None:
+        encoder_offset_s = offsets.get("encoder")
+    if stim_offset_s is None:
+        stim_offset_s = offsets.get("psychopy")
+
+    encoder_times_s = encoder_speed = None
+    if encoder is not None:
+        if encoder_offset_s is None:
+            logging.warning(f"align_session: no encoder start time recorded for {session}; wheel speed left out")
+        else:
+            encoder_times_s = encoder["Time"].to_numpy(np.float64) + encoder_offset_s
+            encoder_speed = encoder["Speed"].to_numpy(np.float64)
+
+    trial_starts_s = None
+    if stim_df is not None:
+        if stim_offset_s is None:
+            logging.warning(f"align_session: no PsychoPy start time recorded for {session}; trials left out")
+        else:
+            trial_starts_s = stim_df[trial_column].to_numpy(np.float64) + stim_offset_s
+
+    return build_timeline(
+        frame_times_s,
+        encoder_times_s,
+        encoder_speed,
+        pupil_times_on_meso_clock(session),
+        trial_starts_s,
+    )
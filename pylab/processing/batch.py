@@ -0,0 +1,184 @@
+"""Batch processing of every recorded session under a save directory.
+
+Sessions are the BIDS directories built by `ExperimentConfig.bids_dir`
+(`<save_dir>/data/<protocol>/sub-<subject>/ses-<session>`). Each session is processed
+in its own worker process and writes its outputs to `<session>/processed/`:
+
+    timing.json          frame interval summary of each camera
+    timeline.npz         per-meso-frame wheel speed, pupil frame and trial (see alignment)
+    camera_intervals.png frame intervals of each camera
+    wheel.png            wheel traces with the stimulus onsets
+    manifest.json        size/mtime of the inputs the outputs were computed from
+
+A session whose manifest matches its current inputs is skipped.
+
+Example Usage:
+    ```
+    pylab process D:/experiments/my_protocol --workers 4
+    ```
+"""
+
+import glob
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Iterator, Optional
+
+import numpy as np
+
+PROCESSING_VERSION = 2
+OUTPUT_DIR = "processed"
+OUTPUTS = ("timing.json", "timeline.npz", "camera_intervals.png", "wheel.png")
+MANIFEST = "manifest.json"
+
+
+def discover_sessions(save_dir: str) -> list[str]:
+    """BIDS session directories under `save_dir` (the configured save dir or its `data` folder)."""
+    root = os.path.join(save_dir, "data") if os.path.isdir(os.path.join(save_dir, "data")) else save_dir
+    sessions = glob.glob(os.path.join(glob.escape(root), "*", "sub-*", "ses-*"))
+    return sorted(os.path.abspath(s) for s in sessions if os.path.isdir(s))
+
+
+def session_inputs(bids_dir: str) -> list[str]:
+    """Raw files a session's outputs depend on (frame metadata, behaviour, configuration, stream report)."""
+    patterns = ("func/*metadata.json", "beh/*.csv", "*_configuration*.csv", "*_streams*.json")
+    return sorted(p for pattern in patterns for p in glob.glob(os.path.join(glob.escape(bids_dir), pattern)))
+
+
+def psychopy_path(bids_dir: str) -> Optional[str]:
+    """The PsychoPy trials CSV of a session: any `beh` CSV that isn't encoder data."""
+    for path in sorted(glob.glob(os.path.join(glob.escape(bids_dir), "beh", "*.csv"))):
+        if "_encoder-data" not in os.path.basename(path):
+            return path
+    return None
+
+
+def _fingerprint(bids_dir: str, paths: list[str]) -> dict:
+    return {os.path.relpath(p, bids_dir): [os.path.getsize(p), os.stat(p).st_mtime_ns] for p in paths}
+
+
+def is_up_to_date(bids_dir: str) -> bool:
+    """True if every output exists and was computed from the current inputs."""
+    out_dir = os.path.join(bids_dir, OUTPUT_DIR)
+    try:
+        with open(os.path.join(out_dir, MANIFEST), "r") as file:
+            manifest = json.load(file)
+    except (OSError, ValueError):
+        return False
+    if manifest.get("version") != PROCESSING_VERSION:
+        return False
+    if not all(os.path.exists(os.path.join(out_dir, name)) for name in manifest.get("outputs", [])):
+        return False
+    return manifest.get("inputs") == _fingerprint(bids_dir, session_inputs(bids_dir))
+
+
+def interval_summary(runner_time_ms: np.ndarray, time_received=None) -> dict:
+    """Frame rate and dropped-frame statistics of one camera."""
+    intervals = np.diff(runner_time_ms)
+    if len(intervals) == 0:
+        return {"frames": int(len(runner_time_ms))}
+    median = float(np.median(intervals))
+    summary = {
+        "frames": int(len(runner_time_ms)),
+        "duration_s": float(runner_time_ms[-1] - runner_time_ms[0]) / 1000.0,
+        "fps": 1000.0 / median if median > 0 else float("nan"),
+        "interval_mean_ms": float(intervals.mean()),
+        "interval_std_ms": float(intervals.std()),
+        "interval_max_ms": float(intervals.max()),
+        # a gap of more than 1.5 frames means at least one frame went missing
+        "dropped_frames": int(np.sum(np.round(intervals[intervals > 1.5 * median] / median) - 1)),
+    }
+    if time_received is not None:
+        core_intervals = np.diff(time_received).astype(np.float64) / 1000.0  # us -> ms
+        summary["runner_core_divergence_ms"] = float(np.abs(intervals - core_intervals).max())
+    return summary
+
+
+def process_session(bids_dir: str, force: bool = False) -> tuple[str, str]:
+    """Process one session; returns `(bids_dir, status)`. Runs in a worker process."""
+    if not force and is_up_to_date(bids_dir):
+        return bids_dir, "up to date"
+
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import pandas as pd
+
+    from pylab.io.reader import SessionReader
+    from pylab.processing import plot
+    from pylab.processing.alignment import align_session
+
+    out_dir = os.path.join(bids_dir, OUTPUT_DIR)
+    os.makedirs(out_dir, exist_ok=True)
+    inputs = session_inputs(bids_dir)
+
+    stim_file = psychopy_path(bids_dir)
+    stim_df = pd.read_csv(stim_file) if stim_file else None
+
+    with SessionReader(bids_dir) as session:
+        cameras = {}
+        for modality in ("meso", "pupil"):
+            try:
+                cameras[modality] = session.frame_metadata(modality)
+            except FileNotFoundError:
+                continue
+        if "meso" not in cameras:
+            return bids_dir, "skipped (no widefield recording)"
+
+        timing = {m: interval_summary(md["runner_time_ms"], md.get("time_received")) for m, md in cameras.items()}
+        with open(os.path.join(out_dir, "timing.json"), "w") as file:
+            json.dump(timing, file, indent=4)
+
+        trials = stim_df if stim_df is not None and "thisRow.t" in stim_df else None
+        align_session(session, trials).save(os.path.join(out_dir, "timeline.npz"))
+
+        fig, axes = plt.subplots(len(cameras), 1, figsize=(12, 3 * len(cameras)), squeeze=False)
+        for ax, (modality, md) in zip(axes[:, 0], cameras.items()):
+            t_s = md["runner_time_ms"][1:] / 1000.0
+            plot.plot_downsampled(ax, t_s, np.diff(md["runner_time_ms"]), label="Runner Time Intervals")
+            if "time_received" in md:
+                core = np.diff(md["time_received"]).astype(np.float64) / 1000.0
+                plot.plot_downsampled(ax, t_s, core, label="Core Time Intervals")
+            ax.set_title(f"{modality}: Intervals Between Frames")
+            ax.set_xlabel("Time (secs)")
+            ax.set_ylabel("Interval (ms)")
+            ax.legend()
+        fig.tight_layout()
+        fig.savefig(os.path.join(out_dir, "camera_intervals.png"))
+        plt.close(fig)
+
+        try:
+            encoder = session.encoder()
+        except FileNotFoundError:
+            encoder = None
+        if encoder is not None and len(encoder):
+            fig = plot.plot_wheel_traces(encoder, stim_df, columns=("Speed", "Clicks"), time_column="Time")
+            fig.savefig(os.path.join(out_dir, "wheel.png"))
+            plt.close(fig)
+
+    outputs = [name for name in OUTPUTS if os.path.exists(os.path.join(out_dir, name))]
+    manifest = {
+        "version": PROCESSING_VERSION,
+        "inputs": _fingerprint(bids_dir, inputs),
+        "outputs": outputs,
+    }
+    with open(os.path.join(out_dir, MANIFEST), "w") as file:
+        json.dump(manifest, file, indent=4)
+    return bids_dir, "processed"
+
+
+def process_all(save_dir: str, workers: Optional[int] = None, force: bool = False) -> Iterator[tuple[str, str]]:
+    """Process every session under `save_dir` in a process pool, yielding `(bids_dir, status)`
+    as sessions complete. A failing session is reported and doesn't stop the others.
+    """
+    sessions = discover_sessions(save_dir)
+    if not sessions:
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(process_session, s, force): s for s in sessions}
+        for future in as_completed(futures):
+            try:
+                yield future.result()
+            except Exception as e:
+                yield futures[future], f"failed: {e!r}"
@@ -0,0 +1,232 @@
+"""On-disk memoization of `pylab.processing` results.
+
+Functions decorated with `cached` store their return value under a key built from
+the function, its parameters and a fingerprint (size, mtime and content hash) of the
+input files it reads. Calling it again on an unchanged session loads the pickled
+result instead of recomputing it from the raw files.
+
+The cache lives in `$PYLAB_CACHE_DIR` (default `~/.cache/pylab`) and is kept under
+`$PYLAB_CACHE_MAX_BYTES` (default 2 GB) by evicting the least recently used entries.
+Set `PYLAB_CACHE=0` to disable it.
+
+Example Usage:
+    ```python
+    @cached(inputs='path')
+    def load_frame_metadata(path):
+        ...
+
+    @cached(inputs=lambda session, **_: [session.metadata_path()])
+    def align(session, offset_s=0.0):
+        ...
+    ```
+"""
+
+import functools
+import hashlib
+import inspect
+import logging
+import os
+import pickle
+import tempfile
+from typing import Any, Callable, Optional, Sequence, Union
+
+import numpy as np
+
+DEFAULT_MAX_BYTES = 2 * 1024**3
+FULL_HASH_BYTES = 16 * 1024**2  # larger files only hash their first and last block
+SAMPLE_BYTES = 1024**2
+
+
+def file_fingerprint(path: str) -> tuple:
+    """(path, size, mtime_ns, blake2b) of a file; large files hash their head and tail."""
+    stat = os.stat(path)
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as file:
+        if stat.st_size <= FULL_HASH_BYTES:
+            digest.update(file.read())
+        else:
+            digest.update(file.read(SAMPLE_BYTES))
+            file.seek(-SAMPLE_BYTES, os.SEEK_END)
+            digest.update(file.read(SAMPLE_BYTES))
+    return os.path.abspath(path), stat.st_size, stat.st_mtime_ns, digest.hexdigest()
+
+
+def _token(value: Any) -> str:
+    """Stable text for a parameter value (arrays and DataFrames are hashed)."""
+    if isinstance(value, np.ndarray):
+        return f"ndarray{value.shape}{value.dtype}:{hashlib.blake2b(np.ascontiguousarray(value).tobytes(), digest_size=16).hexdigest()}"
+    if type(value).__name__ in ("DataFrame", "Series"):
+        import pandas as pd
+
+        hashed = pd.util.hash_pandas_object(value, index=True).to_numpy()
+        columns = list(value.columns) if hasattr(value, "columns") else value.name
+        return f"{type(value).__name__}{columns}:{hashlib.blake2b(hashed.tobytes(), digest_size=16).hexdigest()}"
+    if isinstance(value, dict):
+        return "{" + ",".join(f"{k!r}:{_token(v)}" for k, v in sorted(value.items())) + "}"
+    if isinstance(value, (list, tuple)):
+        return "[" + ",".join(_token(v) for v in value) + "]"
+    return repr(value)
+
+
+class DiskCache:
+    """A directory of pickled results with least-recently-used size eviction.
+
+    Parameters
+    ----------
+    directory : str, optional
+        Where entries are stored; defaults to `$PYLAB_CACHE_DIR` or `~/.cache/pylab`.
+    max_bytes : int, optional
+        Total size the entries are evicted down to after each store.
+    """
+
+    def __init__(self, directory: Optional[str] = None, max_bytes: Optional[int] = None) -> None:
+        self.directory = directory or os.environ.get(
+            "PYLAB_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "pylab")
+        )
+        self.max_bytes = int(max_bytes or os.environ.get("PYLAB_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES))
+        os.makedirs(self.directory, exist_ok=True)
+
+    def __repr__(self) -> str:
+        return f"DiskCache('{self.directory}', max_bytes={self.max_bytes})"
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.pkl")
+
+    def get(self, key: str) -> tuple[bool, Any]:
+        """Return `(hit, value)`; a hit marks the entry as recently used."""
+        path = self._path(key)
+        try:
+            with open(path, "rb") as file:
+                value = pickle.load(file)
+        except FileNotFoundError:
+            return False, None
+        except Exception as e:  # truncated or stale entry: drop it and recompute
+            logging.info(f"DiskCache: discarding unreadable entry {path}: {e}")
+            self._remove(path)
+            return False, None
+        os.utime(path)  # mtime doubles as the LRU timestamp
+        return True, value
+
+    def put(self, key: str, value: Any) -> None:
+        """Store `value` atomically, then evict entries beyond `max_bytes`."""
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                pickle.dump(value, file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self._path(key))
+        except BaseException:
+            self._remove(tmp)
+            raise
+        self.evict()
+
+    def entries(self) -> list[tuple[str, int, float]]:
+        """(path, size, last use) of every entry, least recently used first."""
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith(".pkl"):
+                    stat = entry.stat()
+                    entries.append((entry.path, stat.st_size, stat.st_mtime))
+        return sorted(entries, key=lambda e: e[2])
+
+    @property
+    def size(self) -> int:
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self, max_bytes: Optional[int] = None) -> int:
+        """Remove least recently used entries until the cache fits; returns bytes freed."""
+        limit = self.max_bytes if max_bytes is None else max_bytes
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        freed = 0
+        for path, size, _ in entries:
+            if total - freed <= limit:
+                break
+            self._remove(path)
+            freed += size
+        return freed
+
+    def clear(self) -> None:
+        self.evict(0)
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+_default_cache: Optional[DiskCache] = None
+
+
+def get_cache() -> DiskCache:
+    """The process-wide cache used by `cached`."""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = DiskCache()
+    return _default_cache
+
+
+def cached(
+    inputs: Union[str, Sequence[str], Callable[..., Sequence[str]]],
+    version: int = 0,
+) -> Callable:
+    """Memoize a function on disk, keyed on its parameters and its input files.
+
+    Parameters
+    ----------
+    inputs : str, list[str] or callable
+        Name(s) of the parameters holding the input file paths (a directory stands
+        for the files directly in it), or a callable taking the function's arguments
+        and returning the paths.
+    version : int
+        Bump it when the function's output changes for the same inputs.
+    """
+    def decorator(func: Callable) -> Callable:
+        signature = inspect.signature(func)
+        names = [inputs] if isinstance(inputs, str) else inputs
+
+        def input_paths(bound: inspect.BoundArguments) -> list[str]:
+            if callable(names):
+                paths = names(*bound.args, **bound.kwargs)
+            else:
+                paths = [bound.arguments[name] for name in names]
+            files = []
+            for path in paths:
+                if path is None:
+                    continue
+                path = os.fspath(path)
+                if os.path.isdir(path):
+                    files.extend(sorted(e.path for e in os.scandir(path) if e.is_file()))
+                else:
+                    files.append(path)
+            return files
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if os.environ.get("PYLAB_CACHE", "1") == "0":
+                return func(*args, **kwargs)
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+
+            digest = hashlib.blake2b(digest_size=20)
+            digest.update(f"{func.__module__}.{func.__qualname__}:{version}".encode())
+            for name, value in bound.arguments.items():
+                digest.update(f"{name}={_token(value)};".encode())
+            for fingerprint in map(file_fingerprint, input_paths(bound)):
+                digest.update(repr(fingerprint).encode())
+            key = digest.hexdigest()
+
+            cache = get_cache()
+            hit, value = cache.get(key)
+            if hit:
+                return value
+            value = func(*args, **kwargs)
+            cache.put(key, value)
+            return value
+
+        wrapper.uncached = func
+        return wrapper
+
+    return decorator
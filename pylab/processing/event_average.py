@@ -0,0 +1,208 @@
+"""Stimulus-locked (event-related) ΔF/F averages of memmapped widefield stacks.
+
+Stimulus onsets from the PsychoPy CSV (e.g. `stim_grating.started`) are moved onto the
+meso runner clock (by the offset recorded with the session, see
+`pylab.processing.alignment.clock_offsets`) and mapped to frame indices with the frame
+metadata timestamps, then the stack is processed in horizontal
+bands: each band reads the peri-stimulus windows of all trials with one vectorized
+(fancy-indexed) memmap read, computes ΔF/F against the pre-stimulus baseline and
+averages across trials. Bands are distributed over a process pool, so only
+`n_trials x n_window x band_rows x width` pixels are ever in memory per worker.
+
+Example Usage:
+    ```python
+    from pylab.processing import plot
+    from pylab.processing.event_average import EventAverager, stim_onsets
+
+    stim_df = plot.load_psychopy_data(config.bids_dir)
+    averager = EventAverager(config.bids_dir, channel="4", pre_s=1, post_s=3)
+    result = averager.compute(stim_onsets(stim_df, "stim_grating.started"), per_trial=True)
+    result.mean  # (n_window, y, x) trial-averaged ΔF/F movie
+    ```
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Optional, Sequence
+
+import numpy as np
+
+from pylab.io.reader import SessionReader
+from pylab.io.writer import split_tiff_ext
+from pylab.processing.alignment import clock_offsets
+
+BAND_BYTES = 256 * 1024**2  # float32 working set per worker
+TRIALS_SUFFIX = "_dff-trials.npy"
+
+
+@dataclass
+class EventAverageResult:
+    """ Output of `EventAverager.compute` """
+    mean: np.ndarray  # (n_window, y, x) trial-averaged ΔF/F
+    times_s: np.ndarray  # (n_window,) time of each window frame relative to onset
+    onsets: np.ndarray  # (n_trials,) onset frame of each trial used, in the read stack
+    per_trial: Optional[np.ndarray] = field(default=None)  # (n_trials, n_window, y, x) memmap
+
+
+def stim_onsets(stim_df, column: str = "stim_grating.started") -> np.ndarray:
+    """Stimulus onset times (s) from a PsychoPy trials DataFrame, skipping empty rows."""
+    times = np.asarray(stim_df[column], dtype=np.float64)
+    return times[np.isfinite(times)]
+
+
+def onset_frames(frame_times_ms: np.ndarray, onsets_s: np.ndarray, offset_s: float = 0.0) -> np.ndarray:
+    """Index of the first frame acquired at or after each onset.
+
+    `offset_s` is the frame clock time (s) at which the onsets' clock reads zero.
+    """
+    return np.searchsorted(frame_times_ms, (np.asarray(onsets_s) + offset_s) * 1000.0)
+
+
+def _dff_band(
+    path: str,
+    rows: np.ndarray,
+    band: tuple[int, int],
+    n_baseline: int,
+    per_trial_path: Optional[str],
+) -> tuple[tuple[int, int], np.ndarray]:
+    """ΔF/F of one band of rows for all trial windows; runs in a worker process."""
+    from tifffile import memmap
+
+    r0, r1 = band
+    stack = memmap(path, mode="r")
+    n_trials, n_window = rows.shape
+    # one vectorized read of every window frame for this band
+    data = stack[rows.ravel(), r0:r1, :].astype(np.float32)
+    data = data.reshape(n_trials, n_window, r1 - r0, -1)
+
+    f0 = data[:, :n_baseline].mean(axis=1, keepdims=True)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        dff = (data - f0) / f0
+    dff[~np.isfinite(dff)] = np.nan
+
+    if per_trial_path is not None:
+        out = np.load(per_trial_path, mmap_mode="r+")
+        out[:, :, r0:r1, :] = dff
+        out.flush()
+    with np.errstate(invalid="ignore"):
+        return band, np.nanmean(dff, axis=0)
+
+
+class EventAverager:
+    """Compute stimulus-locked ΔF/F movies for a recorded session.
+
+    Parameters
+    ----------
+    bids_dir : str
+        The session directory (`ExperimentConfig.bids_dir`).
+    channel : str, optional
+        LED channel to analyse; all frames are used if None.
+    pre_s, post_s : float
+        Window around each onset, in seconds. The pre-stimulus part is the ΔF/F
+        baseline.
+    workers : int, optional
+        Size of the process pool; defaults to `os.cpu_count()`. With 1, bands are
+        processed in this process.
+    run : int
+        Which run of the session to open (see `SessionReader`).
+    stim_offset_s : float, optional
+        Meso clock time (s) at which the PsychoPy clock reads zero. Taken from the
+        session's stream report if None (see `alignment.clock_offsets`).
+    """
+
+    def __init__(
+        self,
+        bids_dir: str,
+        channel: Optional[str] = None,
+        pre_s: float = 1.0,
+        post_s: float = 3.0,
+        workers: Optional[int] = None,
+        run: int = 0,
+        stim_offset_s: Optional[float] = None,
+    ) -> None:
+        self.reader = SessionReader(bids_dir, run=run)
+        self.stim_offset_s = stim_offset_s
+        self.channel = str(channel) if channel is not None else None
+        self.pre_s = pre_s
+        self.post_s = post_s
+        self.workers = workers or os.cpu_count() or 1
+
+    def _frames(self) -> tuple[str, np.ndarray, np.ndarray]:
+        """Stack path, frame times (ms) and row of each frame in that stack."""
+        reader = self.reader
+        t_ms = reader.frame_metadata()["runner_time_ms"]
+        if self.channel is None:
+            frames = np.arange(len(t_ms))
+        else:
+            frames = reader.channel_frames(self.channel)
+        channel = self.channel if self.channel in reader.channels else None
+        rows = reader.stack_rows(frames, channel=channel)
+        return reader.image_path(channel=channel), t_ms[frames], rows
+
+    def _stim_offset_s(self) -> float:
+        """Meso clock time (s) of PsychoPy time zero, given or recorded with the session."""
+        if self.stim_offset_s is None:
+            offset = clock_offsets(self.reader).get("psychopy")
+            if offset is None:
+                raise ValueError(
+                    f"No PsychoPy start time recorded for {self.reader}; pass stim_offset_s"
+                )
+            self.stim_offset_s = offset
+        return self.stim_offset_s
+
+    def window_rows(self, onsets_s: Sequence[float]) -> tuple[str, np.ndarray, np.ndarray, int, float]:
+        """Map onsets (s, PsychoPy clock) to an `(n_trials, n_window)` array of stack rows.
+
+        Trials whose window runs past either end of the recording are dropped.
+        Returns the stack path, the rows, the onset rows, the number of baseline frames
+        and the frame interval in seconds.
+        """
+        path, t_ms, rows = self._frames()
+        dt_s = float(np.median(np.diff(t_ms))) / 1000.0
+        n_pre = max(int(round(self.pre_s / dt_s)), 1)
+        n_post = max(int(round(self.post_s / dt_s)), 1)
+
+        onsets = onset_frames(t_ms, onsets_s, self._stim_offset_s())
+        valid = (onsets - n_pre >= 0) & (onsets + n_post <= len(t_ms))
+        positions = onsets[valid, None] + np.arange(-n_pre, n_post)
+        return path, rows[positions], rows[onsets[valid]], n_pre, dt_s
+
+    def compute(self, onsets_s: Sequence[float], per_trial: bool = False) -> EventAverageResult:
+        """Trial-averaged (and optionally per-trial) ΔF/F movies for `onsets_s` (s)."""
+        path, rows, onset_rows, n_pre, dt_s = self.window_rows(onsets_s)
+        n_trials, n_window = rows.shape
+        if n_trials == 0:
+            raise ValueError("No stimulus onsets fall inside the recording")
+
+        height, width = self.reader.images(channel=self.channel).shape[-2:]
+        band_rows = max(1, min(height, BAND_BYTES // (4 * n_trials * n_window * width)))
+        bands = [(r0, min(r0 + band_rows, height)) for r0 in range(0, height, band_rows)]
+
+        per_trial_path = None
+        if per_trial:
+            suffix = f"_led-{self.channel}" if self.channel is not None else ""
+            per_trial_path = self._derivative_path(f"{suffix}{TRIALS_SUFFIX}")
+            np.lib.format.open_memmap(per_trial_path, mode="w+", dtype=np.float32, shape=(n_trials, n_window, height, width))
+
+        mean = np.empty((n_window, height, width), dtype=np.float32)
+        args = [(path, rows, band, n_pre, per_trial_path) for band in bands]
+        if self.workers == 1 or len(bands) == 1:
+            results = [_dff_band(*a) for a in args]
+        else:
+            with ProcessPoolExecutor(max_workers=min(self.workers, len(bands))) as pool:
+                results = pool.map(_dff_band, *zip(*args))
+        for (r0, r1), band_mean in results:
+            mean[:, r0:r1, :] = band_mean
+
+        return EventAverageResult(
+            mean=mean,
+            times_s=np.arange(-n_pre, n_window - n_pre) * dt_s,
+            onsets=onset_rows,
+            per_trial=np.load(per_trial_path, mmap_mode="r") if per_trial_path else None,
+        )
+
+    def _derivative_path(self, suffix: str) -> str:
+        """Path for a derived product next to the recording it was computed from."""
+        base, _ = split_tiff_ext(self.reader.recording_path())
+        return f"{base}{suffix}"
@@ -4,6 +4,9 @@ import matplotlib.pyplot as plt
 import numpy as np
 import os
 
+from pylab.processing.cache import cached
+
+@cached(inputs='path')
 def load_frame_metadata(path):
     # Load the JSON Data
     with open(path, 'r') as file:
@@ -23,6 +26,17 @@ def load_metadata(directory):
     frame_metadata_df = None
     pupil_frame_metadata_df = None
 
+    # Indexed lookup in the save dir catalog, for sessions recorded with it
+    from pylab.io.catalog import SessionCatalog
+    catalog = SessionCatalog.for_path(directory)
+    if catalog is not None:
+        meso = catalog.find(directory, 'meso-frames')
+        pupil = catalog.find(directory, 'pupil-frames')
+        if meso or pupil:
+            frame_metadata_df = load_frame_metadata(meso) if meso else None
+            pupil_frame_metadata_df = load_frame_metadata(pupil) if pupil else None
+            return frame_metadata_df, pupil_frame_metadata_df
+
     # Parse the directory for files ending with '_frame_metadata.json' and 'pupil_frame_metadata.json'
     for file in os.listdir(directory):
         if file.endswith('meso_frame_metadata.jsonf'): #need an 'f' after json???????????????????
@@ -152,6 +166,13 @@ def plot_camera_intervals(frame_metadata_df, pupil_frame_metadata_df, threshold=
     plt.show()
 
 def load_wheel_data(directory) -> pd.DataFrame:
+    from pylab.io.catalog import SessionCatalog
+    catalog = SessionCatalog.for_path(directory)
+    if catalog is not None and (encoder := catalog.find(directory, 'encoder')):
+        return pd.read_csv(encoder)
+    if catalog is not None and (stream := catalog.find(directory, 'encoder-stream')):
+        from pylab.io.sink import encoder_dataframe, read_encoder_stream
+        return encoder_dataframe(read_encoder_stream(stream))
 
     # Parse the beh_path directory for a file ending with 'wheel_df.csv'
     path = os.path.join(os.path.dirname(directory), 'beh')
@@ -164,38 +185,7 @@ def load_wheel_data(directory) -> pd.DataFrame:
     return df
     
 def plot_wheel_data2(wheel_df: pd.DataFrame):
-    # Calculate the time difference in seconds
-    total_seconds = wheel_df['timestamp'].array[-1] - wheel_df['timestamp'][0]  # Get Range
-    time = np.arange(0, total_seconds, 1)  # create array [0,1,...12] with the total_seconds
-
-    # Create separate plots for each variable
-    plt.figure(figsize=(10, 6))#, dpi=300)
-
-    # Plot 'speed' over time
-    plt.subplot(3, 1, 1)
-    plt.plot(wheel_df['timestamp'], wheel_df['speed'])
-    plt.title('Speed')
-    plt.xlabel('Time (secs)')
-    plt.ylabel('Speed')
-
-    # Plot 'distance' over time
-    plt.subplot(3, 1, 2)
-    plt.plot(wheel_df['timestamp'], wheel_df['distance'])
-    plt.title('Distance')
-    plt.xlabel('Time (secs)')
-    plt.ylabel('Distance')
-
-    # Plot 'direction' over time
-    plt.subplot(3, 1, 3)
-    plt.plot(wheel_df['timestamp'], wheel_df['direction'])
-    plt.title('Direction')
-    plt.xlabel('Time (secs)')
-    plt.ylabel('Direction')
-
-    # Adjust the layout
-    plt.tight_layout()
-
-    # Show the plots
+    plot_wheel_traces(wheel_df)
     plt.show()
 
     # # Reverse (flip) backwards data due to wrong encoder direction
@@ -230,13 +220,8 @@ def plot_stim_times(df):
     plt.figure(figsize=(10, 6))
     plt.scatter(df['thisRow.t'], [0] * len(df['thisRow.t']), label='thisRow.t', color='blue')
 
-    # Add vertical lines for 'stim_grayScreen.started'
-    for start_time in df['stim_grayScreen.started']:
-        plt.axvline(x=start_time, color='red', linestyle='--', label='stim_grayScreen.started')
-
-    # Add vertical lines for 'stim_grating.started'
-    for start_time in df['stim_grating.started']:
-        plt.axvline(x=start_time, color='green', linestyle='--', label='stim_grating.started')
+    # One vlines collection per stimulus class
+    plot_stim_markers(plt.gca(), df)
 
     plt.title('Visual stim presentation timepoints')
     plt.xlabel('Time')
@@ -245,50 +230,7 @@ def plot_stim_times(df):
     plt.show()
 
 def plot_wheel_data(wheel_df: pd.DataFrame, stim_df: pd.DataFrame):
-    # Calculate the time difference in seconds
-    total_seconds = wheel_df['timestamp'].array[-1] - wheel_df['timestamp'][0]  # Get Range
-    time = np.arange(0, total_seconds, 1)  # create array [0,1,...12] with the total_seconds
-
-    # Create separate plots for each variable
-    plt.figure(figsize=(10, 6))#, dpi=300)
-
-    # Plot 'speed' over time
-    plt.subplot(3, 1, 1)
-    plt.plot(wheel_df['timestamp'], wheel_df['speed'])
-    plt.title('Speed')
-    plt.xlabel('Time (secs)')
-    plt.ylabel('Speed')
-    for start_time in stim_df['stim_grayScreen.started']:
-        plt.axvline(x=start_time, color='red', linestyle='--', label='stim_grayScreen.started')
-    for start_time in stim_df['stim_grating.started']:
-        plt.axvline(x=start_time, color='green', linestyle='--', label='stim_grating.started')
-
-    # Plot 'distance' over time
-    plt.subplot(3, 1, 2)
-    plt.plot(wheel_df['timestamp'], wheel_df['distance'])
-    plt.title('Distance')
-    plt.xlabel('Time (secs)')
-    plt.ylabel('Distance')
-    for start_time in stim_df['stim_grayScreen.started']:
-        plt.axvline(x=start_time, color='red', linestyle='--', label='stim_grayScreen.started')
-    for start_time in stim_df['stim_grating.started']:
-        plt.axvline(x=start_time, color='green', linestyle='--', label='stim_grating.started')
-
-    # Plot 'direction' over time
-    plt.subplot(3, 1, 3)
-    plt.plot(wheel_df['timestamp'], wheel_df['direction'])
-    plt.title('Direction')
-    plt.xlabel('Time (secs)')
-    plt.ylabel('Direction')
-    for start_time in stim_df['stim_grayScreen.started']:
-        plt.axvline(x=start_time, color='red', linestyle='--', label='stim_grayScreen.started')
-    for start_time in stim_df['stim_grating.started']:
-        plt.axvline(x=start_time, color='green', linestyle='--', label='stim_grating.started')
-
-    # Adjust the layout
-    plt.tight_layout()
-
-    # Show the plots
+    plot_wheel_traces(wheel_df, stim_df)
     plt.show()
 
 def plot_stim_times2(df):
@@ -317,4 +259,145 @@ def plot_stim_times2(df):
     fig.update_layout(title='Visual stim presentation timepoints',
                     xaxis_title='Time')
     fig.show()
-    
+
+# ============================== Downsampled plotting ============================== #
+# Encoder traces hold hundreds of thousands of samples per hour; drawing them all (and
+# one axvline per stimulus) makes figures take minutes. Traces are instead drawn from a
+# cached min-max pyramid at about one point pair per pixel of the axes, and redrawn
+# from the appropriate level whenever the x-limits change.
+
+PYRAMID_FACTOR = 4  # samples merged per bin from one pyramid level to the next
+
+STIM_MARKERS = {
+    'stim_grayScreen.started': 'red',
+    'stim_grating.started': 'green',
+}
+
+
+def minmax_downsample(x, y, bin_size):
+    """Reduce a trace to the (min, max) of every `bin_size` samples, placed at the bin start."""
+    x = np.asarray(x)
+    y = np.asarray(y)
+    if bin_size <= 1 or len(y) == 0:
+        return x, y
+    starts = np.arange(0, len(y), bin_size)
+    ymin = np.minimum.reduceat(y, starts)
+    ymax = np.maximum.reduceat(y, starts)
+    return np.repeat(x[starts], 2), np.column_stack([ymin, ymax]).ravel()
+
+
+def lttb_downsample(x, y, n_out):
+    """Largest-Triangle-Three-Buckets: keep the `n_out` points that best preserve the trace shape."""
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return x, y
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)  # n_out - 2 inner buckets
+    keep = np.empty(n_out, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # average of the next bucket (or the last point) is the third triangle vertex
+        nxt_hi = edges[i + 2] if i + 2 < len(edges) else n
+        cx = x[hi:nxt_hi].mean()
+        cy = y[hi:nxt_hi].mean()
+        area = np.abs((x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a]))
+        a = lo + int(np.argmax(area))
+        keep[i + 1] = a
+    return x[keep], y[keep]
+
+
+class TracePyramid:
+    """Min-max decimation levels of one trace, each built on first use and cached.
+
+    Level k merges `factor**k` samples per bin; level 0 is the raw trace.
+    """
+
+    def __init__(self, x, y, factor=PYRAMID_FACTOR):
+        self.x = np.asarray(x, dtype=np.float64)
+        self.y = np.asarray(y)
+        self.factor = factor
+        self._levels = {0: (self.x, self.y)}
+
+    def level(self, k):
+        if k not in self._levels:
+            self._levels[k] = minmax_downsample(self.x, self.y, self.factor ** k)
+        return self._levels[k]
+
+    def view(self, x0, x1, n_points):
+        """Points of the coarsest level that still has `n_points` bins between x0 and x1."""
+        lo, hi = np.searchsorted(self.x, [x0, x1])
+        visible = max(hi - lo, 1)
+        k = int(np.log(max(visible / max(n_points, 1), 1)) // np.log(self.factor))
+        x, y = self.level(k)
+        # one extra point on each side so the line runs to the axes edges
+        lo, hi = np.searchsorted(x, [x0, x1])
+        lo, hi = max(lo - 2, 0), min(hi + 2, len(x))
+        return x[lo:hi], y[lo:hi]
+
+
+def plot_downsampled(ax, x, y, method='minmax', **kwargs):
+    """Plot a long trace at screen resolution; zooming redraws it from the cached pyramid.
+
+    `method` is 'minmax' (keeps every spike) or 'lttb' (smoother, shape-preserving).
+    Returns the Line2D.
+    """
+    if method not in ('minmax', 'lttb'):
+        raise ValueError(f"method must be 'minmax' or 'lttb', got {method!r}")
+    pyramid = TracePyramid(x, y)
+
+    def points():
+        x0, x1 = ax.get_xlim()
+        width = max(int(ax.bbox.width), 1)
+        if method == 'lttb':
+            # reduce a level with a few points per pixel to exactly one per pixel
+            return lttb_downsample(*pyramid.view(x0, x1, 4 * width), width)
+        return pyramid.view(x0, x1, width)
+
+    line, = ax.plot([], [], **kwargs)
+    if len(pyramid.x) > 1:
+        ax.set_xlim(pyramid.x[0], pyramid.x[-1])
+    line.set_data(*points())
+    ax.relim()
+    ax.autoscale_view(scalex=False)
+
+    def on_xlim_changed(ax):
+        line.set_data(*points())
+
+    ax.callbacks.connect('xlim_changed', on_xlim_changed)
+    line.pyramid = pyramid  # keep the cache alive with the line
+    return line
+
+
+def plot_stim_markers(ax, stim_df, markers=STIM_MARKERS):
+    """Mark stimulus onsets with one vlines collection per stimulus class."""
+    collections = []
+    for column, color in markers.items():
+        if column not in stim_df:
+            continue
+        times = stim_df[column].to_numpy(dtype=np.float64)
+        times = times[np.isfinite(times)]
+        collections.append(
+            ax.vlines(times, 0, 1, transform=ax.get_xaxis_transform(),
+                      colors=color, linestyles='--', label=column)
+        )
+    return collections
+
+
+def plot_wheel_traces(wheel_df, stim_df=None, columns=('speed', 'distance', 'direction'), time_column='timestamp', method='minmax'):
+    """Downsampled, x-linked subplots of the wheel traces with optional stimulus markers."""
+    fig, axes = plt.subplots(len(columns), 1, figsize=(10, 6), sharex=True)
+    axes = np.atleast_1d(axes)
+    t = wheel_df[time_column].to_numpy()
+    for ax, column in zip(axes, columns):
+        plot_downsampled(ax, t, wheel_df[column].to_numpy(), method=method)
+        ax.set_title(column.capitalize())
+        ax.set_ylabel(column.capitalize())
+        if stim_df is not None:
+            plot_stim_markers(ax, stim_df)
+    axes[-1].set_xlabel('Time (secs)')
+    fig.tight_layout()
+    return fig
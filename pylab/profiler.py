@@ -0,0 +1,211 @@
+"""Opt-in sampling profiler covering every PyLab thread.
+
+`SessionProfiler` samples the Python stack of every thread (the Qt main thread, both
+MDA runner threads, the `SerialWorker` QThread, ...) from a helper thread at a fixed
+interval, using `sys._current_frames()`. Nothing is installed in the profiled threads,
+so the cost to them is the GIL hand-off of one sample per interval.
+
+Each recording is one profiling session. Its output is written to the session
+directory:
+
+    <bids_dir>/profile/run-<run>/
+        <thread>.folded   collapsed stacks ("a;b;c <count>"), one file per thread,
+                          readable by flamegraph.pl, speedscope or inferno
+        memory.txt        tracemalloc summary per phase (setup, recording)
+
+Example Usage:
+    ```python
+    from pylab.profiler import profiler
+    profiler.enable()                 # or `pylab launch --profile`
+    profiler.begin_session(directory)
+    profiler.phase('recording')
+    profiler.end_session()            # writes the files
+    profiler.disable()
+    ```
+"""
+
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, defaultdict
+from typing import Optional
+
+SAMPLE_INTERVAL_S = 0.01
+MEMORY_TOP_LINES = 15
+TRACEMALLOC_FRAMES = 1
+
+
+def _thread_names() -> dict[int, str]:
+    names = {t.ident: t.name for t in threading.enumerate() if t.ident is not None}
+    names[threading.main_thread().ident] = "MainThread"
+    return names
+
+
+def session_directory(bids_dir: str, run: int) -> str:
+    """Where the profile of recording `run` of a session is written."""
+    return os.path.join(bids_dir, "profile", f"run-{run}")
+
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SessionProfiler:
+    """Stack sampler for all threads, plus tracemalloc snapshots at session phases.
+
+    Parameters
+    ----------
+    interval : float
+        Seconds between samples.
+    memory : bool
+        Also trace allocations with tracemalloc (slows down allocation-heavy code).
+    """
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL_S, memory: bool = True) -> None:
+        self.interval = interval
+        self.memory = memory
+        self.enabled = False
+        self.directory: Optional[str] = None
+        # per thread name: Counter of stacks (tuples of code objects, outermost first)
+        self._stacks: defaultdict[str, Counter] = defaultdict(Counter)
+        self._phases: list[tuple[str, float, Optional[tracemalloc.Snapshot]]] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+        self._started_tracemalloc = False
+
+    # ============================== Switches ============================ #
+
+    def enable(self) -> None:
+        """Start sampling (and tracing allocations, with `memory`)."""
+        if self.enabled:
+            return
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+            self._started_tracemalloc = True
+        self._stop.clear()
+        self._sampler = threading.Thread(target=self._sample_loop, name="profiler-sampler", daemon=True)
+        self._sampler.start()
+        self.enabled = True
+        logging.info(f"SessionProfiler enabled, sampling every {self.interval * 1000:.0f} ms")
+
+    def disable(self) -> None:
+        """Stop sampling; an open session is written out first."""
+        if not self.enabled:
+            return
+        if self.directory is not None:
+            self.end_session()
+        self._stop.set()
+        self._sampler.join()
+        self._sampler = None
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+        self.enabled = False
+        logging.info("SessionProfiler disabled")
+
+    def toggle(self) -> bool:
+        """Enable or disable profiling; returns the new state."""
+        self.disable() if self.enabled else self.enable()
+        return self.enabled
+
+    # ============================== Sampling ============================ #
+
+    def _sample_loop(self) -> None:
+        own = threading.get_ident()
+        names = _thread_names()
+        names_at = time.monotonic()
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            if time.monotonic() - names_at > 1.0 or not frames.keys() <= names.keys():
+                names, names_at = _thread_names(), time.monotonic()
+            with self._lock:
+                for ident, frame in frames.items():
+                    if ident == own:
+                        continue
+                    stack = []
+                    while frame is not None:
+                        stack.append(frame.f_code)
+                        frame = frame.f_back
+                    stack.reverse()
+                    self._stacks[names.get(ident, f"thread-{ident}")][tuple(stack)] += 1
+            frames = frame = None  # don't keep the sampled frames alive
+
+    def samples(self) -> dict[str, int]:
+        """Number of samples taken per thread in the current session."""
+        with self._lock:
+            return {name: sum(stacks.values()) for name, stacks in self._stacks.items()}
+
+    def folded(self, thread: str) -> str:
+        """Collapsed stacks of one thread, one `frame;frame;... count` line per stack."""
+        with self._lock:
+            stacks = list(self._stacks.get(thread, {}).items())
+        lines = [f"{';'.join(_frame_label(code) for code in stack)} {count}" for stack, count in stacks]
+        return "\n".join(sorted(lines)) + "\n"
+
+    # ============================== Sessions ============================ #
+
+    def begin_session(self, directory: str) -> None:
+        """Start a profiling session written to `directory`; clears earlier samples."""
+        if not self.enabled:
+            return
+        if self.directory is not None:
+            self.end_session()
+        with self._lock:
+            self._stacks.clear()
+        self._phases = []
+        self.directory = directory
+        self.phase("setup")
+
+    def phase(self, name: str) -> None:
+        """Mark the start of a session phase (takes a tracemalloc snapshot)."""
+        if not self.enabled or self.directory is None:
+            return
+        snapshot = tracemalloc.take_snapshot() if tracemalloc.is_tracing() else None
+        self._phases.append((name, time.perf_counter(), snapshot))
+
+    def end_session(self, directory: Optional[str] = None) -> Optional[str]:
+        """Write the per-thread folded stacks and the memory summary; returns the directory.
+
+        With `directory`, only that session is ended: nothing happens if a later
+        session has already replaced it.
+        """
+        if directory is not None and directory != self.directory:
+            return None
+        directory, self.directory = self.directory, None
+        if directory is None:
+            return None
+        if tracemalloc.is_tracing():
+            self._phases.append(("end", time.perf_counter(), tracemalloc.take_snapshot()))
+        os.makedirs(directory, exist_ok=True)
+        for thread in self.samples():
+            safe = re.sub(r"[^\w.-]+", "_", thread)
+            with open(os.path.join(directory, f"{safe}.folded"), "w") as f:
+                f.write(self.folded(thread))
+        with open(os.path.join(directory, "memory.txt"), "w") as f:
+            f.write(self.memory_summary())
+        logging.info(f"SessionProfiler wrote {directory}")
+        return directory
+
+    def memory_summary(self) -> str:
+        """Per phase: duration, traced memory at its end, and the lines that allocated most."""
+        phases = self._phases
+        if not phases or phases[0][2] is None:
+            return "tracemalloc was not tracing during this session\n"
+        out = []
+        for (name, start, before), (_, end, after) in zip(phases, phases[1:]):
+            if before is None or after is None:
+                continue
+            total = sum(stat.size for stat in after.statistics("filename"))
+            out.append(f"== {name}: {end - start:.2f} s, {total / 1e6:.1f} MB traced at end ==")
+            for stat in after.compare_to(before, "lineno")[:MEMORY_TOP_LINES]:
+                out.append(f"  {stat}")
+            out.append("")
+        return "\n".join(out) + "\n"
+
+
+profiler = SessionProfiler()
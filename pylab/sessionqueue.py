@@ -0,0 +1,156 @@
+"""Back-to-back recording of a list of experiment JSONs.
+
+`SessionQueue` hands out the queued experiments one at a time and prepares the next
+one in a background thread while the current one records:
+- its JSON is loaded and validated, including the LED pattern against the
+  Arduino-Switch;
+- its output files are reserved (`ExperimentConfig.prepare_session`).
+
+When a recording ends, `next()` loads the prepared session into the config
+(`ExperimentConfig.use_prepared`) and the next recording starts on the same
+initialized cores. The gap between sessions is the time to arm the streams, not the
+time to reload and set up.
+
+An experiment that fails validation is reported while the session before it is still
+recording. `next()` raises its `ValueError`, and the caller stops the queue.
+
+Example Usage:
+    ```python
+    queue = SessionQueue(config, ['mouse1.json', 'mouse2.json'], *arduino_led_limits(mmc))
+    while (prepared := queue.next()) is not None:
+        record()                      # ConfigController.record / HeadlessRunner
+    queue.close()
+    ```
+"""
+
+import json
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import TYPE_CHECKING, Iterator, Optional
+
+if TYPE_CHECKING:
+    from pymmcore_plus import CMMCorePlus
+    from pylab.config import ExperimentConfig, PreparedSession
+
+LED_DEVICE = ('Arduino-Switch', 'State')
+
+logger = logging.getLogger(__name__)
+
+
+def arduino_led_limits(mmc: 'CMMCorePlus') -> tuple[Optional[list[str]], Optional[int]]:
+    """Allowed states and maximum sequence length of the LED switch, if it is loaded.
+
+    Read once on the calling thread, so the preparation thread never touches the core.
+    """
+    device, prop = LED_DEVICE
+    if device not in mmc.getLoadedDevices():
+        return None, None
+    allowed = list(mmc.getAllowedPropertyValues(device, prop)) or None
+    max_length = mmc.getPropertySequenceMaxLength(device, prop) if mmc.isPropertySequenceable(device, prop) else None
+    return allowed, max_length
+
+
+def validate_led_pattern(pattern, allowed: Optional[list[str]] = None, max_length: Optional[int] = None) -> list[str]:
+    """Problems that would stop the Arduino-Switch from loading `pattern` (empty if none).
+
+    `allowed` and `max_length` are the State property's allowed values and maximum
+    sequence length, when the device is loaded.
+    """
+    if isinstance(pattern, str):
+        try:
+            pattern = json.loads(pattern.replace("'", '"'))
+        except json.JSONDecodeError:
+            return [f"led_pattern {pattern!r} is not a JSON list"]
+    if not isinstance(pattern, list) or not pattern:
+        return [f"led_pattern must be a non-empty list, got {pattern!r}"]
+    errors = []
+    if max_length is not None and len(pattern) > max_length:
+        errors.append(f"led_pattern has {len(pattern)} states, the Arduino-Switch takes at most {max_length}")
+    for state in pattern:
+        if not str(state).isdigit():
+            errors.append(f"led_pattern state {state!r} is not an integer")
+        elif allowed and str(state) not in allowed:
+            errors.append(f"led_pattern state {state!r} is not an Arduino-Switch state {allowed}")
+    return errors
+
+
+class SessionQueue:
+    """Experiments recorded back to back, each prepared while the one before records.
+
+    Parameters
+    ----------
+    config : ExperimentConfig
+        The config of the initialized cores; each session is loaded into it in turn.
+    experiments : list[str]
+        Experiment parameter JSON files, in recording order.
+    led_states, led_max_length : optional
+        Limits of the Arduino-Switch LED sequence (see `arduino_led_limits`).
+    """
+
+    def __init__(
+        self,
+        config: 'ExperimentConfig',
+        experiments: list[str],
+        led_states: Optional[list[str]] = None,
+        led_max_length: Optional[int] = None,
+    ) -> None:
+        self.config = config
+        self.experiments = list(experiments)
+        self.led_states = led_states
+        self.led_max_length = led_max_length
+        self.index = 0  # sessions handed out so far
+        self._executor = ThreadPoolExecutor(1, thread_name_prefix='session-prepare')
+        self._next: Optional[Future] = None
+        self._closed = False
+
+    def __len__(self) -> int:
+        return len(self.experiments)
+
+    @property
+    def remaining(self) -> int:
+        return len(self.experiments) - self.index
+
+    def _prepare(self, index: int) -> Future:
+        experiment = self.experiments[index]
+        logger.info('Preparing queued session %d/%d: %s', index + 1, len(self), experiment)
+        return self._executor.submit(
+            self.config.prepare_session, experiment, self.led_states, self.led_max_length
+        )
+
+    def start(self) -> None:
+        """Start preparing the first session (`next()` does it otherwise)."""
+        if self._next is None and not self._closed and self.remaining:
+            self._next = self._prepare(self.index)
+
+    def next(self) -> Optional['PreparedSession']:
+        """Load the next session into the config and start preparing the one after it.
+
+        Returns None when the queue is done or closed. Raises the `ValueError` of a
+        session that failed validation.
+        """
+        if self._closed or not self.remaining:
+            return None
+        self.start()
+        future, self._next = self._next, None
+        prepared = future.result()
+        self.index += 1
+        self.config.use_prepared(prepared)
+        if self.remaining:
+            self._next = self._prepare(self.index)
+        return prepared
+
+    def __iter__(self) -> Iterator['PreparedSession']:
+        while (prepared := self.next()) is not None:
+            yield prepared
+
+    def close(self) -> None:
+        """Stop the queue; files reserved for a session that won't be recorded are removed."""
+        self._closed = True
+        future, self._next = self._next, None
+        if future is not None and not future.cancel():
+            try:
+                self.config.discard_prepared(future.result())
+            except Exception:
+                pass  # it failed validation, nothing was reserved
+        self.config.discard_prepared()
+        self._executor.shutdown(wait=False)
@@ -9,8 +9,9 @@ import json
 from pymmcore_plus import CMMCorePlus
 from pymmcore_plus.mda import MDAEngine
 
-from pylab.engines import DevEngine, MesoEngine, PupilEngine
+from pylab.engines import DevEngine, MesoEngine, PupilEngine, ReplayEngine
 from pylab.io.worker import SerialWorker
+from pylab.io.transform import FrameTransform
 
 # Disable pymmcore-plus logger
 package_logger = logging.getLogger('pymmcore-plus')
@@ -54,6 +55,7 @@ class Engine:
     ''' Engine dataclass to create different engine types for MDA '''
     name: str
     use_hardware_sequencing: bool = True
+    options: Dict[str, object] = field(default_factory=dict)  # extra engine keyword arguments
 
     def create_engine(self, mmcore: CMMCorePlus):
         # Create an appropriate engine based on the given name
@@ -63,6 +65,8 @@ class Engine:
             return MesoEngine(mmcore, use_hardware_sequencing=self.use_hardware_sequencing)
         elif self.name == 'PupilEngine':
             return PupilEngine(mmcore, use_hardware_sequencing=self.use_hardware_sequencing)
+        elif self.name == 'ReplayEngine':
+            return ReplayEngine(mmcore, use_hardware_sequencing=self.use_hardware_sequencing, **self.options)
         else:
             raise ValueError(f"Unknown engine type: {self.name}")     
 
@@ -75,6 +79,9 @@ class Core:
     memory_buffer_size: int = 2000
     use_hardware_sequencing: bool = True
     roi: Optional[List[int]] = None  # (x, y, width, height)
+    crop: Optional[List[int]] = None  # software (x, y, width, height) crop before writing
+    binning: int = 1  # software block binning before writing
+    bin_mode: str = 'mean'  # 'mean' or 'sum' over each binning block
     trigger_port: Optional[int] = None
     properties: Dict[str, str] = field(default_factory=dict)
     core: Optional[CMMCorePlus] = field(default=None, init=False)
@@ -88,9 +95,16 @@ class Core:
             f"  engine={repr(self.engine)}\n"
             f"  configuration_path='{self.configuration_path}',\n"
             f"  memory_buffer_size={self.memory_buffer_size},\n"
+            f"  crop={self.crop}, binning={self.binning} ({self.bin_mode}),\n"
             f"  properties={self.properties}\n\n"
         )
 
+    def output_pipeline(self, outputs: list) -> list:
+        ''' Put the software crop/bin stage in front of the MDA output handlers, if configured '''
+        if self.crop is None and self.binning == 1:
+            return outputs
+        return [FrameTransform(outputs, crop=self.crop, binning=self.binning, mode=self.bin_mode)]
+
     def _load_core(self):
         ''' Load the core with specified configurations '''
         self.core = CMMCorePlus()
@@ -210,7 +224,27 @@ class Startup:
             core_instance.engine = Engine(name='PupilEngine', use_hardware_sequencing=core_data.get('use_hardware_sequencing', True))
             json_data['thorcam'] = core_instance
         
-        return cls(**json_data)
+        replay = json_data.pop('replay', None)
+        startup = cls(**json_data)
+        if replay:
+            startup.use_replay(**replay)
+        return startup
+
+    def use_replay(self, session: str, speed: float = 1.0, run: int = 0):
+        ''' Replay a recorded session instead of acquiring: both cores get a ReplayEngine
+        and the encoder re-emits the recorded wheel samples (see `ReplayEngine`).
+        Call before `initialize_cores`.
+        '''
+        from pylab.io.reader import SessionReader
+
+        for core, modality in ((self.widefield, 'meso'), (self.thorcam, 'pupil')):
+            core.engine = Engine(
+                name='ReplayEngine',
+                use_hardware_sequencing=core.use_hardware_sequencing,
+                options={'session': session, 'modality': modality, 'speed': speed, 'run': run},
+            )
+        self.encoder.worker.load_replay(SessionReader(session, run).encoder(), speed)
+        logging.info(f"Replaying session {session} (run {run}) at {speed}x")
     
     def initialize_cores(self, cfg):
         # Initialize widefield and thorcam cores
@@ -0,0 +1,247 @@
+"""Synchronised start and teardown of the acquisition streams of one recording.
+
+`SessionSupervisor` starts every registered stream (the two MDA cores, the wheel
+encoder, ...) from its own thread. All threads first *arm* their stream, then wait on
+a common `threading.Barrier`, and are released together. Each stream reports its first
+sample (via `first_sample(name)`), and everything is timestamped on one monotonic clock
+(`time.perf_counter`), so the start skew between devices is measured, not guessed.
+
+Example Usage:
+    ```python
+    supervisor = SessionSupervisor()
+    supervisor.add_stream('meso', start=lambda: mmc.run_mda(seq, output=writers),
+                          arm=lambda: mmc.mda.engine.arm(seq), stop=mmc.mda.cancel)
+    mmc.mda.events.frameReady.connect(supervisor.first_sample_callback('meso'))
+    supervisor.start()
+    ...
+    report = supervisor.teardown()  # stops and waits on every stream concurrently
+    ```
+
+With `report_path` set (e.g. `SessionPaths.streams`), the report is also saved with the
+session when the streams finish, so the analysis can map each device's clock onto the
+others (`pylab.processing.alignment.clock_offsets`).
+"""
+
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional
+
+ARM_TIMEOUT_S = 30.0
+
+
+@dataclass
+class Stream:
+    """ One device stream and the times it went through each stage """
+    name: str
+    start: Callable[[], Any]
+    arm: Optional[Callable[[], Any]] = None
+    stop: Optional[Callable[[], Any]] = None
+    wait: Optional[Callable[[], Any]] = None
+    armed: Optional[float] = None
+    released: Optional[float] = None
+    first_sample: Optional[float] = None
+    finished: Optional[float] = None
+    error: Optional[BaseException] = None
+    handle: Any = field(default=None, repr=False)  # whatever `start` returned
+
+
+def _join(handle) -> None:
+    """ Wait on what a stream's `start` returned (a Thread, QThread or Future) """
+    for method in ('join', 'wait', 'result'):
+        if callable(getattr(handle, method, None)):
+            getattr(handle, method)()
+            return
+
+
+class SessionSupervisor:
+    """Arm, release and tear down a recording's streams together.
+
+    Parameters
+    ----------
+    clock : callable
+        Monotonic clock in seconds shared by every timestamp.
+    arm_timeout : float
+        Seconds to wait for every stream to arm before the start is aborted.
+    report_path : str, optional
+        JSON file the report is written to once every stream has finished.
+    """
+
+    def __init__(
+        self,
+        clock: Callable[[], float] = time.perf_counter,
+        arm_timeout: float = ARM_TIMEOUT_S,
+        report_path: Optional[str] = None,
+    ) -> None:
+        self.clock = clock
+        self.arm_timeout = arm_timeout
+        self.report_path = report_path
+        self.streams: dict[str, Stream] = {}
+        self._lock = threading.Lock()
+        self._threads: list[threading.Thread] = []
+        self._extra_samples: dict[str, float] = {}
+        self.t0: Optional[float] = None
+
+    def add_stream(
+        self,
+        name: str,
+        start: Callable[[], Any],
+        arm: Optional[Callable[[], Any]] = None,
+        stop: Optional[Callable[[], Any]] = None,
+        wait: Optional[Callable[[], Any]] = None,
+    ) -> Stream:
+        """Register a stream.
+
+        `arm` prepares it (e.g. clears buffers) before the barrier; `start` is called the
+        moment the barrier releases; `stop` ends it early; `wait` blocks until it has
+        finished. Without `wait`, the value returned by `start` is joined instead.
+        """
+        if self.t0 is not None:
+            raise RuntimeError("Streams must be added before the session starts")
+        stream = self.streams[name] = Stream(name, start, arm, stop, wait)
+        return stream
+
+    # ============================== Timestamps ========================== #
+
+    def first_sample(self, name: str) -> None:
+        """Record the arrival of the first sample of `name` (later calls are ignored).
+
+        Names that are not streams (e.g. an externally launched stimulus process) are
+        reported alongside them.
+        """
+        now = self.clock()
+        with self._lock:
+            stream = self.streams.get(name)
+            if stream is None:
+                self._extra_samples.setdefault(name, now)
+            elif stream.first_sample is None:
+                stream.first_sample = now
+
+    def first_sample_callback(self, name: str) -> Callable[..., None]:
+        """A callback that can be connected to any per-sample signal of `name`.
+
+        After the first sample it returns without taking the lock, so it is cheap to
+        leave connected to a per-frame signal.
+        """
+        recorded = False
+
+        def callback(*args, **kwargs) -> None:
+            nonlocal recorded
+            if not recorded:
+                recorded = True
+                self.first_sample(name)
+        return callback
+
+    # ============================== Start =============================== #
+
+    def start(self) -> None:
+        """Arm every stream on its own thread and release them all at once.
+
+        Returns when every stream has been started. If a stream fails to arm, the
+        barrier is broken, the streams that did start are stopped and RuntimeError is
+        raised.
+        """
+        barrier = threading.Barrier(len(self.streams) + 1)
+        for stream in self.streams.values():
+            thread = threading.Thread(target=self._run, args=(stream, barrier), name=f"stream-{stream.name}", daemon=True)
+            self._threads.append(thread)
+            thread.start()
+
+        try:
+            barrier.wait(timeout=self.arm_timeout)
+        except threading.BrokenBarrierError:
+            failed = {s.name: s.error for s in self.streams.values() if s.armed is None or s.error}
+            self.teardown()
+            raise RuntimeError(f"Session start aborted, streams failed to arm: {failed}") from None
+        self.t0 = self.clock()
+        for thread in self._threads:
+            thread.join()  # `start` callables only launch their stream
+        logging.info(f"{self.__class__.__name__} released {list(self.streams)}")
+
+    def _run(self, stream: Stream, barrier: threading.Barrier) -> None:
+        try:
+            if stream.arm is not None:
+                stream.arm()
+            stream.armed = self.clock()
+        except BaseException as e:
+            stream.error = e
+            barrier.abort()
+            return
+        try:
+            barrier.wait(timeout=self.arm_timeout)
+        except threading.BrokenBarrierError:
+            return
+        stream.released = self.clock()
+        try:
+            stream.handle = stream.start()
+        except BaseException as e:
+            stream.error = e
+            logging.info(f"{self.__class__.__name__}: stream {stream.name} failed to start: {e!r}")
+
+    # ============================== Teardown ============================ #
+
+    def wait(self, timeout: Optional[float] = None) -> dict:
+        """Block until every stream has finished by itself; returns the report."""
+        return self._finish(stop=False, timeout=timeout)
+
+    def teardown(self, timeout: Optional[float] = None) -> dict:
+        """Stop every stream and wait on all of them concurrently; returns the report."""
+        return self._finish(stop=True, timeout=timeout)
+
+    def _finish(self, stop: bool, timeout: Optional[float]) -> dict:
+        for thread in self._threads:
+            thread.join(timeout)
+
+        def finish(stream: Stream) -> None:
+            try:
+                if stop and stream.stop is not None and stream.released is not None:
+                    stream.stop()
+                if stream.wait is not None:
+                    stream.wait()
+                elif stream.handle is not None:
+                    _join(stream.handle)
+            except BaseException as e:
+                stream.error = stream.error or e
+            stream.finished = self.clock()
+
+        if self.streams:
+            with ThreadPoolExecutor(max_workers=len(self.streams), thread_name_prefix="teardown") as pool:
+                futures = [pool.submit(finish, s) for s in self.streams.values()]
+                for future in futures:
+                    future.result(timeout)
+        report = self.report()
+        logging.info(f"{self.__class__.__name__} session report: {report}")
+        if self.report_path is not None:
+            with open(self.report_path, "w") as file:
+                json.dump(report, file, indent=4)
+        return report
+
+    # ============================== Report ============================== #
+
+    def report(self) -> dict:
+        """Per-stream times (ms after release) and the first-sample skew between streams."""
+        t0 = self.t0 if self.t0 is not None else self.clock()
+
+        def ms(t: Optional[float]) -> Optional[float]:
+            return None if t is None else round((t - t0) * 1000, 3)
+
+        streams = {
+            s.name: {
+                "released_ms": ms(s.released),
+                "first_sample_ms": ms(s.first_sample),
+                "finished_ms": ms(s.finished),
+                "error": repr(s.error) if s.error else None,
+            }
+            for s in self.streams.values()
+        }
+        firsts = [s.first_sample for s in self.streams.values() if s.first_sample is not None]
+        releases = [s.released for s in self.streams.values() if s.released is not None]
+        return {
+            "streams": streams,
+            "events": {name: ms(t) for name, t in self._extra_samples.items()},
+            "release_skew_ms": round((max(releases) - min(releases)) * 1000, 3) if releases else None,
+            "first_sample_skew_ms": round((max(firsts) - min(firsts)) * 1000, 3) if len(firsts) > 1 else None,
+        }
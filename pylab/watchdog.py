@@ -0,0 +1,153 @@
+"""Event-loop stall detection for the Qt main thread.
+
+`StallDetector.heartbeat()` is connected to a repeating `QTimer` in the main thread
+(see `MainWindow`). Each tick records how late the timer fired. If the main thread
+does not tick for longer than `threshold`, a helper thread captures the main thread's
+Python stack *while it is blocked*, so each stall is recorded with the code that
+caused it, for example ImagePreview rendering, a config table refresh or console
+activity.
+
+Stalls are kept in a bounded list, logged (and so written to the session log), and
+counted in `metrics` histograms (`gui.lateness`, `gui.stalls`). The same histograms
+show up in `metrics.format()`.
+
+Example Usage:
+    ```python
+    detector = StallDetector(interval=0.05, threshold=0.2)
+    timer.timeout.connect(detector.heartbeat)   # QTimer in the main thread
+    detector.start()
+    print(detector.summary())
+    ```
+"""
+
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from pylab.metrics import LatencyHistogram, metrics
+
+WATCHDOG_INTERVAL_S = 0.05
+STALL_THRESHOLD_S = 0.2
+MAX_STALLS = 200
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Stall:
+    """One period in which the watched thread did not run its event loop."""
+    at: float  # time.time() when the stall ended
+    duration_s: float
+    stack: str  # the watched thread's stack during the stall ('' if it wasn't captured)
+
+    def culprit(self) -> str:
+        """The innermost frame of the captured stack (file, line and function)."""
+        lines = [line for line in self.stack.splitlines() if line.lstrip().startswith('File ')]
+        return lines[-1].strip() if lines else 'unknown'
+
+
+class StallDetector:
+    """Measure event-loop lateness of one thread and capture its stack during stalls.
+
+    Parameters
+    ----------
+    interval : float
+        Seconds between heartbeats (the QTimer interval).
+    threshold : float
+        A heartbeat later than this (beyond `interval`) is a stall.
+    thread_id : int, optional
+        The watched thread; the main thread by default.
+    """
+
+    def __init__(
+        self,
+        interval: float = WATCHDOG_INTERVAL_S,
+        threshold: float = STALL_THRESHOLD_S,
+        thread_id: Optional[int] = None,
+        clock: Callable[[], float] = time.perf_counter,
+    ) -> None:
+        self.interval = interval
+        self.threshold = threshold
+        self.thread_id = thread_id or threading.main_thread().ident
+        self.clock = clock
+        self.lateness: LatencyHistogram = metrics.histogram('gui.lateness')
+        self.stall_durations: LatencyHistogram = metrics.histogram('gui.stalls')
+        self.stalls: deque[Stall] = deque(maxlen=MAX_STALLS)
+        self.callbacks: list[Callable[[Stall], None]] = []
+        self._last: Optional[float] = None
+        self._captured: Optional[str] = None
+        self._stop = threading.Event()
+        self._helper: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Start the helper thread that captures stacks during stalls."""
+        self._last = self.clock()
+        self._stop.clear()
+        self._helper = threading.Thread(target=self._watch, name='stall-watchdog', daemon=True)
+        self._helper.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._helper is not None:
+            self._helper.join()
+            self._helper = None
+
+    def heartbeat(self) -> Optional[Stall]:
+        """Called by the timer in the watched thread; returns the stall that just ended, if any."""
+        now = self.clock()
+        last, self._last = self._last, now
+        captured, self._captured = self._captured, None
+        if last is None:
+            return None
+        late = max(now - last - self.interval, 0.0)
+        self.lateness.record(late)
+        if late < self.threshold:
+            return None
+
+        stall = Stall(time.time(), late, captured or '')
+        self.stalls.append(stall)
+        self.stall_durations.record(late)
+        logger.warning('GUI event loop stalled for %.0f ms at %s\n%s', late * 1000, stall.culprit(), stall.stack)
+        for callback in self.callbacks:
+            callback(stall)
+        return stall
+
+    def _watch(self) -> None:
+        while not self._stop.wait(self.threshold / 4):
+            last = self._last
+            if last is None or self._captured is not None:
+                continue
+            if self.clock() - last > self.interval + self.threshold:
+                frame = sys._current_frames().get(self.thread_id)
+                if frame is not None and self._last == last:  # still the same stall
+                    self._captured = ''.join(traceback.format_stack(frame))
+                frame = None
+
+    # ============================== Report ============================== #
+
+    def summary(self) -> str:
+        """Stall count, percentiles, a bucket histogram and the most frequent culprits."""
+        hist = self.stall_durations
+        if not hist.count:
+            return f'No stalls over {self.threshold * 1000:.0f} ms'
+        s = hist.summary()
+        lines = [f"{hist.count} stalls over {self.threshold * 1000:.0f} ms: "
+                 f"p50 {s['p50_ms']:.0f} ms, p99 {s['p99_ms']:.0f} ms, max {s['max_ms']:.0f} ms"]
+        counts = list(hist.counts)
+        peak = max(counts)
+        for i, count in enumerate(counts):
+            if count:
+                upper = LatencyHistogram.bucket_upper(i) * 1000
+                lines.append(f"  < {upper:8.0f} ms {count:5d} {'#' * max(1, round(30 * count / peak))}")
+        culprits: dict[str, int] = {}
+        for stall in self.stalls:
+            culprits[stall.culprit()] = culprits.get(stall.culprit(), 0) + 1
+        lines.append('Culprits:')
+        for culprit, count in sorted(culprits.items(), key=lambda item: -item[1])[:5]:
+            lines.append(f"  {count:5d}  {culprit}")
+        return '\n'.join(lines)
@@ -12,3 +12,12 @@ def go_to_tmpdir(request):
     # Chdir only for the duration of the test.
     with tmpdir.as_cwd():
         yield
+
+
+# keep the processing cache out of the user's home directory
+@pytest.fixture(autouse=True)
+def isolated_processing_cache(tmp_path_factory, monkeypatch):
+    monkeypatch.setenv("PYLAB_CACHE_DIR", str(tmp_path_factory.mktemp("pylab-cache")))
+    cache = sys.modules.get("pylab.processing.cache")
+    if cache is not None:
+        monkeypatch.setattr(cache, "_default_cache", None)
@@ -0,0 +1,90 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pylab.io.reader import SessionReader
+from pylab.processing.alignment import Timeline, align_session, build_timeline, clock_offsets, nearest_index
+
+
+def test_nearest_index():
+    pupil = np.array([0.0, 1.0, 2.0, 3.0])
+    assert nearest_index(pupil, np.array([-1.0, 0.4, 0.6, 2.5, 9.0])).tolist() == [0, 0, 1, 2, 3]
+
+
+def test_build_timeline():
+    frames = np.arange(10) * 0.5  # 2 Hz meso
+    timeline = build_timeline(
+        frames,
+        encoder_times_s=np.array([1.0, 3.0]),
+        encoder_speed=np.array([0.0, 2.0]),
+        pupil_times_s=np.arange(0, 5, 0.2),
+        trial_starts_s=np.array([1.0, np.nan, 3.0]),
+    )
+    assert len(timeline) == 10
+    assert np.isnan(timeline.wheel_speed[[0, 1, 7]]).all()
+    assert timeline.wheel_speed[2:7].tolist() == pytest.approx([0.0, 0.5, 1.0, 1.5, 2.0])
+    assert timeline.pupil_frame.tolist() == [0, 2, 5, 7, 10, 12, 15, 17, 20, 22]
+    assert timeline.trial.tolist() == [-1, -1, 0, 0, 0, 0, 2, 2, 2, 2]
+
+
+def test_missing_inputs_and_roundtrip(tmp_path):
+    timeline = build_timeline(np.arange(3, dtype=float))
+    assert np.isnan(timeline.wheel_speed).all()
+    assert (timeline.pupil_frame == -1).all() and (timeline.trial == -1).all()
+    timeline.save(tmp_path / "timeline.npz")
+    loaded = Timeline.load(tmp_path / "timeline.npz")
+    assert loaded.trial.dtype == np.int32
+    np.testing.assert_array_equal(loaded.frame_times_s, timeline.frame_times_s)
+
+
+@pytest.fixture
+def session(tmp_path):
+    """Meso frames every 0.5 s from 10 s on the runner clock, and a wheel turning at 1 s."""
+    bids_dir = tmp_path / "ses-01"
+    (bids_dir / "func").mkdir(parents=True)
+    (bids_dir / "beh").mkdir()
+    stem = "protocol-sub-001_ses-01_task-test"
+    with open(bids_dir / "func" / f"{stem}_meso.ome.tiffmetadata.json", "w") as file:
+        json.dump({"p0": [{"runner_time_ms": 10_000.0 + 500.0 * i} for i in range(10)]}, file)
+    # the encoder clock started 0.125 s before its first sample
+    pd.DataFrame({"Clicks": [0, 1, 2], "Time": [0.125, 0.625, 1.125], "Speed": [0.0, 1.0, 2.0]}).to_csv(
+        bids_dir / "beh" / "001_ses-01_encoder-data.csv", index=False
+    )
+    (bids_dir / f"{stem}_streams.json").touch()
+    return bids_dir
+
+
+def write_report(bids_dir, meso_first_ms=250.0, encoder_first_ms=250.0, psychopy_ms=-750.0):
+    report = {
+        "streams": {
+            "meso": {"released_ms": 0.0, "first_sample_ms": meso_first_ms, "finished_ms": None, "error": None},
+            "encoder": {"released_ms": 0.0, "first_sample_ms": encoder_first_ms, "finished_ms": None, "error": None},
+        },
+        "events": {"psychopy": psychopy_ms},
+    }
+    (bids_dir / "protocol-sub-001_ses-01_task-test_streams.json").write_text(json.dumps(report))
+
+
+def test_clock_offsets_from_stream_report(session):
+    reader = SessionReader(session)
+    assert clock_offsets(reader) == {}  # reserved but never written
+    write_report(session)
+    # released at 10 - 0.25 s on the meso clock
+    assert clock_offsets(reader) == {"encoder": pytest.approx(9.875), "psychopy": pytest.approx(9.0)}
+
+
+def test_align_session_uses_recorded_offsets(session):
+    stim_df = pd.DataFrame({"thisRow.t": [1.0, 2.0]})  # PsychoPy clock started at 9 s
+    timeline = align_session(SessionReader(session), stim_df)
+    assert np.isnan(timeline.wheel_speed).all() and (timeline.trial == -1).all()
+
+    write_report(session)
+    timeline = align_session(SessionReader(session), stim_df)
+    # encoder samples at 10, 10.5 and 11 s and trials from 10 s and 11 s on the meso clock
+    assert timeline.wheel_speed[:3].tolist() == [0.0, 1.0, 2.0]
+    assert np.isnan(timeline.wheel_speed[3:]).all()
+    assert timeline.trial.tolist() == [0, 0, 1, 1, 1, 1, 1, 1, 1, 1]
+    explicit = align_session(SessionReader(session), stim_df, encoder_offset_s=0.0, stim_offset_s=0.0)
+    assert (explicit.trial == 1).all()
@@ -0,0 +1,46 @@
+import useq
+
+from pylab.engines.armed import ArmedSequenceMixin
+
+
+class FakeCore:
+    def __init__(self):
+        self.cleared = 0
+
+    def clearCircularBuffer(self):
+        self.cleared += 1
+
+
+class BaseEngine:
+    def __init__(self):
+        self._mmc = FakeCore()
+        self.setups = []
+
+    def setup_sequence(self, sequence):
+        self.setups.append(sequence)
+        return {"sequence": sequence}
+
+
+class Engine(ArmedSequenceMixin, BaseEngine):
+    pass
+
+
+def test_armed_sequence_is_not_set_up_again():
+    engine = Engine()
+    sequence = useq.MDASequence(time_plan={"interval": 0, "loops": 3})
+    meta = engine.arm(sequence)
+    assert engine.setups == [sequence] and engine._mmc.cleared == 1
+
+    assert engine.setup_sequence(sequence) is meta  # the runner's call
+    assert engine.setups == [sequence]
+    engine.setup_sequence(sequence)  # a later run is set up as usual
+    assert len(engine.setups) == 2
+
+
+def test_other_sequence_is_set_up():
+    engine = Engine()
+    armed = useq.MDASequence(time_plan={"interval": 0, "loops": 3})
+    other = useq.MDASequence(time_plan={"interval": 0, "loops": 5})
+    engine.arm(armed)
+    engine.setup_sequence(other)
+    assert engine.setups == [armed, other]
@@ -0,0 +1,58 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("matplotlib")
+
+from pylab.processing import batch
+
+
+@pytest.fixture
+def save_dir(tmp_path):
+    """Two sessions laid out like ExperimentConfig.bids_dir, one of them empty."""
+    bids_dir = tmp_path / "data" / "protocol" / "sub-001" / "ses-01"
+    (bids_dir / "func").mkdir(parents=True)
+    (bids_dir / "beh").mkdir()
+    (tmp_path / "data" / "protocol" / "sub-002" / "ses-01").mkdir(parents=True)
+
+    t_ms = np.arange(100) * 50.0
+    t_ms[60:] += 50.0  # one dropped frame
+    with open(bids_dir / "func" / "sub-001_ses-01_meso.ome.tiffmetadata.json", "w") as file:
+        json.dump({"p0": [{"runner_time_ms": t} for t in t_ms]}, file)
+    pd.DataFrame({"Clicks": [1, 2, 3], "Time": [0.0, 1.0, 2.0], "Speed": [0.1, 0.2, 0.3]}).to_csv(
+        bids_dir / "beh" / "001_ses-01_encoder-data.csv", index=False
+    )
+    pd.DataFrame({"thisRow.t": [0.5, 3.0], "stim_grating.started": [1.0, 3.5]}).to_csv(
+        bids_dir / "beh" / "001_ses-01_psychopy.csv", index=False
+    )
+    return tmp_path
+
+
+def test_discover_sessions(save_dir):
+    sessions = batch.discover_sessions(str(save_dir))
+    assert [os.path.relpath(s, save_dir) for s in sessions] == [
+        os.path.join("data", "protocol", "sub-001", "ses-01"),
+        os.path.join("data", "protocol", "sub-002", "ses-01"),
+    ]
+
+
+def test_process_session_and_skip(save_dir):
+    session, empty = batch.discover_sessions(str(save_dir))
+    assert batch.process_session(empty) == (empty, "skipped (no widefield recording)")
+    assert batch.process_session(session) == (session, "processed")
+
+    out_dir = os.path.join(session, batch.OUTPUT_DIR)
+    with open(os.path.join(out_dir, "timing.json")) as file:
+        timing = json.load(file)
+    assert timing["meso"]["dropped_frames"] == 1
+    assert timing["meso"]["fps"] == pytest.approx(20.0)
+    assert os.path.exists(os.path.join(out_dir, "wheel.png"))
+
+    assert batch.process_session(session) == (session, "up to date")
+    # touching an input invalidates the outputs
+    encoder = os.path.join(session, "beh", "001_ses-01_encoder-data.csv")
+    os.utime(encoder, ns=(0, 0))
+    assert not batch.is_up_to_date(session)
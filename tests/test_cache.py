@@ -0,0 +1,43 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from pylab.processing.cache import DiskCache, cached, get_cache
+
+calls = []
+
+
+@cached(inputs="path")
+def column_sum(path, column="a"):
+    calls.append(path)
+    return pd.read_csv(path)[column].to_numpy().sum()
+
+
+def test_cached_on_parameters_and_inputs(tmp_path):
+    path = tmp_path / "data.csv"
+    pd.DataFrame({"a": [1, 2], "b": [3, 4]}).to_csv(path, index=False)
+    calls.clear()
+
+    assert column_sum(str(path)) == 3
+    assert column_sum(str(path)) == 3
+    assert len(calls) == 1
+    assert column_sum(str(path), column="b") == 7
+    assert len(calls) == 2
+
+    # a modified input file is a new key
+    pd.DataFrame({"a": [5, 5], "b": [3, 4]}).to_csv(path, index=False)
+    assert column_sum(str(path)) == 10
+    assert len(calls) == 3
+    assert len(get_cache().entries()) == 3
+
+
+def test_lru_eviction(tmp_path):
+    cache = DiskCache(str(tmp_path / "cache"), max_bytes=10**9)
+    for key in "abc":
+        cache.put(key, np.zeros(1000))
+    os.utime(cache._path("b"), (0, 0))  # least recently used
+    assert cache.get("a")[0]
+    cache.evict(cache.size - 1)
+    assert not cache.get("b")[0]
+    assert cache.get("a")[0] and cache.get("c")[0]
@@ -0,0 +1,64 @@
+import os
+
+import pytest
+
+from pylab.io.catalog import SessionCatalog, parse_bids_path, register_file, update_file
+
+
+@pytest.fixture
+def save_dir(tmp_path):
+    return tmp_path / "data"
+
+
+def bids_file(save_dir, subject, session, kind, name):
+    path = save_dir / "protocol" / f"sub-{subject}" / f"ses-{session}" / kind / name
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.touch()
+    return str(path)
+
+
+def test_parse_bids_path(save_dir):
+    path = bids_file(save_dir, "001", "01", "func", "protocol-sub-001_ses-01_task-wf_meso_led-4.ome.tiff")
+    parsed = parse_bids_path(path)
+    assert parsed["save_dir"] == str(save_dir)
+    assert (parsed["protocol"], parsed["subject"], parsed["session"]) == ("protocol", "001", "01")
+    assert (parsed["task"], parsed["modality"], parsed["channel"]) == ("wf", "meso", "4")
+    assert parse_bids_path(str(save_dir / "somewhere" / "file.csv")) is None
+
+
+def test_register_and_query(save_dir):
+    meso = bids_file(save_dir, "001", "01", "func", "protocol-sub-001_ses-01_task-wf_meso.ome.tiff")
+    led = bids_file(save_dir, "001", "01", "func", "protocol-sub-001_ses-01_task-wf_meso_led-2.ome.tiff")
+    encoder = bids_file(save_dir, "002", "01", "beh", "002_ses-01_encoder-data.csv")
+    for path in (meso, led, encoder):
+        register_file(path)
+    update_file(meso, frames=100, duration_s=5.0)
+    register_file(str(save_dir / "not-bids.csv"))  # ignored
+
+    catalog = SessionCatalog(str(save_dir))
+    assert os.path.exists(catalog.path)
+    rows = catalog.files(subject="001", modality="meso")
+    assert [r["path"] for r in rows] == [meso, led]
+    assert (rows[0]["frames"], rows[0]["duration_s"]) == (100, 5.0)
+
+    bids_dir = os.path.dirname(os.path.dirname(meso))
+    assert catalog.find(bids_dir, "meso") == meso
+    assert catalog.find(bids_dir, "meso", channel=2) == led
+    assert catalog.find(bids_dir, "pupil") is None
+    assert [(s["subject"], s["files"]) for s in catalog.sessions()] == [("001", 2), ("002", 1)]
+    with pytest.raises(ValueError):
+        catalog.files(colour="red")
+
+
+def test_lookups_never_create_the_catalog(save_dir):
+    meso = bids_file(save_dir, "001", "01", "func", "protocol-sub-001_ses-01_task-wf_meso.ome.tiff")
+    bids_dir = os.path.dirname(os.path.dirname(meso))
+    assert SessionCatalog.for_path(bids_dir) is None
+    assert SessionCatalog(str(save_dir)).files() == []
+    update_file(meso, frames=10)
+    assert not os.path.exists(save_dir / "catalog.sqlite")
+
+    register_file(meso)
+    catalog = SessionCatalog.for_path(bids_dir)
+    assert catalog is SessionCatalog.for_path(meso)  # one instance per save dir
+    assert catalog.find(bids_dir, "meso") == meso
@@ -0,0 +1,65 @@
+import json
+
+import numpy as np
+import pytest
+import tifffile
+
+from pylab.processing import event_average
+from pylab.processing.event_average import EventAverager
+
+N_FRAMES = 200
+DT_MS = 100.0
+
+
+@pytest.fixture
+def session(tmp_path):
+    """Baseline of 100 counts with a 50% response in the left half 0-1 s after each onset."""
+    bids_dir = tmp_path / "ses-01"
+    (bids_dir / "func").mkdir(parents=True)
+    t_ms = np.arange(N_FRAMES) * DT_MS
+    frames = np.full((N_FRAMES, 16, 16), 100, dtype=np.uint16)
+    for onset in (3000, 8000, 13000):
+        frames[(t_ms >= onset) & (t_ms < onset + 1000), :, :8] = 150
+
+    meso = bids_dir / "func" / "sub-001_ses-01_meso.ome.tiff"
+    tifffile.imwrite(meso, frames, ome=True, metadata={"axes": "TYX"})
+    with open(f"{meso}metadata.json", "w") as file:
+        json.dump({"p0": [{"runner_time_ms": t} for t in t_ms]}, file)
+    return bids_dir
+
+
+def test_windows_drop_out_of_range_trials(session):
+    averager = EventAverager(session, pre_s=1, post_s=2, workers=1, stim_offset_s=0.0)
+    _, rows, onsets, n_pre, dt_s = averager.window_rows([0.5, 3.0, 8.0, 19.5])
+    assert onsets.tolist() == [30, 80]
+    assert rows.shape == (2, 30) and n_pre == 10 and dt_s == pytest.approx(0.1)
+    assert rows[0, n_pre] == 30
+
+
+def test_onsets_are_moved_onto_the_meso_clock(session):
+    with pytest.raises(ValueError, match="stim_offset_s"):
+        EventAverager(session).window_rows([3.0])
+
+    # PsychoPy started 2 s into the meso recording
+    report = {"streams": {"meso": {"first_sample_ms": 500.0}}, "events": {"psychopy": 2500.0}}
+    (session / "sub-001_ses-01_streams.json").write_text(json.dumps(report))
+    _, _, onsets, _, _ = EventAverager(session, pre_s=1, post_s=2).window_rows([1.0, 6.0])
+    assert onsets.tolist() == [30, 80]
+    _, _, onsets, _, _ = EventAverager(session, pre_s=1, post_s=2, stim_offset_s=0.0).window_rows([3.0])
+    assert onsets.tolist() == [30]
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_trial_average_dff(session, monkeypatch, workers):
+    # force several bands so the process pool path is exercised
+    monkeypatch.setattr(event_average, "BAND_BYTES", 3 * 30 * 16 * 4 * 4)
+    averager = EventAverager(session, pre_s=1, post_s=2, workers=workers, stim_offset_s=0.0)
+    result = averager.compute([3.0, 8.0, 13.0], per_trial=True)
+
+    assert result.mean.shape == (30, 16, 16)
+    assert result.times_s[10] == pytest.approx(0.0)
+    np.testing.assert_allclose(result.mean[10:20, :, :8], 0.5)
+    np.testing.assert_allclose(result.mean[:10], 0.0)
+    np.testing.assert_allclose(result.mean[:, :, 8:], 0.0)
+    assert result.per_trial.shape == (3, 30, 16, 16)
+    np.testing.assert_allclose(result.per_trial.mean(axis=0), result.mean)
@@ -0,0 +1,42 @@
+import threading
+
+import pytest
+
+from pylab.finalize import FinalizationPipeline
+
+
+def test_tasks_overlap_and_report_progress():
+    pipeline = FinalizationPipeline(workers=2)
+    both_running = threading.Barrier(2, timeout=5)
+    progress = []
+    pipeline.progress.connect(lambda name, done, total: progress.append((name, done, total)))
+
+    first = pipeline.submit("meso", lambda: (both_running.wait(), "meso")[1])
+    second = pipeline.submit("pupil", lambda: (both_running.wait(), "pupil")[1])
+    pipeline.completion().result(timeout=5)
+    assert (first.result(), second.result()) == ("meso", "pupil")
+    assert {name for name, _, _ in progress} == {"meso", "pupil"}
+    assert sorted((done, total) for _, done, total in progress) == [(1, 2), (2, 2)]
+    assert pipeline.pending == []
+    pipeline.shutdown()
+
+
+def test_completion_raises_the_first_error():
+    pipeline = FinalizationPipeline(workers=1)
+    release = threading.Event()
+
+    def fail():
+        release.wait(5)
+        raise OSError("disk full")
+
+    pipeline.submit("encoder", fail)
+    pipeline.submit("metadata", lambda: None)
+    completion = pipeline.completion()
+    assert not pipeline.wait(timeout=0.05)
+    release.set()
+    with pytest.raises(OSError, match="disk full"):
+        completion.result(timeout=5)
+    assert pipeline.errors[0][0] == "encoder"
+    assert pipeline.wait(timeout=5)
+    assert pipeline.completion().result() == []  # nothing pending any more
+    pipeline.shutdown()
@@ -0,0 +1,81 @@
+import logging
+import threading
+from types import SimpleNamespace
+
+from psygnal import Signal, SignalGroup
+
+from pylab import logs
+from pylab.finalize import finalizer
+from pylab.headless import HeadlessRunner, ThroughputMonitor
+
+
+class _Events(SignalGroup):
+    frameReady = Signal(object, object, object)
+
+
+class FakeCore:
+    def __init__(self):
+        self.mda = SimpleNamespace(events=_Events())
+        self.remaining = 0
+
+    def getRemainingImageCount(self):
+        return self.remaining
+
+
+def test_monitor_reports_rate_progress_and_backlog():
+    ticks = iter([0.0, 2.0, 4.0])
+    monitor = ThroughputMonitor(clock=lambda: next(ticks))
+    core = FakeCore()
+    monitor.add_core("meso", core, expected=100)
+    encoder_sample = monitor.counter("encoder")
+    monitor.start()
+
+    for _ in range(20):
+        core.mda.events.frameReady.emit(None, None, None)
+    encoder_sample(5)
+    core.remaining = 3
+
+    meso, encoder = monitor.stats()
+    assert (meso.frames, meso.expected, meso.fps, meso.backlog) == (20, 100, 10.0, 3)
+    assert (encoder.frames, encoder.backlog) == (1, None)
+    assert str(meso) == "meso   10.0 fps (20/100) buffer 3"
+
+    # rates are per interval
+    core.mda.events.frameReady.emit(None, None, None)
+    meso, _ = monitor.stats()
+    assert meso.frames == 21 and meso.fps == 0.5
+
+
+def test_session_log_closed_after_its_finalization(tmp_path):
+    logs.shutdown_logging()
+    logs.setup_logging(None, level=logging.DEBUG)
+    session_log = logs.start_session_log(str(tmp_path / "log.txt"))
+    release = threading.Event()
+    finalizer.submit("slow metadata", release.wait)
+
+    ended = HeadlessRunner(config=None)._end_session(session_log, str(tmp_path / "profile"))
+    logging.getLogger("pylab.test").info("still finalizing")
+    assert not ended.done() and logs._session_handler is session_log
+
+    release.set()
+    ended.result(timeout=5)
+    assert logs._session_handler is None
+    logs.shutdown_logging()
+    assert "still finalizing" in (tmp_path / "log.txt").read_text()
+
+
+def test_failed_build_leaves_the_current_session_log(tmp_path):
+    logs.shutdown_logging()
+    logs.setup_logging(None, level=logging.DEBUG)
+    session_log = logs.start_session_log(str(tmp_path / "log.txt"))
+
+    def no_paths():
+        raise FileExistsError("run reserved")
+
+    runner = HeadlessRunner(config=SimpleNamespace(allocate_session_paths=no_paths))
+    try:
+        runner.run()
+    except FileExistsError:
+        pass
+    assert logs._session_handler is session_log
+    logs.shutdown_logging()
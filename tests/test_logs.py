@@ -0,0 +1,68 @@
+import logging
+import queue
+
+import pytest
+
+from pylab import logs
+
+
+@pytest.fixture
+def queued_logging(tmp_path):
+    logs.shutdown_logging()
+    app_log = tmp_path / "engine.log"
+    logs.setup_logging(str(app_log), level=logging.DEBUG)
+    yield app_log
+    logs.shutdown_logging()
+
+
+def test_session_log_gets_records_until_stopped(queued_logging, tmp_path):
+    session_log = tmp_path / "session_log.txt"
+    logger = logging.getLogger("pylab.test")
+
+    logger.info("before %d", 1)
+    logs.start_session_log(str(session_log))
+    logger.info("during %d", 2)
+    logs.stop_session_log()
+    logger.info("after %d", 3)
+    logs.shutdown_logging()
+
+    session = session_log.read_text()
+    assert "during 2" in session
+    assert "before 1" not in session and "after 3" not in session
+    app = queued_logging.read_text()
+    assert all(f"{word} {i}" in app for i, word in enumerate(("before", "during", "after"), 1))
+
+
+def test_stopping_an_earlier_session_keeps_the_current_log(queued_logging, tmp_path):
+    logger = logging.getLogger("pylab.test")
+    first = logs.start_session_log(str(tmp_path / "run-0.txt"))
+    logs.start_session_log(str(tmp_path / "run-1.txt"))  # queued next session
+    logs.stop_session_log(first)  # the first session's finalization ends
+    logger.info("still recording")
+    logs.shutdown_logging()
+
+    assert "still recording" in (tmp_path / "run-1.txt").read_text()
+    assert "still recording" not in (tmp_path / "run-0.txt").read_text()
+
+
+def test_records_are_queued_unformatted():
+    records = queue.SimpleQueue()
+    handler = logs._DeferredQueueHandler(records)
+    args = (object(),)
+    handler.handle(logging.makeLogRecord({"msg": "value %s", "args": args}))
+
+    record = records.get_nowait()
+    assert record.msg == "value %s" and record.args is args
+
+
+def test_rate_limited_log_suppresses_and_counts(caplog):
+    logger = logging.getLogger("pylab.test.rate")
+    limited = logs.RateLimitedLog(logger, interval=3600)
+    with caplog.at_level(logging.DEBUG, logger="pylab.test.rate"):
+        for i in range(5):
+            limited.debug("drained %d", i)
+        limited._next.clear()
+        limited.debug("drained %d", 5)
+
+    messages = [r.getMessage() for r in caplog.records]
+    assert messages == ["drained 0", "drained 5 (+4 suppressed)"]
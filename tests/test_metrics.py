@@ -0,0 +1,65 @@
+import pytest
+
+from pylab.engines.instrumented import FrameTimingMixin
+from pylab.metrics import LatencyHistogram, Metrics, metrics
+
+
+def test_histogram_percentiles_within_bucket_resolution():
+    hist = LatencyHistogram("stage")
+    n_buckets = len(hist.counts)
+    for ms in range(1, 101):
+        hist.record(ms / 1000)
+
+    assert len(hist.counts) == n_buckets  # fixed size, no per-record growth
+    assert hist.count == 100
+    assert hist.max == pytest.approx(0.1)
+    assert hist.percentile(50) == pytest.approx(0.050, rel=0.2)
+    assert hist.percentile(99) == pytest.approx(0.099, rel=0.2)
+    assert hist.percentile(100) == pytest.approx(0.1)
+
+
+def test_histogram_clamps_out_of_range_durations():
+    hist = LatencyHistogram("stage")
+    hist.record(0.0)
+    hist.record(1e6)
+    assert hist.counts[0] == 1 and hist.counts[-1] == 1
+    assert LatencyHistogram("empty").summary()["p50_ms"] is None
+
+
+def test_registry_only_records_when_enabled(tmp_path):
+    registry = Metrics()
+    registry.record("meso.pop", 0.001)
+    assert "meso.pop" not in registry.summary()
+
+    path = tmp_path / "metrics.txt"
+    registry.enable(str(path), interval=0.01)
+    registry.record("meso.pop", 0.001)
+    registry.disable()
+
+    assert registry.summary()["meso.pop"]["count"] == 1
+    text = path.read_text()
+    assert "meso.pop" in text and "p99_ms" in text
+
+
+class _Engine:
+    def get_frame_metadata(self, *args, **kwargs):
+        return {}
+
+    def _next_seqimg_payload(self, *args, **kwargs):
+        return ("img", "event", self.get_frame_metadata())
+
+
+class _TimedEngine(FrameTimingMixin, _Engine):
+    metrics_name = "test"
+
+
+def test_engine_mixin_times_pop_metadata_and_emit(monkeypatch):
+    monkeypatch.setattr(metrics, "enabled", True)
+    engine = _TimedEngine()
+    for _ in range(3):
+        assert engine._payload() == ("img", "event", {})
+        engine._resumed()
+
+    summary = metrics.summary()
+    for stage in ("pop", "metadata", "emit"):
+        assert summary[f"test.{stage}"]["count"] == 3
@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+matplotlib = pytest.importorskip("matplotlib")
+matplotlib.use("Agg")
+
+from pylab.processing import plot
+
+
+def test_minmax_downsample_keeps_extremes():
+    y = np.zeros(1000)
+    y[123], y[777] = 5.0, -3.0
+    x, ds = plot.minmax_downsample(np.arange(1000), y, 100)
+    assert len(ds) == 20
+    assert ds.max() == 5.0 and ds.min() == -3.0
+
+
+def test_lttb_downsample():
+    x = np.linspace(0, 10, 5000)
+    xs, ys = plot.lttb_downsample(x, np.sin(x), 100)
+    assert len(xs) == 100
+    assert xs[0] == 0 and xs[-1] == 10
+    assert np.all(np.diff(xs) > 0)
+
+
+def test_downsampled_line_redraws_on_zoom():
+    fig, ax = matplotlib.pyplot.subplots()
+    x = np.arange(1_000_000) / 50.0
+    line = plot.plot_downsampled(ax, x, np.random.default_rng(0).normal(size=x.size))
+    n_full = len(line.get_xdata())
+    assert n_full < 4 * fig.bbox.width
+    ax.set_xlim(100, 101)  # 50 raw samples
+    assert len(line.get_xdata()) <= 60
+    matplotlib.pyplot.close(fig)
+
+
+def test_stim_markers_one_collection_per_class():
+    fig, ax = matplotlib.pyplot.subplots()
+    stim_df = pd.DataFrame({
+        "stim_grayScreen.started": np.arange(300.0),
+        "stim_grating.started": np.r_[np.arange(299.0) + 0.5, np.nan],
+    })
+    collections = plot.plot_stim_markers(ax, stim_df)
+    assert len(collections) == 2
+    assert len(ax.collections) == 2
+    assert len(collections[1].get_segments()) == 299
+    matplotlib.pyplot.close(fig)
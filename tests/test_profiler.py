@@ -0,0 +1,46 @@
+import threading
+import time
+
+from pylab.profiler import SessionProfiler, session_directory
+
+
+def spin(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_session_writes_folded_stacks_per_thread_and_memory_summary(tmp_path):
+    profiler = SessionProfiler(interval=0.001)
+    stop = threading.Event()
+    worker = threading.Thread(target=spin, args=(stop,), name="busy worker")
+    worker.start()
+    try:
+        profiler.enable()
+        directory = session_directory(str(tmp_path), 1)
+        profiler.begin_session(directory)
+        profiler.phase("recording")
+        blocks = [bytearray(1000) for _ in range(1000)]
+        time.sleep(0.2)
+        assert profiler.end_session() == directory
+    finally:
+        stop.set()
+        worker.join()
+        profiler.disable()
+
+    folded = (tmp_path / "profile" / "run-1" / "busy_worker.folded").read_text()
+    counts = [int(line.rsplit(" ", 1)[1]) for line in folded.splitlines()]
+    assert counts and min(counts) > 0
+    assert "spin (test_profiler.py:" in folded
+
+    memory = (tmp_path / "profile" / "run-1" / "memory.txt").read_text()
+    assert "== setup:" in memory and "== recording:" in memory
+    assert "test_profiler.py" in memory
+    assert len(blocks) == 1000
+
+
+def test_disabled_profiler_ignores_sessions(tmp_path):
+    profiler = SessionProfiler()
+    profiler.begin_session(str(tmp_path / "profile"))
+    profiler.phase("recording")
+    assert profiler.end_session() is None
+    assert not (tmp_path / "profile").exists()
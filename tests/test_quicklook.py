@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+import tifffile
+import useq
+
+from pylab.io.quicklook import QuicklookWriter
+
+
+@pytest.fixture
+def frames():
+    rng = np.random.default_rng(0)
+    return rng.integers(0, 4000, (38, 16, 24)).astype(np.uint16)
+
+
+def run_quicklook(writer, frames, drop=()):
+    sequence = useq.MDASequence(time_plan={"interval": 0, "loops": len(frames)})
+    writer.sequenceStarted(sequence, {})
+    for frame, event in zip(frames, sequence):
+        if event.index["t"] not in drop:
+            writer.frameReady(frame, event, {})
+    writer.sequenceFinished(sequence)
+    writer.finalized.result()
+
+
+def expected_quicklook(writer, kept):
+    """Bin 4x4 (integer mean) and scale to uint8 with the clims of the first kept frame."""
+    kept = kept.astype(np.uint32)
+    binned = (kept.reshape(len(kept), 4, 4, 6, 4).sum(axis=(2, 4)) + 8) // 16
+    low, high = np.percentile(binned[0], writer.percentiles)
+    return np.clip((binned - low) * (255.0 / (high - low)), 0, 255).astype(np.uint8)
+
+
+def test_quicklook_bins_and_decimates(tmp_path, frames):
+    writer = QuicklookWriter(str(tmp_path / "test_meso.ome.tiff"), binning=4, decimate=4)
+    run_quicklook(writer, frames)
+
+    assert writer.filename == str(tmp_path / "test_meso_quicklook.ome.tiff")
+    assert writer.skipped == 0
+    with tifffile.TiffFile(writer.filename) as tif:
+        data = tif.asarray()
+        ome = tifffile.xml2dict(tif.ome_metadata)
+    assert data.shape == (10, 4, 6)  # frames 0, 4, ..., 36 binned 4x4
+    assert data.dtype == np.uint8
+    assert ome["OME"]["Image"]["Pixels"]["SizeT"] == 10
+    np.testing.assert_array_equal(data, expected_quicklook(writer, frames[::4]))
+
+
+def test_quicklook_keeps_led_phase_after_dropped_frame(tmp_path, frames):
+    writer = QuicklookWriter(str(tmp_path / "test_meso.ome.tiff"), binning=4, decimate=4)
+    run_quicklook(writer, frames, drop={5})
+
+    data = tifffile.imread(writer.filename)
+    # still t = 0, 4, 8, ...: the gap doesn't shift the kept frames to another LED
+    np.testing.assert_array_equal(data, expected_quicklook(writer, frames[::4]))
@@ -0,0 +1,119 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+import tifffile
+import useq
+
+from pylab.io.reader import SessionReader
+from pylab.io.writer import CustomWriter
+from pylab.processing.event_average import EventAverager
+
+N_FRAMES = 40
+PATTERN = ["4", "4", "2", "2"]
+
+
+@pytest.fixture
+def session(tmp_path):
+    """A fake session directory laid out like ExperimentConfig.bids_dir."""
+    bids_dir = tmp_path / "protocol" / "sub-001" / "ses-01"
+    (bids_dir / "func").mkdir(parents=True)
+    (bids_dir / "beh").mkdir()
+    stem = "protocol-sub-001_ses-01_task-test"
+
+    frames = np.arange(N_FRAMES, dtype=np.uint16)[:, None, None] * np.ones((1, 16, 16), np.uint16)
+    meso = bids_dir / "func" / f"{stem}_meso.ome.tiff"
+    tifffile.imwrite(meso, frames, ome=True, metadata={"axes": "TYX"})
+    frame_md = [
+        {"runner_time_ms": 50.0 * i, "camera_metadata": {"TimeReceivedByCore": f"2024-01-01 12:00:{i:02d}.000000"}}
+        for i in range(N_FRAMES)
+    ]
+    with open(f"{meso}metadata.json", "w") as file:
+        json.dump({"p0": frame_md}, file)
+
+    pd.DataFrame({"Clicks": [1, 2], "Time": [0.0, 0.02], "Speed": [0.1, 0.2]}).to_csv(
+        bids_dir / "beh" / "001_ses-01_encoder-data.csv", index=False
+    )
+    pd.DataFrame({"Parameter": ["trial_duration", "led_pattern"], "Value": [1, str(PATTERN)]}).to_csv(
+        bids_dir / "001_ses-01_configuration.csv", index=False
+    )
+    return bids_dir
+
+
+def test_images_are_memmapped(session):
+    with SessionReader(session) as reader:
+        stack = reader.images()
+        assert isinstance(stack, np.memmap)
+        assert stack.shape == (N_FRAMES, 16, 16)
+        assert reader.images() is stack  # cached handle
+
+
+def test_iter_chunks(session):
+    reader = SessionReader(session)
+    chunks = list(reader.iter_chunks(chunk_size=16))
+    assert [frames for frames, _ in chunks] == [slice(0, 16), slice(16, 32), slice(32, 40)]
+    assert chunks[-1][1][:, 0, 0].tolist() == list(range(32, 40))
+
+
+def test_interleaved_channel_view(session):
+    reader = SessionReader(session)
+    led2 = reader.images(channel="2")
+    assert len(led2) == N_FRAMES // 2
+    assert led2[:4, 0, 0].tolist() == [2, 3, 6, 7]
+    first = next(reader.iter_chunks(channel="4", chunk_size=4))[1]
+    assert first[:, 0, 0].tolist() == [0, 1, 4, 5]
+
+
+def test_trial_view_and_metadata(session):
+    reader = SessionReader(session)
+    md = reader.frame_metadata()
+    assert md["runner_time_ms"].dtype == np.float64
+    assert md["time_received"].dtype.kind == "M"
+    # 1 s trials at 50 ms/frame -> 20 frames per trial
+    assert reader.trial_frames(1) == slice(20, 40)
+    assert np.asarray(reader.trial(1, channel="2"))[:, 0, 0].tolist()[:2] == [22, 23]
+    assert len(reader.encoder()) == 2
+
+
+def test_task_selects_recording(session):
+    other = session / "func" / "protocol-sub-001_ses-01_task-other_meso.ome.tiff"
+    tifffile.imwrite(other, np.zeros((3, 16, 16), np.uint16), ome=True, metadata={"axes": "TYX"})
+    with open(f"{other}metadata.json", "w") as file:
+        json.dump({"p0": []}, file)
+
+    with pytest.raises(ValueError, match="task="):
+        SessionReader(session).recording_path()
+    assert SessionReader(session, task="other").images().shape == (3, 16, 16)
+    assert SessionReader(session, task="test").images().shape == (N_FRAMES, 16, 16)
+    with pytest.raises(FileNotFoundError):
+        SessionReader(session, task="missing").recording_path()
+
+
+def test_dropped_frame_rows_follow_t_index(tmp_path):
+    """A dropped frame leaves a blank page, so stack rows are T indices, not list positions."""
+    bids_dir = tmp_path / "ses-01"
+    (bids_dir / "func").mkdir(parents=True)
+    pd.DataFrame({"Parameter": ["trial_duration", "led_pattern"], "Value": [0.1, str(["4", "2"])]}).to_csv(
+        bids_dir / "001_ses-01_configuration.csv", index=False
+    )
+    writer = CustomWriter(str(bids_dir / "func" / "sub-001_ses-01_task-test_meso.ome.tiff"), preallocate=False)
+    sequence = useq.MDASequence(time_plan={"interval": 0, "loops": 20})
+    writer.sequenceStarted(sequence, {})
+    for event in sequence:
+        t = event.index["t"]
+        if t != 3:
+            writer.frameReady(np.full((16, 16), t + 1, np.uint16), event, {"runner_time_ms": 10.0 * t})
+    writer.sequenceFinished(sequence)
+    writer.finalized.result()
+
+    reader = SessionReader(bids_dir)
+    assert reader.frame_metadata()["t_index"].tolist() == [t for t in range(20) if t != 3]
+    assert np.asarray(reader.images(channel="2"))[:, 0, 0].tolist() == [2, 6, 8, 10, 12, 14, 16, 18, 20]
+    # 100 ms trials of 10 ms frames: trial 0 is t = 0..9
+    assert np.asarray(reader.trial(0))[:, 0, 0].tolist() == [1, 2, 3, 5, 6, 7, 8, 9, 10]
+    assert np.asarray(reader.trial(0, channel="2"))[:, 0, 0].tolist() == [2, 6, 8, 10]
+    assert np.asarray(reader.trial(1))[:, 0, 0].tolist() == list(range(11, 21))
+    _, t_ms, rows = EventAverager(bids_dir, channel="2")._frames()
+    assert rows.tolist() == [1, 5, 7, 9, 11, 13, 15, 17, 19]
+    assert t_ms.tolist() == [10.0 * t for t in rows]
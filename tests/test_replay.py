@@ -0,0 +1,153 @@
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+import useq
+from pymmcore_plus import CMMCorePlus, find_micromanager
+from pymmcore_plus.mda import MDAEngine
+
+from pylab.engines.replayengine import ReplayEngine, ReplaySchedule
+from pylab.io.writer import CustomWriter
+
+N_FRAMES = 12
+
+
+@pytest.fixture
+def frames():
+    return np.arange(N_FRAMES, dtype=np.uint16)[:, None, None] * np.ones((1, 16, 16), np.uint16)
+
+
+def record_session(bids_dir, frames, led_pattern=None, drop=()):
+    """Write a meso recording with CustomWriter, 10 ms apart, like a real session."""
+    (bids_dir / "func").mkdir(parents=True)
+    writer = CustomWriter(
+        str(bids_dir / "func" / "protocol-sub-001_ses-01_task-test_meso.ome.tiff"), led_pattern=led_pattern
+    )
+    sequence = useq.MDASequence(time_plan={"interval": 0, "loops": len(frames)})
+    writer.sequenceStarted(sequence, {})
+    for frame, event in zip(frames, sequence):
+        if event.index["t"] not in drop:
+            writer.frameReady(frame, event, {"runner_time_ms": 10.0 * event.index["t"]})
+    writer.sequenceFinished(sequence)
+    writer.finalized.result()
+    return bids_dir
+
+
+def replay(engine, n_events):
+    """Drive the engine the way the MDA runner does; returns (frame value, t, metadata)."""
+    sequence = useq.MDASequence(time_plan={"interval": 0, "loops": n_events})
+    engine.setup_sequence(sequence)
+    emitted = []
+    for event in sequence:
+        for img, ev, meta in engine.exec_event(event):
+            emitted.append((int(img[0, 0]), ev.index["t"], meta))
+    engine.teardown_sequence(sequence)
+    return emitted
+
+
+def test_due_follows_recorded_timing():
+    schedule = ReplaySchedule(np.array([1000.0, 1050.0, 1100.0, 1150.0]))
+    assert [schedule.due(i) for i in range(4)] == pytest.approx([0.0, 0.05, 0.1, 0.15])
+
+
+def test_speed_scales_timing():
+    schedule = ReplaySchedule(np.array([0.0, 100.0, 200.0]), speed=4.0)
+    assert schedule.due(2) == pytest.approx(0.05)
+
+
+def test_cycles_past_the_end_of_the_recording():
+    schedule = ReplaySchedule(np.array([0.0, 100.0, 200.0]))
+    assert schedule.cycle_s == pytest.approx(0.3)
+    assert schedule.due(3) == pytest.approx(0.3)
+    assert schedule.due(5) == pytest.approx(0.5)
+
+
+def test_backlog_counts_frames_already_due():
+    schedule = ReplaySchedule(np.array([0.0, 100.0, 200.0, 300.0]))
+    assert schedule.backlog(0, 0.0) == 0
+    assert schedule.backlog(0, 0.25) == 2
+    assert schedule.backlog(3, 0.25) == 0
+
+
+def test_max_speed_and_missing_timestamps():
+    schedule = ReplaySchedule(np.array([0.0, np.nan, 200.0]), speed=0)
+    assert schedule.due(2) == 0.0
+    assert schedule.backlog(0, 10.0) == 0
+    assert ReplaySchedule(np.array([0.0, np.nan, 200.0])).due(1) == pytest.approx(0.1)
+    with pytest.raises(ValueError):
+        ReplaySchedule(np.array([np.nan, np.nan]))
+
+
+@pytest.fixture
+def no_core_metadata(monkeypatch):
+    """Replay without a camera: the core's summary and frame metadata are left out."""
+    monkeypatch.setattr(MDAEngine, "setup_sequence", lambda self, sequence: {})
+    monkeypatch.setattr(
+        MDAEngine, "get_frame_metadata", lambda self, event, runner_time_ms=0.0, **kwargs: {"runner_time_ms": runner_time_ms}
+    )
+
+
+@pytest.mark.parametrize("led_pattern", [None, ["4", "2"]])
+def test_replay_emits_recorded_frames(tmp_path, frames, no_core_metadata, led_pattern):
+    session = record_session(tmp_path / "ses-01", frames, led_pattern)
+    engine = ReplayEngine(CMMCorePlus(), use_hardware_sequencing=False, session=str(session), speed=0)
+
+    emitted = replay(engine, N_FRAMES + 3)  # past the end, the recording loops
+    assert [value for value, _, _ in emitted] == [*range(N_FRAMES), 0, 1, 2]
+    assert [t for _, t, _ in emitted] == list(range(N_FRAMES + 3))
+    assert [meta["replay_frame"] for _, _, meta in emitted] == [*range(N_FRAMES), 0, 1, 2]
+    assert all(meta["hardware_triggered"] and meta["images_remaining_in_buffer"] == 0 for _, _, meta in emitted)
+    assert engine._reader is None  # closed by teardown_sequence
+
+
+@pytest.mark.parametrize("led_pattern", [None, ["4", "2"]])
+def test_replay_skips_dropped_frames(tmp_path, frames, no_core_metadata, led_pattern):
+    session = record_session(tmp_path / "ses-01", frames, led_pattern, drop={3})
+    engine = ReplayEngine(CMMCorePlus(), use_hardware_sequencing=False, session=str(session), speed=0)
+
+    emitted = replay(engine, N_FRAMES - 1)
+    assert [value for value, _, _ in emitted] == [t for t in range(N_FRAMES) if t != 3]
+
+
+def test_replay_follows_recorded_timing(tmp_path, frames, no_core_metadata):
+    session = record_session(tmp_path / "ses-01", frames)
+    engine = ReplayEngine(CMMCorePlus(), use_hardware_sequencing=False, session=str(session), speed=2.0)
+
+    t0 = time.perf_counter()
+    emitted = replay(engine, N_FRAMES)
+    # 11 intervals of 10 ms at 2x speed
+    assert time.perf_counter() - t0 >= 0.055
+    times = [meta["runner_time_ms"] for _, _, meta in emitted]
+    assert times == sorted(times) and times[-1] >= 55
+
+
+@pytest.mark.skipif(not find_micromanager(), reason="needs the Micro-Manager demo adapters")
+def test_replay_through_mda_runner(tmp_path, frames):
+    session = record_session(tmp_path / "ses-01", frames, ["4", "2"])
+    mmc = CMMCorePlus()
+    mmc.loadSystemConfiguration()
+    mmc.mda.set_engine(ReplayEngine(mmc, session=str(session), speed=0))
+
+    received = []
+    mmc.mda.events.frameReady.connect(lambda img, event, meta: received.append((int(img[0, 0]), meta)))
+    mmc.run_mda(useq.MDASequence(time_plan={"interval": 0, "loops": N_FRAMES})).join()
+    assert [value for value, _ in received] == list(range(N_FRAMES))
+    assert [meta["replay_frame"] for _, meta in received] == list(range(N_FRAMES))
+
+
+def test_encoder_replay(tmp_path):
+    pytest.importorskip("PyQt6")
+    from pylab.io import SerialWorker
+
+    recorded = pd.DataFrame({"Clicks": [3, -1, 4, 1, 5], "Time": [0.0, 0.01, 0.02, 0.03, 0.04]})
+    worker = SerialWorker(sample_interval=10, wheel_diameter=100, cpr=100)
+    worker.load_replay(recorded, speed=0)
+    worker.start()
+    deadline = time.monotonic() + 5
+    while len(worker.clicks) < len(recorded) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    worker.stop()
+
+    assert worker.clicks == recorded["Clicks"].tolist()
+    assert worker.get_data()["Clicks"].tolist() == recorded["Clicks"].tolist()
@@ -0,0 +1,76 @@
+import threading
+from dataclasses import dataclass
+
+import pytest
+
+from pylab.sessionqueue import SessionQueue, validate_led_pattern
+
+
+@dataclass
+class Prepared:
+    experiment: str
+
+
+class FakeConfig:
+    """The `prepare_session` / `use_prepared` / `discard_prepared` side of ExperimentConfig."""
+
+    def __init__(self, invalid=()):
+        self.invalid = set(invalid)
+        self.prepared_in = []
+        self.used = []
+        self.discarded = []
+        self.recording = threading.Event()
+
+    def prepare_session(self, experiment, led_states=None, led_max_length=None):
+        self.prepared_in.append((experiment, self.recording.is_set()))
+        if experiment in self.invalid:
+            raise ValueError(f"{experiment}: led_pattern state 'x' is not an integer")
+        return Prepared(experiment)
+
+    def use_prepared(self, prepared):
+        self.used.append(prepared.experiment)
+
+    def discard_prepared(self, prepared=None):
+        if prepared is not None:
+            self.discarded.append(prepared.experiment)
+
+
+def test_next_session_is_prepared_while_one_records():
+    config = FakeConfig()
+    queue = SessionQueue(config, ["a.json", "b.json", "c.json"])
+    for prepared in queue:
+        config.recording.set()
+        if queue._next is not None:
+            queue._next.result()  # the next session is prepared during this "recording"
+        config.recording.clear()
+    assert config.used == ["a.json", "b.json", "c.json"]
+    assert config.prepared_in == [("a.json", False), ("b.json", True), ("c.json", True)]
+    assert queue.remaining == 0
+    queue.close()
+
+
+def test_invalid_session_stops_the_queue():
+    config = FakeConfig(invalid={"b.json"})
+    queue = SessionQueue(config, ["a.json", "b.json"])
+    assert queue.next().experiment == "a.json"
+    with pytest.raises(ValueError, match="b.json"):
+        queue.next()
+    queue.close()
+    assert queue.next() is None
+
+
+def test_close_discards_the_session_prepared_ahead():
+    config = FakeConfig()
+    queue = SessionQueue(config, ["a.json", "b.json"])
+    queue.next()
+    queue._next.result()  # b.json has reserved its files
+    queue.close()
+    assert config.discarded == ["b.json"]
+
+
+def test_validate_led_pattern():
+    assert validate_led_pattern(["4", "4", "2", "2"], allowed=["0", "2", "4"], max_length=8) == []
+    assert validate_led_pattern("['4', '2']") == []
+    assert validate_led_pattern([]) != []
+    errors = validate_led_pattern(["4", "x", "16"], allowed=["2", "4"], max_length=2)
+    assert len(errors) == 3
@@ -0,0 +1,48 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from pylab.io.reader import SessionReader
+from pylab.io.sink import EncoderSink, export_encoder_csv, read_encoder_stream
+
+
+def test_samples_are_written_in_batches(tmp_path):
+    path = tmp_path / "encoder-data.bin"
+    sink = EncoderSink(str(path), batch_size=4, flush_interval=60).open()
+    for i in range(6):
+        sink.append(i, i * 0.02, i * 0.1)
+    assert sink.count == 4  # one full batch on disk, two samples buffered
+    assert len(read_encoder_stream(path)) == 4
+    sink.close()
+    records = read_encoder_stream(path)
+    assert records["Clicks"].tolist() == list(range(6))
+    assert records["Time"][-1] == 0.1
+
+
+def test_partial_record_from_a_crash_is_dropped(tmp_path):
+    path = tmp_path / "encoder-data.bin"
+    with EncoderSink(str(path), batch_size=1) as sink:
+        sink.append(1, 0.0, 0.5)
+        sink.append(2, 0.02, 0.6)
+    with open(path, "ab") as f:
+        f.write(b"\x01\x02\x03")
+    assert read_encoder_stream(path)["Clicks"].tolist() == [1, 2]
+    (tmp_path / "reserved.bin").touch()  # reserved by allocate_session_paths, never opened
+    assert len(read_encoder_stream(tmp_path / "reserved.bin")) == 0
+
+
+def test_reader_falls_back_to_the_stream(tmp_path):
+    beh = tmp_path / "protocol" / "sub-001" / "ses-01" / "beh"
+    beh.mkdir(parents=True)
+    stream = beh / "001_ses-01_encoder-data.bin"
+    with EncoderSink(str(stream)) as sink:
+        sink.append(3, 0.0, 0.2)
+    df = SessionReader(beh.parent).encoder()
+    assert list(df.columns) == ["Clicks", "Time", "Speed"]
+    assert df["Clicks"].tolist() == [3]
+
+    csv = beh / "001_ses-01_encoder-data.csv"
+    export_encoder_csv(str(stream), str(csv))
+    pd.testing.assert_frame_equal(pd.read_csv(csv), df, check_dtype=False)
+    assert os.path.getsize(csv) > 0
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+import tifffile
+import useq
+
+from pylab.io.stats import FrameStatsAccumulator
+
+
+@pytest.fixture
+def frames():
+    rng = np.random.default_rng(0)
+    return rng.integers(0, 4000, (40, 6, 7)).astype(np.uint16)
+
+
+@pytest.fixture
+def sequence():
+    return useq.MDASequence(time_plan={"interval": 0, "loops": 40})
+
+
+def run_accumulator(accumulator, sequence, frames):
+    accumulator.sequenceStarted(sequence, {})
+    for frame, event in zip(frames, sequence):
+        accumulator.frameReady(frame, event, {})
+    accumulator.sequenceFinished(sequence)
+    accumulator.finalized.result()  # saved by the finalization pipeline
+
+
+def test_summary_matches_numpy(tmp_path, sequence, frames):
+    filename = str(tmp_path / "test_meso.ome.tiff")
+    accumulator = FrameStatsAccumulator(filename)
+    run_accumulator(accumulator, sequence, frames)
+
+    summary = tifffile.imread(accumulator.summary_path())
+    assert summary.shape == (3, 6, 7)
+    np.testing.assert_allclose(summary[0], frames.mean(axis=0), rtol=1e-5)
+    np.testing.assert_allclose(summary[1], frames.var(axis=0), rtol=1e-3)
+    np.testing.assert_array_equal(summary[2], frames.max(axis=0))
+    assert (tmp_path / "test_meso_summary.json").exists()
+
+
+def test_summary_per_led_channel(tmp_path, sequence, frames):
+    filename = str(tmp_path / "test_meso.ome.tiff")
+    accumulator = FrameStatsAccumulator(filename, led_pattern=["4", "4", "2", "2"], baseline_tau=5)
+    run_accumulator(accumulator, sequence, frames)
+
+    led4 = frames[[i for i in range(len(frames)) if i % 4 < 2]]
+    summary = tifffile.imread(accumulator.summary_path("4"))
+    assert summary.shape == (4, 6, 7)  # mean, variance, max, baseline
+    np.testing.assert_allclose(summary[0], led4.mean(axis=0), rtol=1e-5)
+    assert accumulator.stats["2"].count == 20
+    assert accumulator.cost_per_frame_ms > 0
+
+
+def test_led_phase_follows_event_index(tmp_path, sequence, frames):
+    filename = str(tmp_path / "test_meso.ome.tiff")
+    accumulator = FrameStatsAccumulator(filename, led_pattern=["4", "2"])
+    accumulator.sequenceStarted(sequence, {})
+    for frame, event in zip(frames, sequence):
+        if event.index["t"] != 3:  # dropped frame
+            accumulator.frameReady(frame, event, {})
+    accumulator.sequenceFinished(sequence)
+    accumulator.finalized.result()
+
+    led2 = frames[[t for t in range(len(frames)) if t % 2 and t != 3]]
+    np.testing.assert_allclose(accumulator.stats["2"].mean, led2.mean(axis=0), rtol=1e-5)
+    assert accumulator.stats["4"].count == 20
+
+
+def test_full_backlog_skips_frames(tmp_path, sequence, frames):
+    accumulator = FrameStatsAccumulator(str(tmp_path / "test_meso.ome.tiff"), max_backlog=4)
+    for frame, event in zip(frames, sequence):  # no worker running yet
+        accumulator.frameReady(frame, event, {})
+    assert accumulator.skipped == len(frames) - 4
+    assert accumulator._queue.qsize() == 4
@@ -0,0 +1,91 @@
+import json
+import threading
+import time
+
+import pytest
+
+from pylab.supervisor import SessionSupervisor
+
+
+class FakeStream:
+    """A device that emits samples from its own thread until stopped."""
+
+    def __init__(self, on_sample, latency=0.0, arm_error=None):
+        self.on_sample = on_sample
+        self.latency = latency
+        self.arm_error = arm_error
+        self.armed = False
+        self._stop = threading.Event()
+        self.thread = None
+
+    def arm(self):
+        if self.arm_error:
+            raise self.arm_error
+        self.armed = True
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run)
+        self.thread.start()
+        return self.thread
+
+    def _run(self):
+        time.sleep(self.latency)
+        while not self._stop.is_set():
+            self.on_sample()
+            time.sleep(0.001)
+
+    def stop(self):
+        self._stop.set()
+
+
+def test_streams_are_released_together_and_skew_is_reported():
+    supervisor = SessionSupervisor()
+    streams = {
+        "fast": FakeStream(supervisor.first_sample_callback("fast")),
+        "slow": FakeStream(supervisor.first_sample_callback("slow"), latency=0.05),
+    }
+    for name, stream in streams.items():
+        supervisor.add_stream(name, start=stream.start, arm=stream.arm, stop=stream.stop)
+
+    supervisor.start()
+    time.sleep(0.2)
+    report = supervisor.teardown(timeout=5)
+
+    assert all(s.armed for s in streams.values())
+    assert all(not s.thread.is_alive() for s in streams.values())
+    assert report["release_skew_ms"] < 50
+    assert report["first_sample_skew_ms"] >= 40
+    for entry in report["streams"].values():
+        assert entry["error"] is None
+        assert entry["finished_ms"] >= entry["first_sample_ms"] >= entry["released_ms"]
+
+
+def test_first_sample_is_recorded_once():
+    ticks = iter([1.0, 2.0, 3.0, 4.0])
+    supervisor = SessionSupervisor(clock=lambda: next(ticks))
+    supervisor.add_stream("a", start=lambda: None)
+    supervisor.first_sample("a")
+    supervisor.first_sample("a")
+    assert supervisor.streams["a"].first_sample == 1.0
+
+
+def test_failed_arm_aborts_start():
+    supervisor = SessionSupervisor(arm_timeout=5)
+    good = FakeStream(lambda: None)
+    bad = FakeStream(lambda: None, arm_error=OSError("no camera"))
+    supervisor.add_stream("good", start=good.start, arm=good.arm, stop=good.stop)
+    supervisor.add_stream("bad", start=bad.start, arm=bad.arm, stop=bad.stop)
+
+    with pytest.raises(RuntimeError, match="bad"):
+        supervisor.start()
+    assert good.thread is None and bad.thread is None
+
+
+def test_report_is_saved_when_streams_finish(tmp_path):
+    path = tmp_path / "streams.json"
+    supervisor = SessionSupervisor(report_path=str(path))
+    stream = FakeStream(supervisor.first_sample_callback("meso"))
+    supervisor.add_stream("meso", start=stream.start, arm=stream.arm, stop=stream.stop)
+    supervisor.start()
+    report = supervisor.teardown(timeout=5)
+    assert json.loads(path.read_text()) == report
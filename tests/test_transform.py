@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from pylab.io.transform import FrameTransform
+
+
+@pytest.fixture
+def frame():
+    return np.arange(64 * 48, dtype=np.uint16).reshape(48, 64)
+
+
+def test_crop(frame):
+    stage = FrameTransform([], crop=[8, 4, 32, 16])
+    np.testing.assert_array_equal(stage.apply(frame), frame[4:20, 8:40])
+
+
+def test_bin_mean_keeps_dtype(frame):
+    binned = FrameTransform([], binning=4).apply(frame)
+    expected = frame.reshape(12, 4, 16, 4).mean(axis=(1, 3))
+    assert binned.shape == (12, 16)
+    assert binned.dtype == np.uint16
+    np.testing.assert_allclose(binned, expected, atol=0.5)
+
+
+def test_bin_sum_does_not_overflow():
+    frame = np.full((8, 8), 60000, dtype=np.uint16)
+    binned = FrameTransform([], binning=2, mode="sum").apply(frame)
+    assert binned.dtype == np.uint32
+    assert (binned == 240000).all()
+
+
+def test_forwards_frames_and_geometry(frame):
+    class Output:
+        def sequenceStarted(self, seq, meta):
+            self.meta = meta
+
+        def frameReady(self, frame, event, meta):
+            self.frame = frame
+
+    output = Output()
+    stage = FrameTransform([output], crop=[0, 0, 32, 32], binning=2)
+    stage.sequenceStarted(None, {})
+    stage.frameReady(frame, None, {})
+    assert output.frame.shape == (16, 16)
+    assert output.meta["frame_transform"]["crop_width"] == 32
+    assert output.meta["frame_transform"]["binning"] == 2
+
+
+def test_invalid_mode():
+    with pytest.raises(ValueError):
+        FrameTransform([], binning=2, mode="median")
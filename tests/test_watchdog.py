@@ -0,0 +1,37 @@
+import time
+
+from pylab.watchdog import StallDetector
+
+
+def blocking_render(seconds):
+    time.sleep(seconds)
+
+
+def test_stall_is_recorded_with_the_blocking_stack():
+    detector = StallDetector(interval=0.01, threshold=0.05)
+    stalls = []
+    detector.callbacks.append(stalls.append)
+    detector.start()
+    try:
+        detector.heartbeat()
+        blocking_render(0.3)
+        stall = detector.heartbeat()
+    finally:
+        detector.stop()
+
+    assert stall is not None and stalls == [stall]
+    assert stall.duration_s >= 0.25
+    assert "blocking_render" in stall.stack
+    assert "blocking_render" in stall.culprit()
+    assert "stalls over 50 ms" in detector.summary()
+
+
+def test_on_time_heartbeats_only_record_lateness():
+    ticks = iter([0.0, 0.011, 0.021, 0.5])
+    detector = StallDetector(interval=0.01, threshold=0.2, clock=lambda: next(ticks))
+    detector._last = next(ticks)
+    assert detector.heartbeat() is None
+    assert detector.heartbeat() is None
+    stall = detector.heartbeat()
+    assert stall is not None and stall.stack == "" and stall.culprit() == "unknown"
+    assert abs(stall.duration_s - 0.469) < 1e-9
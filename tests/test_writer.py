@@ -0,0 +1,107 @@
+import json
+
+import numpy as np
+import pytest
+import tifffile
+import useq
+
+from pylab.io.writer import CustomWriter, GrowingTiffStack
+
+
+@pytest.fixture
+def frames():
+    rng = np.random.default_rng(0)
+    return rng.integers(0, 4000, (10, 6, 7)).astype(np.uint16)
+
+
+@pytest.fixture
+def sequence():
+    return useq.MDASequence(time_plan={"interval": 0, "loops": 10})
+
+
+def test_growing_stack_flushes_in_blocks(tmp_path, sequence, frames):
+    filename = str(tmp_path / "test_meso.ome.tiff")
+    writer = CustomWriter(filename, preallocate=False, block_size=3)
+    writer.sequenceStarted(sequence, {})
+    events = list(sequence)
+    for frame, event in zip(frames[:7], events):  # aborted after 7 of 10 frames
+        writer.frameReady(frame, event, {})
+        stack = writer.position_arrays["p0"]
+        assert isinstance(stack, GrowingTiffStack)
+        assert stack.frames_written == (event.index["t"] + 1) // 3 * 3
+    assert stack.shape == (7, 6, 7)
+
+    writer.sequenceFinished(sequence)
+    writer.finalized.result()
+
+    with tifffile.TiffFile(filename) as tif:
+        data = tif.asarray()
+        ome = tifffile.xml2dict(tif.ome_metadata)
+    np.testing.assert_array_equal(data, frames[:7])
+    assert ome["OME"]["Image"]["Pixels"]["SizeT"] == 7
+
+
+def test_growing_stack_leaves_gap_for_skipped_frame(tmp_path, frames):
+    stack = GrowingTiffStack(
+        str(tmp_path / "gap.ome.tiff"), np.uint16, {"t": 5, "y": 6, "x": 7}, block_size=2
+    )
+    stack[(0,)] = frames[0]
+    stack[(2,)] = frames[2]
+    with pytest.raises(IndexError):
+        stack[(1,)] = frames[1]
+    stack.close()
+
+    data = tifffile.imread(stack.filename)
+    assert data.shape == (3, 6, 7)
+    np.testing.assert_array_equal(data[0], frames[0])
+    assert not data[1].any()
+    np.testing.assert_array_equal(data[2], frames[2])
+
+
+def run_writer(writer, sequence, frames, drop=()):
+    writer.sequenceStarted(sequence, {})
+    for frame, event in zip(frames, sequence):
+        if event.index["t"] not in drop:
+            writer.frameReady(frame, event, {})
+    writer.sequenceFinished(sequence)
+    writer.finalized.result()
+
+
+def test_led_demux_sizes_channel_files(tmp_path, sequence, frames):
+    filename = str(tmp_path / "test_meso.ome.tiff")
+    writer = CustomWriter(filename, led_pattern=["4", "4", "2"])
+    run_writer(writer, sequence, frames)
+
+    assert writer._channel_frame_count("4", 10) == 7
+    assert writer._channel_frame_count("2", 10) == 3
+    led4 = tifffile.imread(str(tmp_path / "test_meso_led-4.ome.tiff"))
+    led2 = tifffile.imread(str(tmp_path / "test_meso_led-2.ome.tiff"))
+    np.testing.assert_array_equal(led4, frames[[0, 1, 3, 4, 6, 7, 9]])
+    np.testing.assert_array_equal(led2, frames[[2, 5, 8]])
+
+
+@pytest.mark.parametrize("preallocate", [True, False])
+def test_led_demux_dropped_frame_leaves_gap(tmp_path, sequence, frames, preallocate):
+    filename = str(tmp_path / "test_meso.ome.tiff")
+    writer = CustomWriter(filename, preallocate=preallocate, led_pattern=["4", "2"])
+    run_writer(writer, sequence, frames, drop={3})
+
+    led4 = tifffile.imread(str(tmp_path / "test_meso_led-4.ome.tiff"))
+    led2 = tifffile.imread(str(tmp_path / "test_meso_led-2.ome.tiff"))
+    np.testing.assert_array_equal(led4, frames[[0, 2, 4, 6, 8]])
+    np.testing.assert_array_equal(led2[[0, 2, 3, 4]], frames[[1, 5, 7, 9]])
+    assert not led2[1].any()
+
+    with open(writer._frame_metadata_filename) as f:
+        metadata = json.load(f)["p0"]
+    assert [m["led_channel"] for m in metadata] == ["4", "2", "4", "4", "2", "4", "2", "4", "2"]
+    assert [m["channel_index"] for m in metadata] == [0, 0, 1, 2, 2, 3, 3, 4, 4]
+    assert writer._channel_counts["p0_led-2"] == 4
+
+
+def test_led_demux_counts_reset_between_sequences(tmp_path, sequence, frames):
+    writer = CustomWriter(str(tmp_path / "first.ome.tiff"), led_pattern=["4", "2"])
+    run_writer(writer, sequence, frames)
+    assert writer._channel_counts["p0_led-4"] == 5
+    writer.sequenceStarted(sequence, {})
+    assert not writer._channel_counts